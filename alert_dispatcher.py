@@ -0,0 +1,290 @@
+import argparse
+import atexit
+import queue
+import smtplib
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import config # type: ignore
+from database import get_db_connection
+from metrics import run_metrics
+from repository import INSERT_ALERT_SQL
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Alerts are written to the alert_outbox table (created by migrations.py) before
+# anything else happens, by the monitor in the same transaction as the changed
+# content (SiteRepository.update_site_content), and sent from a background
+# thread, so a slow mail server never holds up the checks and a crash never
+# loses an alert. An alert stays in the outbox until it was sent; failed sends
+# are retried later (also by the next run) until email.max_attempts is reached.
+
+def build_alert(url, site_name, diff_output):
+    """Return the (subject, body) of the alert for one changed site"""
+    subject = f'ALERT: Privacy Policy Changed for {site_name or url}'
+    body = f"""
+    Changes detected for the privacy policy at: {url}
+    Site Name: {site_name}
+
+    Diff Output:
+    {diff_output}
+    """
+    return subject, body
+
+def outbox_row(url, site_name, diff_output):
+    """Return the alert_outbox row (INSERT_ALERT_SQL parameters) of the alert for one changed site"""
+    subject, body = build_alert(url, site_name, diff_output)
+    return url, site_name, subject, body, datetime.utcnow().isoformat()
+
+def build_digest(rows):
+    """Return the (subject, body) of one message for several outbox rows"""
+    subject = f"ALERT: Privacy Policies Changed for {len(rows)} sites"
+    sections = [f"Changes detected for {len(rows)} privacy policies:"]
+    sections.extend(f"- {row['site_name'] or row['url']}: {row['url']}" for row in rows)
+    for row in rows:
+        sections.append(f"\n{'=' * 70}\n{row['body'].strip()}")
+    return subject, "\n".join(sections)
+
+class AlertDispatcher:
+    """
+    Send alerts from a background thread over one reused SMTP connection.
+
+    - send() stores the alert in the outbox and wakes the thread, notify() only
+      wakes it for alerts already stored; the check loop never waits for the
+      mail server.
+    - Alerts that arrive close together (within linger_seconds, up to batch_size)
+      are sent as one batch. The authenticated connection is kept open between
+      batches and closed after idle_seconds without alerts.
+    - With digest=True nothing is sent until flush() or close(), which send all
+      waiting alerts as a single message (one digest per run).
+    """
+
+    def __init__(self, digest=None, batch_size=None, max_attempts=None, linger_seconds=None, idle_seconds=None):
+        self.digest = config.ALERT_DIGEST if digest is None else digest
+        self.batch_size = batch_size or config.ALERT_BATCH_SIZE
+        self.max_attempts = max_attempts or config.ALERT_MAX_ATTEMPTS
+        self.linger_seconds = config.ALERT_LINGER_SECONDS if linger_seconds is None else linger_seconds
+        self.idle_seconds = idle_seconds or config.ALERT_IDLE_SECONDS
+        self.stats = Counter()
+        self._queue = queue.Queue()
+        self._smtp = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    def send(self, url, site_name, diff_output):
+        """Store an alert for a changed site in the outbox and wake the thread to send it"""
+        conn = get_db_connection()
+        try:
+            conn.execute(INSERT_ALERT_SQL, outbox_row(url, site_name, diff_output))
+            conn.commit()
+        finally:
+            conn.close()
+        self.notify()
+
+    def notify(self):
+        """Wake the thread for an alert stored in the outbox"""
+        self.stats["queued"] += 1
+        if self._closed:
+            logger.warning("Alert dispatcher is closed, the alert stays in the outbox for the next run.")
+            return
+        self._queue.put(("alert", None))
+
+    def flush(self, wait=True, timeout=None):
+        """
+        Send everything that is waiting (as a digest in digest mode).
+        Returns True if the dispatcher finished within the timeout (always True with wait=False).
+        """
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout) if wait else True
+
+    def close(self, timeout=None):
+        """Send everything that is waiting and stop the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(("stop", threading.Event()))
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Alert dispatcher did not finish in time, unsent alerts stay in the outbox.")
+        logger.debug(f"Alert dispatcher stats: {dict(self.stats)}.")
+
+    def _run(self):
+        conn = get_db_connection()
+        try:
+            # Alerts left by an earlier run (digests pick them up on the next flush)
+            if not self.digest:
+                self._deliver(conn)
+            while True:
+                try:
+                    items = [self._queue.get(timeout=self.idle_seconds)]
+                except queue.Empty:
+                    self._disconnect()
+                    continue
+                items.extend(self._collect_batch())
+
+                controls = [item for item in items if item[0] != "alert"]
+                try:
+                    if controls or not self.digest:
+                        self._deliver(conn)
+                except Exception as e:
+                    logger.error(f"Alert dispatcher error: {e}.")
+                finally:
+                    for kind, done in controls:
+                        done.set()
+                if any(kind == "stop" for kind, _ in controls):
+                    return
+        finally:
+            self._disconnect()
+            conn.close()
+
+    def _collect_batch(self):
+        """Wait up to linger_seconds for more alerts so they share one connection"""
+        items = []
+        deadline = time.monotonic() + self.linger_seconds
+        while len(items) + 1 < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            if item[0] != "alert":
+                break
+        return items
+
+    def _deliver(self, conn):
+        """Send the waiting outbox rows, stopping at the first failure"""
+        rows = conn.execute(
+            "SELECT id, url, site_name, subject, body FROM alert_outbox WHERE attempts < ? ORDER BY id",
+            (self.max_attempts,)
+        ).fetchall()
+        if not rows:
+            return
+        if self.digest and len(rows) > 1:
+            messages = [([row["id"] for row in rows], *build_digest(rows))]
+        else:
+            messages = [([row["id"]], row["subject"], row["body"]) for row in rows]
+
+        for ids, subject, body in messages:
+            placeholders = ",".join("?" * len(ids))
+            try:
+                with run_metrics.timer("smtp"):
+                    self._send_message(subject, body)
+            except (smtplib.SMTPException, OSError) as e:
+                logger.error(f"Failed to send alert '{subject}': {e}.")
+                self.stats["failed"] += 1
+                conn.execute(
+                    f"UPDATE alert_outbox SET attempts = attempts + 1, last_error = ? WHERE id IN ({placeholders})",
+                    [str(e)] + ids
+                )
+                conn.commit()
+                self._disconnect()
+                # The rest is retried with the next batch instead of failing one by one
+                return
+            conn.execute(f"DELETE FROM alert_outbox WHERE id IN ({placeholders})", ids)
+            conn.commit()
+            self.stats["sent"] += 1
+            self.stats["digests" if len(ids) > 1 else "alerts"] += 1
+            logger.info(f"Alert email sent: {subject}.")
+
+    def _send_message(self, subject, body):
+        msg = MIMEMultipart()
+        msg['Subject'] = subject
+        msg['From'] = config.EMAIL_ADDRESS
+        msg['To'] = config.EMAIL_ADDRESS
+        msg.attach(MIMEText(body, 'plain'))
+        try:
+            self._connection().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed the connection we kept open, reconnect once
+            self._disconnect()
+            self._connection().send_message(msg)
+
+    def _connection(self):
+        """Return the open SMTP connection, connecting and logging in if needed"""
+        if self._smtp is None:
+            smtp = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT, timeout=config.SMTP_TIMEOUT_SECONDS)
+            try:
+                if config.SMTP_STARTTLS:
+                    smtp.starttls()
+                if config.EMAIL_PASSWORD:
+                    smtp.login(config.EMAIL_ADDRESS, config.EMAIL_PASSWORD)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self.stats["connections"] += 1
+            logger.debug(f"Connected to {config.SMTP_SERVER}:{config.SMTP_PORT}.")
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+# One dispatcher shared by the monitor (created on the first alert)
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_alert_dispatcher():
+    """Return the shared alert dispatcher, starting it on first use"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher()
+        return _dispatcher
+
+def flush_alert_dispatcher(wait=True):
+    """Send the queued alerts of the shared dispatcher, if it was started"""
+    with _dispatcher_lock:
+        dispatcher = _dispatcher
+    if dispatcher is not None:
+        dispatcher.flush(wait=wait, timeout=config.SMTP_TIMEOUT_SECONDS * 2 if wait else None)
+
+def shutdown_alert_dispatcher():
+    """Send the queued alerts and stop the shared dispatcher"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.close(timeout=config.SMTP_TIMEOUT_SECONDS * 2)
+            _dispatcher = None
+
+atexit.register(shutdown_alert_dispatcher)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and resend the alert outbox.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="show the alerts waiting in the outbox")
+    subparsers.add_parser("retry", help="resend every alert in the outbox, including those that gave up")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    try:
+        if args.command == "status":
+            rows = conn.execute("SELECT id, url, created_at, attempts, last_error FROM alert_outbox ORDER BY id").fetchall()
+            for row in rows:
+                print(f"{row['id']}: {row['url']} queued {row['created_at']}, {row['attempts']} attempts"
+                      + (f" ({row['last_error']})" if row['last_error'] else ""))
+            print(f"{len(rows)} alerts waiting.")
+            return
+        conn.execute("UPDATE alert_outbox SET attempts = 0")
+        conn.commit()
+    finally:
+        conn.close()
+
+    dispatcher = AlertDispatcher()
+    dispatcher.close(timeout=config.SMTP_TIMEOUT_SECONDS * 2)
+    print(f"{dispatcher.stats['sent']} messages sent, {dispatcher.stats['failed']} failed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import re
+import time
+from link_discoverer import is_privacy_link
+from monitor import should_use_browser
+from text_extraction import extract_text
+from bench_extraction import generate_policy_page
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Compare should_use_browser and is_privacy_link with the implementations
+# they replaced (a lowercase + `in` scan per indicator, and two re.search
+# calls per pattern and link).
+#   python bench_classifier.py
+#   python bench_classifier.py --links 20000 policy.html
+
+LEGACY_COOKIE_INDICATORS = ["cookie", "consent", "gdpr", "privacy settings", "accept all", "agree", "manage cookies"]
+LEGACY_JS_INDICATORS = ["react", "vue", "angular", "window.__", "window.gon",
+                        "script", "function(", "var ", "const ", "let "]
+LEGACY_LINK_PATTERNS = [r'privacy', r'notice', r'policy', r'ccpa', r'gdpr', r'california', r'opt.?out',
+                        r'do not sell', r'your privacy choices', r'data rights', r'transparency']
+
+def legacy_should_use_browser(content):
+    """The indicator checks of monitor.should_use_browser before indicator_matcher.py"""
+    if content is None or len(content) < 1000:
+        return True
+    content_lower = content.lower()
+    for indicator in LEGACY_COOKIE_INDICATORS + LEGACY_JS_INDICATORS:
+        if indicator in content_lower:
+            return True
+    return False
+
+def legacy_is_privacy_link(href, text):
+    """link_discoverer.is_privacy_link before indicator_matcher.py"""
+    href_lower = href.lower()
+    text_lower = text.lower()
+    for pattern in LEGACY_LINK_PATTERNS:
+        if (re.search(pattern, href_lower) or re.search(pattern, text_lower)):
+            return True
+    if '/privacy' in href_lower:
+        return True
+    return any(term in text_lower for term in ['privacy', 'policy', 'notice', 'ccpa', 'gdpr'])
+
+def generate_links(count):
+    """Links of a large page (e.g. a shop footer or sitemap), about 1% privacy-related"""
+    links = []
+    for i in range(count):
+        if i % 100 == 0:
+            links.append((f"/legal/privacy-{i}", "Privacy Notice"))
+        else:
+            links.append((f"/products/category-{i % 37}/item-{i}?ref=home", f"Product number {i} - see details"))
+    return links
+
+def best_time(func, repeat):
+    """Return the best time of `repeat` runs in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_benchmark(texts, links, repeat=5):
+    for name, text in texts:
+        # Worst case for both: the policy text contains none of the indicators
+        print(f"should_use_browser on {name} ({len(text) / 1024:.0f} KB, result {should_use_browser(text, name)}):")
+        print(f"  legacy   {best_time(lambda: legacy_should_use_browser(text), repeat):8.2f} ms")
+        print(f"  matcher  {best_time(lambda: should_use_browser(text, name), repeat):8.2f} ms")
+
+    matches = sum(is_privacy_link(href, text) for href, text in links)
+    print(f"is_privacy_link on {len(links)} links ({matches} privacy-related):")
+    print(f"  legacy   {best_time(lambda: [legacy_is_privacy_link(h, t) for h, t in links], repeat):8.2f} ms")
+    print(f"  matcher  {best_time(lambda: [is_privacy_link(h, t) for h, t in links], repeat):8.2f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the page and link classifiers.")
+    parser.add_argument("files", nargs="*", help="HTML files to classify (default: a generated policy page)")
+    parser.add_argument("--links", type=int, default=5000, help="number of generated links")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per classifier, the best is reported")
+    args = parser.parse_args(argv)
+
+    if args.files:
+        texts = []
+        for path in args.files:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                texts.append((path, extract_text(f.read())))
+    else:
+        # The generated page mentions cookies, remove them to time a full scan
+        text = extract_text(generate_policy_page()).replace("cookies", "trackers").replace("parties", "companies")
+        texts = [("generated policy text", text)]
+    run_benchmark(texts, generate_links(args.links), args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import time
+from bs4 import BeautifulSoup
+from text_extraction import extract_text, HAS_LXML
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Compare the shared text extraction with the two implementations it replaced.
+#   python bench_extraction.py                 # generated policy page
+#   python bench_extraction.py page1.html ...  # saved pages
+
+def legacy_monitor_extract(html_content):
+    """The extraction monitor.fetch_page used before text_extraction.py"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+def legacy_browser_extract(html_content):
+    """The extraction browser_handler.extract_text_from_html used before text_extraction.py"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for element in soup(["script", "style", "nav", "header", "footer"]):
+        element.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split(" "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+def generate_policy_page(sections=200):
+    """Build a large privacy policy page with the usual page furniture around it"""
+    parts = [
+        "<html><head><title>Privacy Policy</title><style>body { color: #333; }</style>",
+        "<script>window.analytics = {track: function() {}};</script></head><body>",
+        "<header><nav><a href='/'>Home</a><a href='/about'>About</a></nav></header><main>",
+    ]
+    for i in range(sections):
+        parts.append(f"<section><h2>{i + 1}. Section {i + 1}</h2>")
+        for j in range(5):
+            parts.append(
+                f"<p>We may collect <b>information</b> about you when you use our services "
+                f"(paragraph {j} of section {i}). This includes data you\n    provide to us, "
+                f"data collected <a href='/cookies'>automatically</a> and data from third parties.</p>"
+            )
+        parts.append("<ul>" + "".join(f"<li>Purpose {k}</li>" for k in range(4)) + "</ul></section>")
+    parts.append("</main><footer>Copyright Example Inc.</footer><script>track();</script></body></html>")
+    return "".join(parts)
+
+def time_function(func, html_content, repeat):
+    """Return the best time of `repeat` runs in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html_content)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_benchmark(pages, repeat=5):
+    extractors = [
+        ("legacy monitor", legacy_monitor_extract),
+        ("legacy browser", legacy_browser_extract),
+        ("extract_text html.parser", lambda html: extract_text(html, parser="html.parser")),
+    ]
+    if HAS_LXML:
+        extractors.append(("extract_text lxml", lambda html: extract_text(html, parser="lxml")))
+
+    for name, html_content in pages:
+        print(f"{name} ({len(html_content) / 1024:.0f} KB):")
+        for extractor_name, func in extractors:
+            elapsed = time_function(func, html_content, repeat)
+            lines = len(func(html_content).splitlines())
+            print(f"  {extractor_name:<26} {elapsed:8.1f} ms  {lines} lines")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark HTML text extraction.")
+    parser.add_argument("files", nargs="*", help="HTML files to extract (default: a generated policy page)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per extractor, the best is reported")
+    args = parser.parse_args(argv)
+
+    if args.files:
+        pages = []
+        for path in args.files:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages.append((path, f.read()))
+    else:
+        pages = [("generated policy page", generate_policy_page())]
+    run_benchmark(pages, args.repeat)
+
+if __name__ == "__main__":
+    main()
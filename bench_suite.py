@@ -0,0 +1,250 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import requests
+import config # type: ignore
+import metrics
+import monitor
+from database import add_sites
+from fixture_server import FixtureServer, KINDS, RECORDED
+from local_smtp import LocalSMTPServer
+from migrations import init_db
+from text_extraction import extract_text
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# End to end benchmark of check_all_sites against synthetic sites served by
+# fixture_server.py, with no network access. Each run prints sites/sec and
+# per stage p50/p95, and the results are saved as JSON to compare versions:
+#   python bench_suite.py --sites 500 --runs 3 --concurrency 20
+#   python bench_suite.py --latency-ms 100 --jitter-ms 50 --compare bench_results/before.json
+# --browser fixture (the default) serves the rendered JS and cookie wall pages
+# over HTTP instead of launching Chromium, so the numbers do not depend on a browser install.
+
+DEFAULT_MIX = "static=70,js=10,cookie=10,large=10"
+
+def parse_mix(mix):
+    """Parse "static=70,js=10,..." into [(kind, weight), ...]"""
+    weights = []
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS + (RECORDED,):
+            raise ValueError(f"Unknown page kind {kind}, use one of {', '.join(KINDS + (RECORDED,))}.")
+        weights.append((kind, float(weight or 1)))
+    return weights
+
+def site_kinds(count, mix, seed=0):
+    """Kind of each of `count` sites following the mix weights, shuffled the same way for a seed"""
+    total = sum(weight for _, weight in mix)
+    kinds = []
+    for kind, weight in mix:
+        kinds.extend([kind] * round(count * weight / total))
+    kinds = (kinds + [mix[0][0]] * count)[:count]
+    random.Random(seed).shuffle(kinds)
+    return kinds
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None for an empty list)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def stage_summary(samples):
+    return {
+        stage: {
+            "calls": len(values),
+            "total_seconds": round(sum(values), 4),
+            "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "max_ms": round(max(values) * 1000, 2),
+        }
+        for stage, values in sorted(samples.items())
+    }
+
+def peak_rss_mb():
+    """Peak resident memory of this process (ru_maxrss is in KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def db_size_mb(path):
+    size = sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+    return round(size / (1024 * 1024), 2)
+
+def code_version():
+    """The git commit of the tree being benchmarked, if known"""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=config.BASE_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def fixture_browser(url):
+    """Stand-in for the browser: the fixture server's rendered version of the page"""
+    separator = "&" if "?" in url else "?"
+    response = requests.get(f"{url}{separator}rendered=1", timeout=30)
+    response.raise_for_status()
+    return extract_text(response.text)
+
+def quiet_logs():
+    """Only warnings from the monitor's loggers, a run logs a line per site otherwise"""
+    for name in list(logging.root.manager.loggerDict):
+        if name != __name__:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+def run_suite(sites=200, runs=2, concurrency=20, per_host=None, hosts=8, latency_ms=20, jitter_ms=5,
+              mix=DEFAULT_MIX, change_rate=0.1, corpus_dir=None, browser="fixture", seed=0, workers=None):
+    """
+    Benchmark check_all_sites against `sites` synthetic sites, `runs` times
+    (the first run stores the baselines, the next ones check for changes).
+
+    Returns:
+        dict: the parameters, per run results, peak RSS and database size
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    config.DATABASE_PATH = os.path.join(work_dir, "bench.db")
+    init_db()
+
+    addresses = [f"127.0.0.{i + 1}" for i in range(hosts)] if sys.platform.startswith("linux") else ["127.0.0.1"]
+    fixture = FixtureServer(latency_ms, jitter_ms, corpus_dir, hosts=addresses, seed=seed).start()
+    smtp = LocalSMTPServer().start()
+    config.SMTP_SERVER, config.SMTP_PORT, config.SMTP_STARTTLS = "127.0.0.1", smtp.port, False
+    config.EMAIL_ADDRESS, config.EMAIL_PASSWORD = "bench@example.com", None
+    if browser == "fixture":
+        monitor.get_page_text_with_browser = fixture_browser
+    if workers is not None:
+        config.PROCESS_WORKERS = workers
+    metrics.run_metrics.enabled = True
+    metrics.run_metrics.keep_samples = True
+
+    kinds = site_kinds(sites, parse_mix(mix), seed)
+    recorded = sorted(fixture.corpus)
+    site_urls = []
+    for i, kind in enumerate(kinds):
+        if kind == RECORDED:
+            site_urls.append((fixture.url(i, RECORDED, recorded[i % len(recorded)]), f"Site {i}"))
+        else:
+            site_urls.append((fixture.url(i, kind), f"Site {i} ({kind})"))
+    add_sites(site_urls)
+
+    results = []
+    try:
+        for run in range(runs):
+            if run:
+                fixture.change_sites(change_rate, range(sites))
+            started = time.perf_counter()
+            stats = monitor.check_all_sites(concurrency, per_host)
+            wall = time.perf_counter() - started
+            samples = dict(metrics.run_metrics.samples)
+            site_seconds = [fetch + process for _, _, fetch, process in metrics.run_metrics.sites]
+            results.append({
+                "run": run + 1,
+                "wall_seconds": round(wall, 3),
+                "sites_per_second": round(stats["checked"] / wall, 2) if wall else None,
+                "stats": dict(stats),
+                "site_p50_ms": round(percentile(site_seconds, 0.5) * 1000, 2) if site_seconds else None,
+                "site_p95_ms": round(percentile(site_seconds, 0.95) * 1000, 2) if site_seconds else None,
+                "stages": stage_summary(samples),
+            })
+            print_run(results[-1])
+    finally:
+        fixture.stop()
+        smtp.stop()
+
+    return {
+        "version": code_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "sites": sites, "runs": runs, "concurrency": concurrency, "per_host": per_host or config.PER_HOST_CONCURRENCY,
+            "hosts": len(addresses), "latency_ms": latency_ms, "jitter_ms": jitter_ms, "mix": mix,
+            "change_rate": change_rate, "browser": browser, "corpus": corpus_dir, "seed": seed,
+            "requests_per_second_per_host": config.RATE_LIMIT_REQUESTS_PER_SECOND,
+            "adaptive_concurrency": config.RATE_LIMIT_ADAPTIVE, "max_page_bytes": config.MAX_PAGE_BYTES,
+            "workers": config.PROCESS_WORKERS,
+        },
+        "runs": results,
+        "fixture": dict(fixture.stats),
+        "emails": smtp.stats.get("messages", 0),
+        "peak_rss_mb": peak_rss_mb(),
+        "db_size_mb": db_size_mb(config.DATABASE_PATH),
+    }
+
+def print_run(result):
+    print(f"Run {result['run']}: {result['stats'].get('checked', 0)} sites in {result['wall_seconds']:.2f}s "
+          f"({result['sites_per_second']} sites/s), per site p50 {result['site_p50_ms']} ms, "
+          f"p95 {result['site_p95_ms']} ms. {result['stats']}")
+    for stage, summary in sorted(result["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"  {stage:<16} {summary['calls']:6} calls  total {summary['total_seconds']:8.2f}s  "
+              f"p50 {summary['p50_ms']:8.2f} ms  p95 {summary['p95_ms']:8.2f} ms")
+
+def compare(old, new):
+    """Print the change of the main numbers of the last run between two result files"""
+    old_run, new_run = old["runs"][-1], new["runs"][-1]
+    print(f"Compared with {old.get('version')} ({old.get('timestamp')}), last run:")
+    rows = [("sites/s", old_run["sites_per_second"], new_run["sites_per_second"]),
+            ("site p95 ms", old_run["site_p95_ms"], new_run["site_p95_ms"]),
+            ("peak RSS MB", old.get("peak_rss_mb"), new.get("peak_rss_mb")),
+            ("DB size MB", old.get("db_size_mb"), new.get("db_size_mb"))]
+    for stage in sorted(set(old_run["stages"]) | set(new_run["stages"])):
+        rows.append((f"{stage} p95 ms", old_run["stages"].get(stage, {}).get("p95_ms"),
+                     new_run["stages"].get(stage, {}).get("p95_ms")))
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else ""
+        print(f"  {name:<22} {before!s:>10} -> {after!s:<10} {change}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end to end benchmark of check_all_sites.")
+    parser.add_argument("--sites", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=2, help="the first run stores the baselines")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--per-host", type=int, default=None)
+    parser.add_argument("--hosts", type=int, default=8, help="loopback addresses the sites are spread over (Linux)")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"page kinds and weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--change-rate", type=float, default=0.1, help="share of sites changed before each later run")
+    parser.add_argument("--corpus", help="directory of recorded .html pages, used by the 'recorded' kind")
+    parser.add_argument("--browser", choices=["fixture", "real"], default="fixture")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", help="extraction processes, a number or auto (default: processing.workers)")
+    parser.add_argument("--output", help="result file (default: bench_results/bench_<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    parser.add_argument("--verbose", action="store_true", help="keep the monitor's INFO logs")
+    args = parser.parse_args(argv)
+
+    if "recorded" in args.mix and not args.corpus:
+        parser.error("the recorded kind needs --corpus")
+    if not args.verbose:
+        quiet_logs()
+
+    results = run_suite(args.sites, args.runs, args.concurrency, args.per_host, args.hosts, args.latency_ms,
+                        args.jitter_ms, args.mix, args.change_rate, args.corpus, args.browser, args.seed,
+                        args.workers if args.workers in (None, "auto") else int(args.workers))
+    print(f"Peak RSS {results['peak_rss_mb']} MB, database {results['db_size_mb']} MB, "
+          f"{results['emails']} alert emails, fixture stats {results['fixture']}.")
+
+    output = args.output or os.path.join("bench_results", f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results saved to {output}.")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,168 @@
-from playwright.sync_api import sync_playwright # type: ignore
-from bs4 import BeautifulSoup 
 import logging
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError # type: ignore
+import config # type: ignore
+from browser_pool import get_browser_pool
+from cookie_banner import dismiss_cookie_banner
+from text_extraction import extract_text
+from response_cache import store_response
 from log_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# Requests aborted in lean mode (browser section in config)
+BLOCKED_RESOURCE_TYPES = frozenset(config.BROWSER_BLOCK_RESOURCE_TYPES)
+BLOCKED_DOMAINS = frozenset(domain.lower().lstrip(".") for domain in config.BROWSER_BLOCK_DOMAINS)
+
+# Totals over all browser page loads, see get_load_stats
+_load_stats = Counter()
+_load_stats_lock = threading.Lock()
+
 def get_page_text_with_browser(url):
     """
     Fetch page content using Playwright to handle JS and cookie banners
     """
-    with sync_playwright() as p:
+    stats = Counter()
+    try:
+        # Pages come from the shared browser pool instead of a new browser per URL
+        content = get_browser_pool().run(lambda page: load_page_content(page, url, stats),
+                                         timeout=config.BROWSER_TIMEOUT_SECONDS)
+        record_load_stats(url, stats)
+        store_response(url, content, "html", "browser")
+
+        # Clean and extract text
+        return extract_text_from_html(content)
+
+    except Exception as e:
+        logger.error(f"Browser error fecthing {url}: {e}.")
+        return None
+
+def load_page_content(page, url, stats=None):
+    """Navigate a pooled page to url, dismiss cookie banners and return the rendered HTML"""
+    stats = stats if stats is not None else Counter()
+    start = time.perf_counter()
+
+    # Navigate to page
+    open_page(page, url, stats)
+
+    # Try to handle cookie consent banners
+    handle_cookie_banner(page)
+
+    # Get the page content after JS execution
+    content = page.content()
+    stats["total_ms"] += (time.perf_counter() - start) * 1000
+    return content
+
+def open_page(page, url, stats=None):
+    """
+    Load url in a page and wait for the configured condition.
+
+    In lean mode (browser.lean) requests for the blocked resource types and
+    tracker domains are aborted before they are sent. Navigation waits for
+    browser.wait_until (domcontentloaded by default instead of the full load
+    event) and then, optionally, for browser.wait_for_selector, both with
+    bounded timeouts. Request counts, bytes and timings are added to stats.
+    """
+    stats = stats if stats is not None else Counter()
+    if config.BROWSER_LEAN:
+        page.route("**/*", lambda route: route_request(route, stats))
+    page.on("response", lambda response: count_response(response, stats))
+
+    start = time.perf_counter()
+    wait_until = config.BROWSER_WAIT_UNTIL
+    try:
+        page.goto(url, wait_until=wait_until, timeout=config.BROWSER_NAVIGATION_TIMEOUT_SECONDS * 1000)
+    except PlaywrightTimeoutError:
+        if wait_until != "networkidle":
+            raise
+        # Pages that keep polling never go idle, use what has loaded so far
+        logger.debug(f"{url} did not reach network idle, continuing.")
+    stats["navigation_ms"] += (time.perf_counter() - start) * 1000
+
+    if config.BROWSER_WAIT_FOR_SELECTOR:
+        start = time.perf_counter()
         try:
-            # Launch browser (headless=True means it runs in the background)
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
-            page = context.new_page()
+            page.wait_for_selector(config.BROWSER_WAIT_FOR_SELECTOR,
+                                   timeout=config.BROWSER_SELECTOR_TIMEOUT_SECONDS * 1000)
+        except PlaywrightTimeoutError:
+            logger.debug(f"'{config.BROWSER_WAIT_FOR_SELECTOR}' did not appear on {url}, continuing.")
+        stats["selector_ms"] += (time.perf_counter() - start) * 1000
 
-            # Navigate to page
-            page.goto(url)
+def should_block_request(resource_type, url):
+    """True if a request is not needed for the page text (lean mode)"""
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = (urlparse(url).hostname or "").lower()
+    # Check the host and each parent domain against the list
+    labels = host.split(".")
+    return any(".".join(labels[i:]) in BLOCKED_DOMAINS for i in range(len(labels) - 1))
 
-            # Try to handle cookie consent banners
-            handle_cookie_banner(page)
+def route_request(route, stats):
+    request = route.request
+    if should_block_request(request.resource_type, request.url):
+        stats["blocked"] += 1
+        route.abort()
+    else:
+        route.continue_()
 
-            # Get the page content after JS execution
-            content = page.content()
+def count_response(response, stats):
+    # Content-Length is known without another round trip to the browser (chunked responses count as 0)
+    stats["responses"] += 1
+    try:
+        stats["bytes"] += int(response.headers.get("content-length", 0))
+    except ValueError:
+        pass
 
-            # Close browser
-            browser.close()
+def record_load_stats(url, stats):
+    """Log the stats of one page load and add them to the totals"""
+    logger.debug(
+        f"Loaded {url} in {stats['total_ms']:.0f} ms (navigation {stats['navigation_ms']:.0f} ms): "
+        f"{stats['responses']} responses, {stats['bytes'] / 1024:.0f} KB, {stats['blocked']} requests blocked."
+    )
+    with _load_stats_lock:
+        _load_stats.update(stats)
+        _load_stats["pages"] += 1
 
-            # Clean and extract text
-            return extract_text_from_html(content)
-        
-        except Exception as e:
-            logger.error(f"Browser error fecthing {url}: {e}.")
-            return None
+def get_load_stats(reset=False):
+    """Return the page load totals (pages, responses, bytes, blocked, *_ms) since the last reset"""
+    with _load_stats_lock:
+        stats = Counter(_load_stats)
+        if reset:
+            _load_stats.clear()
+    return stats
+
+def log_load_stats(reset=True):
+    """Log the browser page load totals (nothing if no page was loaded)"""
+    stats = get_load_stats(reset)
+    pages = stats["pages"]
+    if not pages:
+        return
+    requests_seen = stats["responses"] + stats["blocked"]
+    logger.info(
+        f"Browser pages: {pages} loaded, {stats['total_ms'] / pages:.0f} ms average "
+        f"(navigation {stats['navigation_ms'] / pages:.0f} ms), {stats['bytes'] / 1024:.0f} KB downloaded, "
+        f"{stats['blocked']} of {requests_seen} requests blocked."
+    )
         
 def handle_cookie_banner(page):
     """
     Try to detect and accept common cookie cosent banners
     """
-    # Common selectors for cookie accept buttons
-    cookie_selectors = [
-        'button:has-text("Accept")',
-        'button:has-text("Agree")',
-        'button:has-text("OK")',
-        'button:has-text("I agree")',
-        'button:has-text("Accept all")',
-        'button:has-text("Consent")',
-        'button:has-text("Allow")',
-        '[aria-label*="Accept"]',
-        '[aria-label*="agree"]',
-        '.accept-cookies',
-        '.cookie-accept',
-        '#accept-cookies',
-        '#cookie-accept',
-        '#consent-accept',
-        '#agree-cookies'
-    ]
-
-    for selector in cookie_selectors:
-        try:
-            if page.is_visible(selector):
-                page.click(selector)
-                page.wait_for_timeout(1000)
-                logger.info("Cookie banner accepted.")
-                break
-        except:
-            continue
+    # All candidate selectors are checked in one evaluation, starting with
+    # the custom and previously working selectors of the page's domain
+    try:
+        selector = dismiss_cookie_banner(page)
+        if selector:
+            logger.info(f"Cookie banner accepted ({selector}).")
+    except Exception as e:
+        logger.debug(f"Could not handle cookie banner: {e}.")
 
 def extract_text_from_html(html_content):
     """
     Extract clean text from HTML content
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    # Remove unwanted elements
-    for element in soup(["script", "style", "nav", "header", "footer"]):
-        element.decompose()
-
-    # Get text and clean it
-    text = soup.get_text()
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split(" "))
-    cleaned_text = '\n'.join(chunk for chunk in chunks if chunk)
-
-    return cleaned_text
\ No newline at end of file
+    # Shared with the requests path in monitor.py
+    return extract_text(html_content)
@@ -0,0 +1,198 @@
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from playwright.sync_api import sync_playwright # type: ignore
+import config # type: ignore
+from cookie_banner import banner_cache
+from metrics import run_metrics
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class BrowserPool:
+    """
+    A long-lived pool of headless Chromium browsers.
+
+    Each worker thread owns one Playwright instance and one browser (Playwright's
+    sync API objects can only be used from the thread that created them). Jobs are
+    functions that receive a page in a new browser context, so no cookies, storage
+    or consent state is shared between sites; page and context are closed after
+    every job. The browser itself is relaunched after `pages_per_browser` pages or
+    when the resident memory of its processes goes over `memory_limit_mb`.
+    """
+
+    def __init__(self, workers=2, pages_per_browser=100, memory_limit_mb=1024, headless=True):
+        if workers < 1:
+            raise ValueError("A browser pool needs at least one worker.")
+        self.workers = workers
+        self.pages_per_browser = pages_per_browser
+        self.memory_limit_mb = memory_limit_mb
+        self.headless = headless
+        self.stats = {"launches": 0, "pages": 0, "contexts": 0, "recycled": 0}
+        self._stats_lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._closed = False
+        self._threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"browser-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func):
+        """Queue func(page) to run on a pooled page and return a Future for its result"""
+        if self._closed:
+            raise RuntimeError("Browser pool has been shut down.")
+        future = Future()
+        self._jobs.put((func, future))
+        return future
+
+    def run(self, func, timeout=None):
+        """Run func(page) on a pooled page and wait for the result"""
+        return self.submit(func).result(timeout)
+
+    def shutdown(self):
+        """Stop all workers and close their browsers"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        logger.info(f"Browser pool shut down. Stats: {self.stats}.")
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _launch(self):
+        """Start Playwright and a browser for the calling worker thread"""
+        with run_metrics.timer("browser_launch"):
+            playwright = sync_playwright().start()
+            try:
+                browser = playwright.chromium.launch(headless=self.headless)
+            except Exception:
+                playwright.stop()
+                raise
+        self._count("launches")
+        logger.info(f"Launched browser for {threading.current_thread().name}.")
+        return playwright, browser
+
+    def _browser_memory_mb(self, browser):
+        """
+        Return the resident memory of the browser's processes in MB, 0 when it
+        cannot be measured (the process list comes from the DevTools protocol,
+        their memory from /proc, so only Chromium on Linux is measured)
+        """
+        try:
+            session = browser.new_browser_cdp_session()
+            try:
+                processes = session.send("SystemInfo.getProcessInfo")["processInfo"]
+            finally:
+                session.detach()
+        except Exception:
+            return 0
+        return sum(process_rss_mb(process["id"]) for process in processes)
+
+    def _worker_loop(self):
+        playwright = browser = None
+        pages_in_browser = 0
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                func, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    if browser is None:
+                        playwright, browser = self._launch()
+                        pages_in_browser = 0
+                    context = browser.new_context()
+                    self._count("contexts")
+                    try:
+                        page = context.new_page()
+                        try:
+                            result = func(page)
+                        finally:
+                            close_quietly(page)
+                    finally:
+                        close_quietly(context)
+                    pages_in_browser += 1
+                    self._count("pages")
+                    future.set_result(result)
+
+                    memory_mb = self._browser_memory_mb(browser)
+                    if pages_in_browser >= self.pages_per_browser or memory_mb > self.memory_limit_mb:
+                        logger.debug(f"Relaunching browser after {pages_in_browser} pages ({memory_mb:.0f} MB).")
+                        close_quietly(browser)
+                        stop_quietly(playwright)
+                        playwright = browser = None
+                        self._count("recycled")
+
+                except Exception as e:
+                    future.set_exception(e)
+                    if browser is not None and not browser.is_connected():
+                        logger.warning("Browser disconnected, it will be relaunched.")
+                        stop_quietly(playwright)
+                        playwright = browser = None
+        finally:
+            close_quietly(browser)
+            stop_quietly(playwright)
+
+def process_rss_mb(pid):
+    """Resident memory of a process in MB from /proc (0 if it is gone or there is no /proc)"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+def close_quietly(resource):
+    """Close a Playwright page, context or browser, ignoring errors"""
+    if resource is None:
+        return
+    try:
+        resource.close()
+    except Exception:
+        pass
+
+def stop_quietly(playwright):
+    """Stop a Playwright instance, ignoring errors"""
+    if playwright is None:
+        return
+    try:
+        playwright.stop()
+    except Exception:
+        pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Return the shared browser pool, creating it from the config on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(
+                workers=config.BROWSER_WORKERS,
+                pages_per_browser=config.BROWSER_PAGES_PER_BROWSER,
+                memory_limit_mb=config.BROWSER_MEMORY_LIMIT_MB,
+            )
+        return _pool
+
+def shutdown_browser_pool():
+    """Shut down the shared browser pool if it was started, and write the cookie banners its pages found"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+    banner_cache.close()
+
+atexit.register(shutdown_browser_pool)
@@ -0,0 +1,190 @@
+import os
+import yaml
+
+# Settings are read from config.yaml next to this file. Point the
+# PRIVACY_MONITOR_CONFIG environment variable at another file (e.g.
+# test_config.yaml) to override it. If no config.yaml exists yet we fall back
+# to config.example.yaml so the defaults are always available.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def find_config_path():
+    """Return the path of the YAML config file to load"""
+    env_path = os.environ.get("PRIVACY_MONITOR_CONFIG")
+    if env_path:
+        return env_path if os.path.isabs(env_path) else os.path.join(BASE_DIR, env_path)
+
+    config_path = os.path.join(BASE_DIR, "config.yaml")
+    if os.path.exists(config_path):
+        return config_path
+    return os.path.join(BASE_DIR, "config.example.yaml")
+
+def load_config(path):
+    """Load a YAML config file and return it as a dict"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+CONFIG_PATH = find_config_path()
+SETTINGS = load_config(CONFIG_PATH)
+
+def get_setting(section, key, default=None):
+    """
+    Look up a single setting, e.g. get_setting("monitor", "concurrency", 1)
+
+    Args:
+        section (str): top level section in the YAML file
+        key (str): key inside that section
+        default: value returned when the setting is missing
+    """
+    value = (SETTINGS.get(section) or {}).get(key)
+    return default if value is None else value
+
+def resolve_path(path):
+    """Resolve a path from the config relative to the project directory"""
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+# --- Email ---
+SMTP_SERVER = get_setting("email", "smtp_server")
+SMTP_PORT = get_setting("email", "smtp_port", 587)
+EMAIL_ADDRESS = get_setting("email", "email_address")
+EMAIL_PASSWORD = get_setting("email", "email_password")
+SMTP_STARTTLS = get_setting("email", "starttls", True)
+SMTP_TIMEOUT_SECONDS = get_setting("email", "timeout_seconds", 30)
+ALERT_DIGEST = get_setting("email", "digest", False)
+ALERT_BATCH_SIZE = get_setting("email", "batch_size", 20)
+ALERT_MAX_ATTEMPTS = get_setting("email", "max_attempts", 5)
+ALERT_LINGER_SECONDS = get_setting("email", "linger_seconds", 2)
+ALERT_IDLE_SECONDS = get_setting("email", "idle_seconds", 60)
+
+# --- Monitor ---
+CHECK_INTERVAL_HOURS = get_setting("monitor", "check_interval_hours", 24)
+USE_BROWSER_FOR = get_setting("monitor", "use_browser_for", [])
+CONCURRENCY = get_setting("monitor", "concurrency", 1)
+PER_HOST_CONCURRENCY = get_setting("monitor", "per_host_concurrency", 2)
+BROWSER_PROBE_HOURS = get_setting("monitor", "browser_probe_hours", 168)
+BROWSER_PROBE_MAX_DAYS = get_setting("monitor", "browser_probe_max_days", 60)
+DOMAIN_BROWSER_RATIO = get_setting("monitor", "domain_browser_ratio", 0.5)
+MAX_PAGE_BYTES = get_setting("monitor", "max_page_bytes", 5 * 1024 * 1024)
+ACCEPTED_CONTENT_TYPES = get_setting("monitor", "accepted_content_types", [
+    "text/html", "application/xhtml+xml", "text/plain",
+])
+
+# --- Per-host rate limiting and retries (rate_limiter.py) ---
+RATE_LIMIT_REQUESTS_PER_SECOND = get_setting("rate_limit", "requests_per_second", 2.0)
+RATE_LIMIT_BURST = get_setting("rate_limit", "burst", 4)
+RATE_LIMIT_ADAPTIVE = get_setting("rate_limit", "adaptive_concurrency", True)
+RATE_LIMIT_MIN_PER_HOST_CONCURRENCY = get_setting("rate_limit", "min_per_host_concurrency", 1)
+RATE_LIMIT_MAX_PER_HOST_CONCURRENCY = get_setting("rate_limit", "max_per_host_concurrency", 8)
+RATE_LIMIT_SLOW_FACTOR = get_setting("rate_limit", "slow_factor", 3.0)
+RATE_LIMIT_MAX_RETRIES = get_setting("rate_limit", "max_retries", 3)
+RATE_LIMIT_BACKOFF_BASE_SECONDS = get_setting("rate_limit", "backoff_base_seconds", 1.0)
+RATE_LIMIT_BACKOFF_MAX_SECONDS = get_setting("rate_limit", "backoff_max_seconds", 30)
+RATE_LIMIT_MAX_RETRY_AFTER_SECONDS = get_setting("rate_limit", "max_retry_after_seconds", 120)
+
+# --- Raw response cache (response_cache.py) ---
+RESPONSE_CACHE_ENABLED = get_setting("response_cache", "enabled", False)
+RESPONSE_CACHE_PATH = get_setting("response_cache", "path", "response_cache")
+RESPONSE_CACHE_MAX_MB = get_setting("response_cache", "max_mb", 1024)
+RESPONSE_CACHE_MAX_AGE_DAYS = get_setting("response_cache", "max_age_days", 30)
+
+# --- Extraction and diffing processes (cpu_pool.py) ---
+PROCESS_WORKERS = get_setting("processing", "workers", 0)
+PROCESS_MIN_OFFLOAD_BYTES = get_setting("processing", "min_offload_bytes", 64 * 1024)
+
+# --- Shared HTTP session (http_client.py) ---
+HTTP_POOL_HOSTS = get_setting("http", "pool_hosts", 100)
+HTTP_POOL_PER_HOST = get_setting("http", "pool_per_host", 8)
+HTTP_DNS_TTL_SECONDS = get_setting("http", "dns_ttl_seconds", 300)
+
+# --- Run metrics (metrics.py) ---
+METRICS_ENABLED = get_setting("metrics", "enabled", True)
+METRICS_KEEP_RUNS = get_setting("metrics", "keep_runs", 500)
+METRICS_EXPORT_PATH = get_setting("metrics", "export_path")
+
+# --- Page and link classification (indicator_matcher.py) ---
+MIN_CONTENT_LENGTH = get_setting("classifier", "min_content_length", 1000)
+COOKIE_INDICATORS = get_setting("classifier", "cookie_indicators", [
+    "cookie", "consent", "gdpr", "privacy settings", "accept all", "agree", "manage cookies",
+])
+JS_INDICATORS = get_setting("classifier", "js_indicators", [
+    "react", "vue", "angular", "window.__", "window.gon", "script", "function(", "var ", "const ", "let ",
+])
+PRIVACY_LINK_TERMS = get_setting("classifier", "privacy_link_terms", [
+    "privacy", "notice", "policy", "ccpa", "gdpr", "california", "do not sell", "your privacy choices",
+    "data rights", "transparency",
+])
+PRIVACY_LINK_PATTERNS = get_setting("classifier", "privacy_link_patterns", [r"opt.?out"])
+
+# --- Privacy link discovery (link_discoverer.py) ---
+DISCOVERY_MAX_DEPTH = get_setting("discovery", "max_depth", 2)
+DISCOVERY_MAX_PAGES = get_setting("discovery", "max_pages", 50)
+DISCOVERY_CONCURRENCY = get_setting("discovery", "concurrency", 4)
+DISCOVERY_PER_HOST_CONCURRENCY = get_setting("discovery", "per_host_concurrency", 2)
+DISCOVERY_SAME_SITE = get_setting("discovery", "same_site", True)
+DISCOVERY_RESPECT_ROBOTS = get_setting("discovery", "respect_robots", True)
+DISCOVERY_USER_AGENT = get_setting("discovery", "user_agent", "PrivacyPolicyMonitor/1.0")
+DISCOVERY_TIMEOUT_SECONDS = get_setting("discovery", "timeout_seconds", 10)
+
+# --- Scheduler (monitor.py --daemon) ---
+SCHEDULER_JITTER_FRACTION = get_setting("scheduler", "jitter_fraction", 0.1)
+SCHEDULER_RECENT_CHANGE_DAYS = get_setting("scheduler", "recent_change_days", 14)
+SCHEDULER_RECENT_CHANGE_FACTOR = get_setting("scheduler", "recent_change_factor", 0.5)
+SCHEDULER_STABLE_DAYS = get_setting("scheduler", "stable_days", 180)
+SCHEDULER_STABLE_FACTOR = get_setting("scheduler", "stable_factor", 2.0)
+SCHEDULER_BATCH_SIZE = get_setting("scheduler", "batch_size", 50)
+SCHEDULER_RETRY_MINUTES = get_setting("scheduler", "retry_minutes", 60)
+SCHEDULER_POLL_SECONDS = get_setting("scheduler", "poll_seconds", 60)
+SCHEDULER_RELOAD_SECONDS = get_setting("scheduler", "reload_seconds", 900)
+
+# --- Lease based sharding (shard_worker.py) ---
+SHARD_WORKER_ID = get_setting("sharding", "worker_id")
+SHARD_BATCH_SIZE = get_setting("sharding", "batch_size", 50)
+SHARD_LEASE_SECONDS = get_setting("sharding", "lease_seconds", 600)
+
+# --- Text extraction ---
+EXTRACTION_PARSER = get_setting("extraction", "parser", "auto") # auto, lxml or html.parser
+
+# --- Browser ---
+BROWSER_WORKERS = get_setting("browser", "workers", 2)
+BROWSER_PAGES_PER_BROWSER = get_setting("browser", "pages_per_browser", 100)
+BROWSER_MEMORY_LIMIT_MB = get_setting("browser", "memory_limit_mb", 1024)
+BROWSER_TIMEOUT_SECONDS = get_setting("browser", "timeout_seconds", 60)
+BROWSER_LEAN = get_setting("browser", "lean", True)
+BROWSER_BLOCK_RESOURCE_TYPES = get_setting("browser", "block_resource_types", ["image", "media", "font"])
+BROWSER_BLOCK_DOMAINS = get_setting("browser", "block_domains", [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "googleadservices.com", "connect.facebook.net", "facebook.net", "hotjar.com", "segment.io",
+    "segment.com", "scorecardresearch.com", "bat.bing.com", "clarity.ms", "mixpanel.com",
+    "amplitude.com", "fullstory.com", "nr-data.net", "adnxs.com", "criteo.com", "taboola.com",
+])
+BROWSER_WAIT_UNTIL = get_setting("browser", "wait_until", "domcontentloaded")
+BROWSER_WAIT_FOR_SELECTOR = get_setting("browser", "wait_for_selector")
+BROWSER_NAVIGATION_TIMEOUT_SECONDS = get_setting("browser", "navigation_timeout_seconds", 20)
+BROWSER_SELECTOR_TIMEOUT_SECONDS = get_setting("browser", "selector_timeout_seconds", 5)
+BROWSER_COOKIE_WAIT_MS = get_setting("browser", "cookie_wait_ms", 300)
+BROWSER_COOKIE_CLICK_TIMEOUT_MS = get_setting("browser", "cookie_click_timeout_ms", 3000)
+BROWSER_COOKIE_CACHE_DAYS = get_setting("browser", "cookie_cache_days", 7)
+BROWSER_COOKIE_SELECTORS = get_setting("browser", "cookie_selectors", [
+    'button:has-text("Accept")',
+    'button:has-text("Agree")',
+    'button:has-text("OK")',
+    'button:has-text("I agree")',
+    'button:has-text("Accept all")',
+    'button:has-text("Consent")',
+    'button:has-text("Allow")',
+    '[aria-label*="Accept"]',
+    '[aria-label*="agree"]',
+    '.accept-cookies',
+    '.cookie-accept',
+    '#accept-cookies',
+    '#cookie-accept',
+    '#consent-accept',
+    '#agree-cookies',
+])
+BROWSER_COOKIE_SELECTORS_BY_DOMAIN = get_setting("browser", "cookie_selectors_by_domain", {})
+
+# --- Database ---
+DATABASE_PATH = resolve_path(get_setting("database", "path", "privacy_policies.db"))
+DATABASE_BATCH_SIZE = get_setting("database", "batch_size", 50)
+DATABASE_CACHE_SIZE_MB = get_setting("database", "cache_size_mb", 20)
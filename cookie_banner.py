@@ -0,0 +1,170 @@
+import atexit
+import re
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+import config # type: ignore
+from repository import SiteRepository
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Selectors use Playwright syntax: CSS, or `tag:has-text("Text")` for an
+# element whose text contains Text (ignoring case).
+_HAS_TEXT = re.compile(r'^(.*):has-text\("(.*)"\)$')
+
+# Returns the index of the first candidate that matches a visible element, or -1.
+# Every candidate is checked in this one evaluation instead of one
+# is_visible() round trip to the browser per selector.
+FIND_BANNER_BUTTON_JS = """
+(candidates) => {
+    const isVisible = (element) => {
+        const rect = element.getBoundingClientRect();
+        if (!rect.width || !rect.height) return false;
+        const style = getComputedStyle(element);
+        return style.visibility !== 'hidden' && style.display !== 'none';
+    };
+    for (let i = 0; i < candidates.length; i++) {
+        const [css, text] = candidates[i];
+        let elements;
+        try {
+            elements = document.querySelectorAll(css);
+        } catch (e) {
+            continue; // invalid selector
+        }
+        for (const element of elements) {
+            if (text && !(element.innerText || element.textContent || '').toLowerCase().includes(text)) continue;
+            if (isVisible(element)) return i;
+        }
+    }
+    return -1;
+}
+"""
+
+def parse_selector(selector):
+    """Split a Playwright selector into (CSS selector, lowercase text or None) for FIND_BANNER_BUTTON_JS"""
+    match = _HAS_TEXT.match(selector)
+    if match:
+        return match.group(1) or "*", match.group(2).lower()
+    return selector, None
+
+def click_selector(selector):
+    """Playwright selector that clicks the visible element a candidate matched"""
+    return f"{selector} >> visible=true"
+
+class CookieBannerCache:
+    """
+    Remember per domain which selector dismissed the cookie banner, or that
+    the domain shows no banner (selector None). Kept in the cookie_banners
+    table so it survives between runs; "no banner" entries expire after
+    browser.cookie_cache_days so banners added later are found.
+
+    Writes are queued on a SiteRepository (its own one, opened on first use,
+    unless one is given) and committed in batches; close() writes the rest.
+    """
+
+    def __init__(self, repo=None):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._repo = repo
+        self._owns_repo = repo is None
+
+    def _repository(self):
+        if self._repo is None:
+            self._repo = SiteRepository()
+            self._repo.ensure_schema()
+        return self._repo
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        for row in self._repository().get_cookie_banners():
+            self._entries[row["domain"]] = (row["selector"], row["checked_at"])
+
+    def get(self, domain):
+        """Return (selector, checked_at) for a domain, or None if it has not been seen"""
+        with self._lock:
+            self._load()
+            return self._entries.get(domain)
+
+    def no_banner(self, domain):
+        """True if the domain recently showed no cookie banner"""
+        entry = self.get(domain)
+        if entry is None or entry[0] is not None:
+            return False
+        age = datetime.utcnow() - datetime.fromisoformat(entry[1])
+        return age < timedelta(days=config.BROWSER_COOKIE_CACHE_DAYS)
+
+    def set(self, domain, selector):
+        """Store the selector that worked for a domain (None: no banner)"""
+        checked_at = datetime.utcnow().isoformat()
+        with self._lock:
+            self._load()
+            previous = self._entries.get(domain)
+            self._entries[domain] = (selector, checked_at)
+            if previous is not None and previous[0] == selector and selector is not None:
+                return # Nothing new to store
+            self._repository().queue_cookie_banner(domain, selector, checked_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries = None
+
+    def close(self):
+        """Write the queued entries and close the cache's own repository"""
+        with self._lock:
+            if self._repo is None:
+                return
+            if self._owns_repo:
+                self._repo.close()
+                self._repo = None
+            else:
+                self._repo.flush()
+            self._entries = None
+
+banner_cache = CookieBannerCache()
+atexit.register(banner_cache.close)
+
+def candidate_selectors(domain, cached_selector=None):
+    """
+    Selectors to try on a domain, in order: the custom selectors configured
+    for it (browser.cookie_selectors_by_domain), the one that worked last
+    time, then the generic list.
+    """
+    custom = []
+    for configured_domain, selectors in (config.BROWSER_COOKIE_SELECTORS_BY_DOMAIN or {}).items():
+        configured_domain = configured_domain.lower().lstrip(".")
+        if domain == configured_domain or domain.endswith("." + configured_domain):
+            custom.extend(selectors)
+    ordered = custom + ([cached_selector] if cached_selector else []) + list(config.BROWSER_COOKIE_SELECTORS)
+    # Keep the first occurrence of each selector
+    return list(dict.fromkeys(ordered))
+
+def dismiss_cookie_banner(page, cache=None):
+    """
+    Click the accept button of a cookie banner if the page shows one.
+
+    Returns:
+        str: the selector that was clicked, or None
+    """
+    cache = cache or banner_cache
+    domain = (urlparse(page.url).hostname or "").lower()
+    if cache.no_banner(domain):
+        return None
+
+    entry = cache.get(domain)
+    candidates = candidate_selectors(domain, entry[0] if entry else None)
+    index = page.evaluate(FIND_BANNER_BUTTON_JS, [list(parse_selector(selector)) for selector in candidates])
+    if index is None or index < 0:
+        # No banner is also what a domain shows once consent was given, so a
+        # selector that worked is kept, only unknown domains are marked
+        if entry is None or entry[0] is None:
+            cache.set(domain, None)
+        return None
+
+    selector = candidates[index]
+    page.click(click_selector(selector), timeout=config.BROWSER_COOKIE_CLICK_TIMEOUT_MS)
+    page.wait_for_timeout(config.BROWSER_COOKIE_WAIT_MS)
+    cache.set(domain, selector)
+    return selector
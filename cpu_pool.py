@@ -0,0 +1,103 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import config # type: ignore
+from fingerprint import content_fingerprint
+from page_classifier import should_use_browser
+from text_extraction import extract_text, normalize_lines
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Text extraction and diffing in worker processes.
+#
+# With concurrent fetches, the HTML parsing and difflib work of a check is
+# CPU bound and the GIL runs it on one core whatever the number of fetch
+# threads. With processing.workers set, a fetch thread hands the downloaded
+# body to a process pool and waits for the result, so the pages of a run are
+# extracted on all cores. Only what the check needs comes back: the
+# fingerprint, whether the page needs the browser, and the text only when it
+# differs from the stored version. A diff (policy_diff.alert_diff) comes back
+# as the alert text.
+#
+# The workers are started with "spawn" (forking a process that runs threads
+# is not safe), so they read config.yaml themselves and do not see settings
+# changed at runtime.
+
+# Result of process_page. text is None when the fingerprint equals the known one.
+PageText = namedtuple("PageText", ["text", "fingerprint", "needs_browser"])
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def process_page(body, kind, url, known_hash=None):
+    """
+    Extract the text of a downloaded page ("html" or "text" kind), fingerprint it
+    and check whether it needs the browser. The text is left out of the result
+    when its fingerprint is known_hash (the page did not change).
+    """
+    text = extract_text(body) if kind == "html" else normalize_lines(body)
+    fingerprint = content_fingerprint(text)
+    needs_browser = should_use_browser(text, url)
+    if known_hash is not None and fingerprint == known_hash:
+        text = None
+    return PageText(text, fingerprint, needs_browser)
+
+def worker_count():
+    """processing.workers as a number ("auto" is one per core, 0 means no pool)"""
+    workers = config.PROCESS_WORKERS
+    if workers == "auto":
+        return os.cpu_count() or 1
+    return int(workers or 0)
+
+def get_cpu_pool():
+    """Return the shared process pool, started on first use, or None when processing.workers is 0"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = worker_count()
+            if workers > 0:
+                _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+                logger.info(f"Started {workers} worker processes for text extraction and diffing.")
+        return _pool
+
+def run_cpu(func, *args, size=None):
+    """
+    Run func(*args) in the process pool and wait for its result. Runs it in the
+    calling thread instead when there is no pool, or when size (of the input,
+    in bytes) is below processing.min_offload_bytes and copying it to a worker
+    would cost more than the work itself.
+    """
+    if size is not None and size < config.PROCESS_MIN_OFFLOAD_BYTES:
+        return func(*args)
+    pool = get_cpu_pool()
+    if pool is None:
+        return func(*args)
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        # A worker was killed (e.g. out of memory): start a new pool for the next pages
+        logger.error(f"A worker process died during {func.__name__}, restarting the process pool.")
+        _discard_pool(pool)
+        return func(*args)
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_cpu_pool():
+    """Stop the worker processes (a later run_cpu starts a new pool)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+atexit.register(shutdown_cpu_pool)
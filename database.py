@@ -1,55 +1,37 @@
 import sqlite3
-import os
+import config # type: ignore
 from log_config import setup_logger
 
 logger = setup_logger(__name__)  # __name__ will be 'database' for this file
 
 def get_db_connection():
     """Create and return a database connection to the SQLite database."""
-    # Get the directory of this script
     logger.debug("Establishing database connection")
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    # Create the full path to the database file
-    db_path = os.path.join(base_dir, 'privacy_policies.db')
-
-    conn = sqlite3.connect(db_path)
+    # The database path comes from config.yaml (database.path)
+    conn = sqlite3.connect(config.DATABASE_PATH)
     conn.row_factory = sqlite3.Row # This allows us to access columns by name
     return conn
 
-def init_db():
-    """Initialize the database with the required tables."""
-    logger.info("Initializing database")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    logger.info("Database initialized successfully")
-
-    # Create a table to store the monitored sites and their latest content
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS monitored_sites (
-            id INTEGER PRIMARY KEY,
-            url TEXT UNIQUE NOT NULL,
-            site_name TEXT,
-            last_checked TEXT,
-            last_content TEXT,
-            requires_browser INTEGER DEFAULT 0
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
-    logger.info("Database initialized successfully.")
-
-def add_site(url, site_name=None):
-    """Add a new site to the monitored_sites table."""
+def add_site(url, site_name=None, check_interval_hours=None):
+    """
+    Add a new site to the monitored_sites table.
+    check_interval_hours overrides monitor.check_interval_hours for this site.
+    """
     logger.info(f"Attempting to add site: {url}.")
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute(
-            "Insert INTO monitored_sites (url, site_name) VALUES (?, ?)",
-            (url, site_name)
-        )
+        if check_interval_hours is None:
+            cursor.execute(
+                "Insert INTO monitored_sites (url, site_name) VALUES (?, ?)",
+                (url, site_name)
+            )
+        else:
+            cursor.execute(
+                "Insert INTO monitored_sites (url, site_name, check_interval_hours) VALUES (?, ?, ?)",
+                (url, site_name, check_interval_hours)
+            )
         conn.commit()
         conn.close()
         logger.info(f"Succesfully added {url} to monitored sites.")
@@ -58,6 +40,29 @@ def add_site(url, site_name=None):
     finally:
         conn.close()
 
+def add_sites(sites):
+    """
+    Add many sites to the monitored_sites table in one transaction.
+    URLs that are already monitored are skipped.
+
+    Args:
+        sites (list): (url, site_name) pairs
+
+    Returns:
+        int: the number of sites added
+    """
+    sites = list(sites)
+    conn = get_db_connection()
+    try:
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO monitored_sites (url, site_name) VALUES (?, ?)", sites)
+        conn.commit()
+        added = conn.total_changes - before
+        logger.info(f"Added {added} of {len(sites)} sites to monitored sites.")
+        return added
+    finally:
+        conn.close()
+
 def mark_site_as_requires_browser(site_id):
     """
     Mark a site as requireing browser automation in the database
@@ -66,9 +71,6 @@ def mark_site_as_requires_browser(site_id):
     cursor = conn.cursor()
 
     try:
-        
-        check_add_column("requires_browser", "INTEGER DEFAULT 0")
-        
         cursor.execute(
             "UPDATE monitored_sites SET requires_browser = 1 WHERE id = ?",
             (site_id,)
@@ -82,7 +84,9 @@ def mark_site_as_requires_browser(site_id):
 
 def check_add_column(column_name, column_defintion):
     """
-    Add a new column to the monitored_sites table if it doesnt exist
+    Add a new column to the monitored_sites table if it doesnt exist.
+    Schema changes made by the monitor itself belong in migrations.py, this is
+    only meant for one-off changes from scripts.
     
     Args:
         column_name (str): the name of the column to add
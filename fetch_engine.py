@@ -0,0 +1,123 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class FetchEngine:
+    """
+    Run a blocking fetch function for many sites at once with asyncio.
+
+    The fetch function is run in a thread pool so the existing requests and
+    Playwright code can be reused as is. Two limits are applied:
+    - concurrency: the maximum number of fetches running at the same time
+    - per_host_concurrency: the maximum number of fetches for a single host
+
+    With a host_limiter (rate_limiter.HostRateLimiter) the per host limit
+    starts at per_host_concurrency and then follows the limiter, which adapts
+    it to how each host responds.
+
+    Results are handed to a callback as soon as each fetch finishes, so the
+    diff/alert/update logic does not wait for the whole batch.
+    """
+
+    def __init__(self, fetch_func, concurrency=10, per_host_concurrency=2, host_limiter=None):
+        if concurrency < 1 or per_host_concurrency < 1:
+            raise ValueError("Concurrency limits must be at least 1.")
+        self.fetch_func = fetch_func
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.host_limiter = host_limiter
+        self._global_limit = None
+        self._host_limits = {}
+
+    def _host_limit(self, url):
+        """Return the limit for the host of a URL (created on first use)"""
+        host = (urlparse(url).hostname or "").lower()
+        if host not in self._host_limits:
+            if self.host_limiter is not None:
+                self._host_limits[host] = AdaptiveHostLimit(host, self.host_limiter, self.per_host_concurrency)
+            else:
+                self._host_limits[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_limits[host]
+
+    async def _fetch(self, site, url):
+        """Fetch one site, waiting for a host slot before taking a global slot"""
+        # Taking the host slot first means a site waiting on a busy host never
+        # holds one of the global slots that other hosts could be using.
+        async with self._host_limit(url):
+            async with self._global_limit:
+                try:
+                    result = await asyncio.to_thread(self.fetch_func, site)
+                except Exception as e:
+                    logger.error(f"Unexpected error fetching {url}: {e}.")
+                    result = None
+        return site, result
+
+    async def run(self, sites, on_result, get_url=lambda site: site[1]):
+        """
+        Fetch all sites and call on_result(site, result) for each one as it finishes.
+
+        Args:
+            sites (list): rows to fetch
+            on_result (callable): called in the event loop thread, one result at a time
+            get_url (callable): returns the URL of a row (defaults to the second column)
+
+        Returns:
+            int: the number of sites processed
+        """
+        loop = asyncio.get_running_loop()
+        # The default executor is capped at a small number of threads, so give
+        # the engine one thread per global slot.
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fetch")
+        loop.set_default_executor(executor)
+        self._global_limit = asyncio.Semaphore(self.concurrency)
+        self._host_limits = {}
+
+        tasks = [asyncio.create_task(self._fetch(site, get_url(site))) for site in sites]
+        processed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                site, result = await next_done
+                try:
+                    on_result(site, result)
+                except Exception as e:
+                    logger.error(f"Error processing result for {get_url(site)}: {e}.")
+                processed += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+        return processed
+
+class AdaptiveHostLimit:
+    """
+    Async context manager like a semaphore, but the number of slots is read
+    from the host limiter each time, so it can grow and shrink during a run
+    """
+
+    def __init__(self, host, host_limiter, initial):
+        self.host = host
+        self.host_limiter = host_limiter
+        self.initial = initial
+        self.in_flight = 0
+        self._released = asyncio.Condition()
+
+    def _has_slot(self):
+        return self.in_flight < self.host_limiter.concurrency(self.host, self.initial)
+
+    async def __aenter__(self):
+        async with self._released:
+            await self._released.wait_for(self._has_slot)
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._released:
+            self.in_flight -= 1
+            self._released.notify_all()
+
+def run_fetch_engine(sites, fetch_func, on_result, concurrency=10, per_host_concurrency=2, host_limiter=None):
+    """Blocking helper that runs a FetchEngine over the given sites"""
+    engine = FetchEngine(fetch_func, concurrency, per_host_concurrency, host_limiter)
+    return asyncio.run(engine.run(sites, on_result))
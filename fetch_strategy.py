@@ -0,0 +1,113 @@
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+import config # type: ignore
+from url_utils import host_of
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Fetch strategies, from cheapest to most expensive
+REQUESTS = "requests" # plain HTTP request, browser only if the page looks like a cookie wall/JS page
+PROBE = "probe" # a site known to need the browser, trying requests again
+BROWSER = "browser" # straight to the browser
+
+class FetchStrategyResolver:
+    """
+    Pick the cheapest fetch path that is known to work for each site.
+
+    - Sites on a domain listed in monitor.use_browser_for always use the browser.
+    - Sites marked requires_browser use the browser. requests is re-probed after
+      browser_probe_hours, and after every failed probe the wait doubles (up to
+      browser_probe_max_days), so sites that stopped needing the browser go back
+      to the cheap path without re-probing every site on every run.
+    - New sites on a domain where most known sites need the browser start with
+      the browser instead of a requests fetch that would be thrown away.
+    - Everything else uses requests.
+
+    One resolver is used per run. record() keeps per-strategy counts, logged by
+    log_summary() at the end of the run.
+    """
+
+    def __init__(self, repo, use_browser_for=None, clock=datetime.utcnow):
+        self.repo = repo
+        self.clock = clock
+        self.use_browser_for = [domain.lower().lstrip(".") for domain in
+                                (config.USE_BROWSER_FOR if use_browser_for is None else use_browser_for) or []]
+        self.probe_hours = config.BROWSER_PROBE_HOURS
+        self.probe_max_days = config.BROWSER_PROBE_MAX_DAYS
+        self.domain_browser_ratio = config.DOMAIN_BROWSER_RATIO
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._probe_state = {}
+        self._domain_counts = defaultdict(lambda: [0, 0]) # host -> [sites needing the browser, sites]
+        for row in repo.get_fetch_strategy_rows():
+            self._probe_state[row["id"]] = (row["browser_probe_failures"] or 0, row["last_probe"])
+            if row["content_hash"] is not None:
+                counts = self._domain_counts[host_of(row["url"])]
+                counts[0] += 1 if row["requires_browser"] else 0
+                counts[1] += 1
+
+    def choose(self, site_id, url, requires_browser, is_new=False):
+        """Return the strategy (REQUESTS, PROBE or BROWSER) to fetch a site with"""
+        host = host_of(url)
+        if self.is_browser_domain(host):
+            return BROWSER
+        if requires_browser:
+            return PROBE if self.probe_due(site_id) else BROWSER
+        if is_new:
+            browser_sites, sites = self._domain_counts.get(host, (0, 0))
+            if sites and browser_sites / sites >= self.domain_browser_ratio:
+                logger.debug(f"{browser_sites} of {sites} sites on {host} need the browser, using it for {url}.")
+                with self._lock:
+                    self.stats["domain_browser"] += 1
+                return BROWSER
+        return REQUESTS
+
+    def is_browser_domain(self, host):
+        return any(host == domain or host.endswith("." + domain) for domain in self.use_browser_for)
+
+    def probe_due(self, site_id):
+        """True if a browser site should try requests again (the wait doubles after each failed probe)"""
+        failures, last_probe = self._probe_state.get(site_id, (0, None))
+        if last_probe is None:
+            return True
+        wait_hours = min(self.probe_hours * 2 ** min(failures, 20), self.probe_max_days * 24)
+        return self.clock() >= datetime.fromisoformat(last_probe) + timedelta(hours=wait_hours)
+
+    def record(self, strategy, requests_ok, browser_used=False, browser_ok=False):
+        """
+        Count the outcome of one fetch.
+
+        Args:
+            strategy (str): the strategy choose() returned
+            requests_ok (bool): the requests fetch gave usable text (False if it was not tried)
+            browser_used (bool): the browser was launched
+            browser_ok (bool): the browser gave text
+        """
+        with self._lock:
+            self.stats[strategy] += 1
+            if strategy == BROWSER:
+                # A requests fetch that would only have been thrown away
+                self.stats["requests_skipped"] += 1
+            elif requests_ok:
+                self.stats[f"{strategy}_ok"] += 1
+                # Without the resolver this site would have gone straight to the browser
+                if strategy == PROBE:
+                    self.stats["browser_avoided"] += 1
+            if browser_used:
+                self.stats["browser_launches"] += 1
+                self.stats["browser_ok"] += 1 if browser_ok else 0
+
+    def log_summary(self):
+        stats = self.stats
+        def rate(ok, total):
+            return f"{ok}/{total} ({ok / total:.0%})" if total else "0/0"
+        logger.info(
+            f"Fetch strategies: requests {rate(stats['requests_ok'], stats['requests'])} ok, "
+            f"probes {rate(stats['probe_ok'], stats['probe'])} back on requests, "
+            f"browser direct {stats['browser']} ({stats['domain_browser']} by domain), "
+            f"browser launches {rate(stats['browser_ok'], stats['browser_launches'])} ok, "
+            f"{stats['browser_avoided']} browser launches avoided, "
+            f"{stats['requests_skipped']} wasted requests fetches skipped."
+        )
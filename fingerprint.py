@@ -0,0 +1,16 @@
+import hashlib
+
+def normalize_text(text):
+    """Collapse all runs of whitespace to a single space so reflowed text compares equal"""
+    return " ".join(text.split())
+
+def content_fingerprint(text):
+    """
+    Return the SHA-256 fingerprint of a policy's normalized text.
+
+    Two versions with the same fingerprint are treated as unchanged, so the old
+    body only has to be loaded from the database when the fingerprints differ.
+    """
+    if text is None:
+        return None
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bench_extraction import generate_policy_page
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Kinds of policy pages the server can play
+STATIC = "static" # a plain policy page requests can read
+JS = "js" # an app shell, the policy only shows up when rendered
+COOKIE = "cookie" # a cookie wall in front of the policy
+LARGE = "large" # a plain policy page of a few MB
+RECORDED = "recorded" # a page from the corpus directory
+KINDS = (STATIC, JS, COOKIE, LARGE)
+
+JS_SHELL = """<html><head><title>Privacy</title>
+<script src="/static/vendor.react.js"></script></head>
+<body><div id="root"></div>
+<script>window.__INITIAL_STATE__ = {}; const app = function() { return null; };</script>
+</body></html>"""
+
+COOKIE_WALL = """<html><body><div class="consent">
+<p>We use cookies. Please accept all cookies to see this page.</p>
+<button>Accept all</button><button>Manage cookies</button></div></body></html>"""
+
+_PATH = re.compile(r"^/site/(\d+)/(\w+)(?:/([\w.-]+))?$")
+
+class FixtureServer:
+    """
+    Local HTTP server playing many policy sites for benchmarks and tests.
+
+    A site is /site/<n>/<kind> (see KINDS) or /site/<n>/recorded/<file> for
+    the .html files of corpus_dir. Every site has a version that changes its
+    policy text (change_sites), pages have an ETag and answer conditional
+    requests with 304, and every answer waits latency_ms +/- jitter_ms.
+    Add ?rendered=1 to get what a browser would show for JS and cookie wall pages.
+
+    With several hosts (e.g. 127.0.0.1, 127.0.0.2... on Linux) the sites are
+    spread over one listener per address, so per-host limits apply as they
+    would to different real sites.
+
+        with FixtureServer(latency_ms=50) as server:
+            server.url(1, "static")
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, corpus_dir=None, hosts=("127.0.0.1",), port=0,
+                 sections=40, large_sections=1500, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.sections = sections
+        self.large_sections = large_sections
+        self.versions = {}
+        self.corpus = load_corpus(corpus_dir) if corpus_dir else {}
+        self.stats = {"requests": 0, "not_modified": 0, "bytes": 0}
+        self._random = random.Random(seed)
+        self._templates = {}
+        self._lock = threading.Lock()
+        handler = self._handler_class()
+        self.servers = []
+        for host in hosts:
+            server = ThreadingHTTPServer((host, port), handler)
+            server.daemon_threads = True
+            self.servers.append(server)
+
+    @property
+    def base_url(self):
+        return self.host_url(0)
+
+    def host_url(self, index):
+        host, port = self.servers[index].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, site, kind=STATIC, name=None):
+        base = self.host_url(site % len(self.servers))
+        return f"{base}/site/{site}/{kind}" + (f"/{name}" if name else "")
+
+    def start(self):
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def change_sites(self, fraction, sites):
+        """Publish a new policy version for about `fraction` of the given site numbers"""
+        changed = [site for site in sites if self._random.random() < fraction]
+        with self._lock:
+            for site in changed:
+                self.versions[site] = self.versions.get(site, 0) + 1
+        return changed
+
+    def page(self, site, kind, name=None, rendered=False):
+        """Return the HTML of a site's page"""
+        version = self.versions.get(site, 0)
+        if kind == RECORDED:
+            html = self.corpus[name]
+            # The recorded text itself does not change, the version is added before </body>
+            return html.replace("</body>", f"<p>Policy version {version}.</p></body>", 1) if version else html
+        if kind in (JS, COOKIE) and not rendered:
+            return JS_SHELL if kind == JS else COOKIE_WALL
+        sections = self.large_sections if kind == LARGE else self.sections
+        template = self._templates.get(sections)
+        if template is None:
+            template = self._templates[sections] = generate_policy_page(sections).replace(
+                "<main>", "<main><h1>Privacy Policy of site {site}</h1><p>Policy version {version}.</p>", 1)
+        return template.replace("{site}", str(site), 1).replace("{version}", str(version), 1)
+
+    def delay(self):
+        seconds = (self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _handler_class(self):
+        fixture = self
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the sites being played
+            def do_GET(self):
+                fixture.delay()
+                fixture._count("requests")
+                path, _, query = self.path.partition("?")
+                match = _PATH.match(path)
+                if not match or match.group(2) not in KINDS + (RECORDED,) \
+                        or (match.group(2) == RECORDED and match.group(3) not in fixture.corpus):
+                    self.send_error(404)
+                    return
+                body = fixture.page(int(match.group(1)), match.group(2), match.group(3),
+                                    rendered="rendered=1" in query).encode("utf-8")
+                etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    fixture._count("not_modified")
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                fixture._count("bytes", len(body))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except OSError:
+                    pass # the client hung up (e.g. size cap)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FixtureHandler
+
+def load_corpus(corpus_dir):
+    """Return {file name: HTML} for the .html files of a directory"""
+    corpus = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(corpus_dir, name), encoding="utf-8", errors="replace") as f:
+                corpus[name] = f.read()
+    logger.info(f"Loaded {len(corpus)} recorded pages from {corpus_dir}.")
+    return corpus
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic policy sites locally.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--corpus", help="directory of recorded .html policy pages")
+    args = parser.parse_args(argv)
+
+    server = FixtureServer(args.latency_ms, args.jitter_ms, args.corpus, port=args.port)
+    print(f"Serving on {server.base_url}, e.g. {server.url(0, STATIC)} (kinds: {', '.join(KINDS)}). Ctrl+C stops.")
+    try:
+        server.servers[0].serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.servers[0].server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import http.cookiejar
+import ipaddress
+import socket
+import threading
+import time
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util import make_headers
+from urllib3.util.connection import allowed_gai_family
+import config # type: ignore
+from url_utils import host_of
+from metrics import run_metrics
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# One requests session for the whole process, used by monitor.py (through
+# rate_limiter.request_with_retry) and link_discoverer.py instead of the
+# module level requests.get, which opens a new connection (and TLS handshake)
+# for every URL.
+#
+# - Keep-alive connections are pooled per host (http.pool_per_host, at least
+#   the per-host concurrency) for up to http.pool_hosts hosts, so many policy
+#   URLs on one host share a few connections.
+# - Host names are resolved once per http.dns_ttl_seconds instead of for every
+#   new connection: the address a connection was made to is reused for the
+#   next ones. A cached address that cannot be connected to is looked up again.
+#   The lookups (and cache hits) are timed as the "dns" run stage.
+# - Accept-Encoding offers every encoding urllib3 can decode here (gzip and
+#   deflate, plus br/zstd when brotli/zstandard are installed).
+# - Cookies are not kept between requests, every fetch starts like a fresh
+#   requests.get (a cookie wall's cookie must not leak into other checks).
+#
+# get_client_stats() counts requests, new connections and DNS lookups; the
+# difference between requests and new connections is the reused connections.
+
+class DNSCache:
+    """Addresses connected to per host name, kept for ttl_seconds"""
+
+    def __init__(self, ttl_seconds=None, clock=time.monotonic):
+        self.ttl_seconds = config.HTTP_DNS_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.clock = clock
+        self._addresses = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, port):
+        """Return the cached address of host, or None if urllib3 has to look it up"""
+        if not self.ttl_seconds:
+            return None
+        with self._lock:
+            cached = self._addresses.get((host, port))
+        if cached is not None and cached[1] > self.clock():
+            _client_stats.count("dns_hits")
+            return cached[0]
+        _client_stats.count("dns_lookups")
+        return None
+
+    def remember(self, host, port, address):
+        if not self.ttl_seconds:
+            return
+        with self._lock:
+            self._addresses[(host, port)] = (address, self.clock() + self.ttl_seconds)
+
+    def forget(self, host, port):
+        with self._lock:
+            self._addresses.pop((host, port), None)
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+class ClientStats:
+    """Counters of the shared client, in total and per host, also added to the run metrics as http_<name>"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, host=None, value=1):
+        with self._lock:
+            self._counts[name] += value
+            if host is not None:
+                self._hosts.setdefault(host, Counter())[name] += value
+        run_metrics.count(f"http_{name}", value)
+
+    def get(self, reset=False):
+        """Return (totals, {host: counts})"""
+        with self._lock:
+            counts, hosts = Counter(self._counts), {host: Counter(c) for host, c in self._hosts.items()}
+            if reset:
+                self._counts.clear()
+                self._hosts.clear()
+        return counts, hosts
+
+_client_stats = ClientStats()
+_dns_cache = DNSCache()
+
+class _CachedDNSMixin:
+    """Connects to the DNSCache address of the host; TLS still checks the host name"""
+
+    def _new_conn(self):
+        dns_host = self._dns_host
+        _client_stats.count("connections", dns_host.rstrip("."))
+        if _is_ip(dns_host):
+            return super()._new_conn()
+        with run_metrics.timer("dns"):
+            address = _dns_cache.get(dns_host, self.port)
+        if address is not None:
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except NewConnectionError:
+                _dns_cache.forget(dns_host, self.port) # Moved or down, look it up again below
+            except ConnectTimeoutError:
+                _dns_cache.forget(dns_host, self.port)
+                raise
+            finally:
+                self._dns_host = dns_host
+        addresses = self._resolve(dns_host)
+        for i, address in enumerate(addresses):
+            self._dns_host = address
+            try:
+                sock = super()._new_conn()
+            except NewConnectionError:
+                if i == len(addresses) - 1:
+                    raise
+                continue
+            finally:
+                self._dns_host = dns_host
+            _dns_cache.remember(dns_host, self.port, address)
+            return sock
+        return super()._new_conn() # Not resolved, let urllib3 raise its NameResolutionError
+
+    def _resolve(self, host):
+        """Addresses of host in getaddrinfo order, [] if it cannot be resolved"""
+        with run_metrics.timer("dns"):
+            try:
+                infos = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            except (OSError, UnicodeError):
+                return []
+        return list(dict.fromkeys(info[4][0] for info in infos))
+
+class CachedDNSHTTPConnection(_CachedDNSMixin, HTTPConnection):
+    pass
+
+class CachedDNSHTTPSConnection(_CachedDNSMixin, HTTPSConnection):
+    pass
+
+class CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CachedDNSHTTPConnection
+
+class CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools use the DNS cache"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CachedDNSHTTPConnectionPool,
+            "https": CachedDNSHTTPSConnectionPool,
+        }
+
+class MonitorSession(requests.Session):
+    """requests.Session counting its requests per host"""
+
+    def request(self, method, url, *args, **kwargs):
+        _client_stats.count("requests", host_of(url))
+        return super().request(method, url, *args, **kwargs)
+
+_session = None
+_session_lock = threading.Lock()
+
+def pool_per_host():
+    """Idle connections kept per host: http.pool_per_host, but at least the per-host concurrency"""
+    concurrency = config.PER_HOST_CONCURRENCY
+    if config.RATE_LIMIT_ADAPTIVE:
+        concurrency = max(concurrency, config.RATE_LIMIT_MAX_PER_HOST_CONCURRENCY)
+    return max(config.HTTP_POOL_PER_HOST, concurrency, config.DISCOVERY_PER_HOST_CONCURRENCY)
+
+def create_session():
+    session = MonitorSession()
+    adapter = PooledAdapter(pool_connections=config.HTTP_POOL_HOSTS, pool_maxsize=pool_per_host(), max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+def get_session():
+    """Return the process-wide session (created on first use)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+            logger.debug(f"HTTP client: {config.HTTP_POOL_HOSTS} host pools of {pool_per_host()} connections, "
+                         f"Accept-Encoding {_session.headers['Accept-Encoding']}.")
+        return _session
+
+def close_session():
+    """Close the pooled connections (the next get_session() starts a new session)"""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+def discard(response, max_bytes=64 * 1024):
+    """
+    Close a response whose body is not needed. A small or empty body (e.g. a 304)
+    is read to the end first, so the connection goes back to the pool instead of
+    being closed.
+    """
+    try:
+        length = response.headers.get("Content-Length")
+        if response.status_code in (204, 304) or (length and length.isdigit() and int(length) <= max_bytes):
+            response.content
+    except requests.exceptions.RequestException:
+        pass
+    finally:
+        response.close()
+
+def get_client_stats(reset=False):
+    """
+    Return (totals, {host: counts}) of requests, new connections (handshakes)
+    and DNS cache hits/lookups since the last reset
+    """
+    return _client_stats.get(reset)
+
+def log_client_stats():
+    """Log the connection reuse since the last summary"""
+    stats, hosts = get_client_stats(reset=True)
+    if not stats["requests"]:
+        return
+    reused = max(0, stats["requests"] - stats["connections"])
+    logger.info(
+        f"HTTP client: {stats['requests']} requests to {len(hosts)} hosts over {stats['connections']} new "
+        f"connections ({reused / stats['requests']:.0%} on a reused connection), "
+        f"DNS cache {stats['dns_hits']} hits, {stats['dns_lookups']} lookups."
+    )
+    busiest = sorted(hosts.items(), key=lambda item: item[1]["requests"], reverse=True)[:5]
+    for host, counts in busiest:
+        logger.debug(f"  {host}: {counts['requests']} requests, {counts['connections']} new connections.")
@@ -0,0 +1,63 @@
+import re
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class IndicatorMatcher:
+    """
+    Find which of a fixed set of indicators occur in a text, ignoring case.
+
+    terms are plain strings, patterns are regular expressions matched against
+    the lowercased text (so write them in lowercase). Both are
+    compiled once: the text is lowercased once, terms are found with str's
+    substring search and all patterns are combined into one regex, so a page
+    or link is scanned once per term instead of once per indicator and
+    re.search call. (In CPython this is faster than a single alternation of
+    every indicator, which defeats the regex engine's literal prefix search.)
+    """
+
+    def __init__(self, terms=(), patterns=()):
+        self.terms = tuple(term.lower() for term in terms)
+        self.patterns = tuple(patterns)
+        self._pattern_regexes = [re.compile(pattern) for pattern in self.patterns]
+        self._combined = re.compile("|".join(f"(?:{pattern})" for pattern in self.patterns)) if self.patterns else None
+
+    def __repr__(self):
+        return f"IndicatorMatcher({len(self.terms)} terms, {len(self.patterns)} patterns)"
+
+    def search(self, *texts):
+        """Return the first indicator found in any of the texts (terms before patterns), or None"""
+        text = _lowered(texts)
+        for term in self.terms:
+            if term in text:
+                return term
+        if self._combined is not None:
+            match = self._combined.search(text)
+            if match:
+                return self._which_pattern(text, match)
+        return None
+
+    def find_all(self, *texts):
+        """
+        Return every indicator found in the texts, in the order they were configured.
+        Each pattern is searched on its own (not on the hot path): the combined
+        regex only finds non-overlapping matches, so a pattern matching inside
+        another one's match would be missed.
+        """
+        text = _lowered(texts)
+        found = [term for term in self.terms if term in text]
+        found.extend(pattern for pattern, regex in zip(self.patterns, self._pattern_regexes) if regex.search(text))
+        return found
+
+    def _which_pattern(self, text, match):
+        # The combined regex tries the patterns in order, so the first one that
+        # matches at the same position is the one that matched. Only called on a
+        # match, the per-pattern regexes never scan the whole text.
+        for pattern, regex in zip(self.patterns, self._pattern_regexes):
+            if regex.match(text, match.start()):
+                return pattern
+        return None
+
+def _lowered(texts):
+    # Newline keeps an indicator from matching across the end of one text and the start of the next
+    return (texts[0] if len(texts) == 1 else "\n".join(texts)).lower()
@@ -1,4 +1,4 @@
-from database import init_db
+from migrations import init_db
 
 if __name__ == "__main__":
     init_db()
\ No newline at end of file
@@ -1,85 +1,251 @@
-from urllib.parse import urljoin, urlparse
-from browser_handler import get_page_text_with_browser
-from bs4 import BeautifulSoup
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+import argparse
 import re
+import threading
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from browser_handler import open_page
+from database import add_sites
+from fetch_engine import run_fetch_engine
+from http_client import get_session
+from indicator_matcher import IndicatorMatcher
 from log_config import setup_logger
-from playwright.sync_api import sync_playwright # type: ignore
+from rate_limiter import request_with_retry, RETRY_STATUSES
+from response_reader import content_kind, read_text, ResponseTooLarge, UnsupportedContentType
+from browser_pool import get_browser_pool
+import config # type: ignore
 
 logger = setup_logger(__name__)
 
-def discover_privacy_links(main_url):
+PRIVACY_LINK_INDICATORS = IndicatorMatcher(config.PRIVACY_LINK_TERMS, config.PRIVACY_LINK_PATTERNS)
+
+# An <a> start tag, whatever whitespace follows the tag name
+_LINK_TAG = re.compile(r"<a[\s>]", re.IGNORECASE)
+
+def discover_privacy_links(main_url, max_depth=None, max_pages=None, concurrency=None):
     """
-    Discover all privacy-related links on a main privacy page
+    Discover all privacy-related links starting from a main privacy page.
+    Privacy links are followed breadth first up to max_depth hops (see PrivacyLinkCrawler).
+
+    Returns:
+        list: (absolute url, link text) pairs
     """
     logger.info(f"Discovering privacy links on {main_url}.")
+    crawler = PrivacyLinkCrawler(main_url, max_depth, max_pages, concurrency)
+    discovery_links = crawler.crawl()
+    logger.info(f"Found {len(discovery_links)} privacy-related links")
+    return discovery_links
 
-    # Get page content
-    html_content = get_page_html(main_url)
-    if not html_content:
-        return[]
-    
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    # Common patterns for privacy-related links
-    privacy_patterns = [
-        r'privacy',
-        r'notice',
-        r'policy',
-        r'ccpa',
-        r'gdpr',
-        r'california',
-        r'opt.?out',
-        r'do not sell',
-        r'your privacy choices',
-        r'data rights',
-        r'transparency'
-    ]
-
-    discovery_links = set()
-
-    # Look for links in common locations
-    selectors_to_check = [
-        'a[href]',
-        'nav a[href]',
-        '.privacy-links a[href]',
-        '.footer a[href]',
-        '#privacy a[href]',
-        '[data-component="privacy"] a[href]'
-    ]
-
-    for selector in selectors_to_check:
-        links = soup.select(selector)
-        for link in links:
-            href = link.get('href','')
-            text = link.get_text().lower()
-
-            # Check if this looks like a privacy-related link
-            if is_privacy_link(href, text, privacy_patterns):
-                absolute_url = make_absolute_url(main_url, href)
-                if absolute_url:
-                    discovery_links.add((absolute_url, text))
+class PrivacyLinkCrawler:
+    """
+    Breadth-first crawl of the privacy links of one site.
 
-    logger.info(f"Found {len(discovery_links)} privacy-related links")
-    return list(discovery_links)
+    - Each depth level is fetched as one batch on the fetch engine (global and
+      per-host limits from the discovery section of the config).
+    - Pages are fetched with plain HTTP first; the browser is only used when
+      that fails or the page has no links at all (rendered by JS).
+    - URLs are normalized (fragment, default port, utm_* parameters removed)
+      so each page is fetched once, and only links on the start page's site
+      are kept when same_site is on.
+    - robots.txt is honored for the pages that are fetched.
+    """
 
-def is_privacy_link(href, text, patterns):
-    """Determine if a link is likey privacy-related"""
-    href_lower = href.lower()
-    text_lower = text.lower()
+    def __init__(self, start_url, max_depth=None, max_pages=None, concurrency=None, per_host_concurrency=None,
+                 same_site=None, respect_robots=None):
+        self.start_url = normalize_url(start_url)
+        self.max_depth = config.DISCOVERY_MAX_DEPTH if max_depth is None else max_depth
+        self.max_pages = max_pages or config.DISCOVERY_MAX_PAGES
+        self.concurrency = concurrency or config.DISCOVERY_CONCURRENCY
+        self.per_host_concurrency = per_host_concurrency or config.DISCOVERY_PER_HOST_CONCURRENCY
+        self.same_site = config.DISCOVERY_SAME_SITE if same_site is None else same_site
+        self.respect_robots = config.DISCOVERY_RESPECT_ROBOTS if respect_robots is None else respect_robots
+        self.site_domain = site_domain(urlparse(self.start_url).hostname or "")
+        self.robots = RobotsCache()
+        self.stats = {"pages": 0, "http": 0, "browser": 0, "robots_blocked": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
 
-    # Check against our patterns
-    for pattern in patterns:
-        if (re.search(pattern, href_lower) or re.search(pattern, text_lower)):
+    def in_scope(self, url):
+        if not self.same_site:
             return True
-        
-    # Additional checks
-    if '/privacy' in href_lower:
-        return True
-    
-    if any(term in text_lower for term in ['privacy', 'policy', 'notice', 'ccpa', 'gdpr']):
-        return True
-    
-    return False
+        host = urlparse(url).hostname or ""
+        return host == self.site_domain or host.endswith("." + self.site_domain)
+
+    def crawl(self):
+        """Crawl from the start page and return the (url, link text) pairs found"""
+        discovered = {}
+        seen = {self.start_url}
+        level = [self.start_url]
+        depth = 0
+        pages = 0
+
+        while level and pages < self.max_pages:
+            batch = [(depth, url) for url in level[:self.max_pages - pages]]
+            pages += len(batch)
+            next_level = []
+
+            def on_result(row, html):
+                if not html:
+                    return
+                for url, text in extract_links(html, row[1]):
+                    if not self.in_scope(url) or not is_privacy_link(url, text):
+                        continue
+                    discovered.setdefault(url, text)
+                    if row[0] < self.max_depth and url not in seen:
+                        seen.add(url)
+                        next_level.append(url)
+
+            run_fetch_engine(batch, self.fetch, on_result, self.concurrency, self.per_host_concurrency)
+            level = next_level
+            depth += 1
+
+        discovered.pop(self.start_url, None)
+        logger.info(f"Crawled {pages} pages to depth {depth - 1}: {self.stats}.")
+        return list(discovered.items())
+
+    def fetch(self, row):
+        """Return the HTML of a page (plain HTTP first, then the browser), or None"""
+        depth, url = row
+        if self.respect_robots and not self.robots.allowed(url):
+            logger.info(f"Skipping {url}, disallowed by robots.txt.")
+            self._count("robots_blocked")
+            return None
+        self._count("pages")
+
+        html, try_browser = fetch_html(url)
+        if html and has_links(html):
+            self._count("http")
+            return html
+        if not try_browser:
+            self._count("failed")
+            return None
+        logger.debug(f"No links in the HTTP response of {url}, rendering it in the browser.")
+        html = get_page_html(url)
+        self._count("browser" if html else "failed")
+        return html
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+class RobotsCache:
+    """robots.txt rules per host, each file is fetched once"""
+
+    def __init__(self):
+        self._parsers = {}
+        self._lock = threading.Lock()
+
+    def allowed(self, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            parser = self._parsers.get(origin)
+        if parser is None:
+            parser = self._load(origin)
+            with self._lock:
+                self._parsers[origin] = parser
+        return parser.can_fetch(config.DISCOVERY_USER_AGENT, url)
+
+    def _load(self, origin):
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            response = get_session().get(f"{origin}/robots.txt", timeout=config.DISCOVERY_TIMEOUT_SECONDS,
+                                          headers={"User-Agent": config.DISCOVERY_USER_AGENT})
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Could not fetch robots.txt of {origin}: {e}.")
+            parser.allow_all = True
+            return parser
+        if response.status_code >= 500:
+            # Server error: assume everything is disallowed (RFC 9309)
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        return parser
+
+def fetch_html(url):
+    """
+    Fetch a page with plain HTTP.
+
+    Returns:
+        tuple: (HTML or None, True if the browser may still get the page)
+    """
+    try:
+        response = request_with_retry(url, timeout=config.DISCOVERY_TIMEOUT_SECONDS, stream=True,
+                                      headers={"User-Agent": config.DISCOVERY_USER_AGENT})
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        # Still failing after the retries, the browser would not get through either
+        logger.debug(f"HTTP fetch of {url} failed: {e}.")
+        return None, False
+    except requests.exceptions.RequestException as e:
+        logger.debug(f"HTTP fetch of {url} failed: {e}.")
+        return None, True
+    if response.status_code in (404, 410) or response.status_code in RETRY_STATUSES:
+        # The page does not exist or the server is down, rendering it will not help
+        logger.debug(f"Could not fetch {url} ({response.status_code}).")
+        response.close()
+        return None, False
+    if response.status_code >= 400:
+        # Often a bot check that a real browser gets through
+        response.close()
+        return None, True
+    try:
+        if content_kind(response) != "html":
+            response.close()
+            return None, False
+        return read_text(response)[0], True
+    except (ResponseTooLarge, UnsupportedContentType) as e:
+        logger.info(f"Skipping {url}: {e}.")
+        response.close()
+        return None, False
+
+def has_links(html_content):
+    return _LINK_TAG.search(html_content) is not None
+
+def extract_links(html_content, base_url):
+    """Return (normalized absolute url, link text) for every http(s) link of a page"""
+    # Only the <a href> elements are parsed, every link is seen once
+    soup = BeautifulSoup(html_content, 'html.parser', parse_only=SoupStrainer('a', href=True))
+    links = []
+    for link in soup.find_all('a', href=True):
+        try:
+            absolute_url = make_absolute_url(base_url, link['href'].strip())
+            if not absolute_url or urlsplit(absolute_url).scheme not in ("http", "https"):
+                continue
+            url = normalize_url(absolute_url)
+        except ValueError as e:
+            # Malformed URL (e.g. a port that is not a number), the page's other links still count
+            logger.debug(f"Skipping link {link['href']!r} on {base_url}: {e}.")
+            continue
+        links.append((url, " ".join(link.get_text().split())))
+    return links
+
+def normalize_url(url):
+    """
+    Normalize a URL so the same page is only crawled once: lowercase scheme
+    and host, no default port, no fragment, no utm_* tracking parameters
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    netloc = host if port is None or (scheme, port) in (("http", 80), ("https", 443)) else f"{host}:{port}"
+    query = "&".join(param for param in parts.query.split("&") if param and not param.lower().startswith("utm_"))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+def site_domain(host):
+    """The domain that defines "same site" for a host (www. is ignored)"""
+    host = host.lower()
+    return host[4:] if host.startswith("www.") else host
+
+def is_privacy_link(href, text, matcher=None):
+    """
+    Determine if a link is likey privacy-related, i.e. its URL or text contains
+    one of the privacy link indicators (classifier section in config)
+    """
+    matcher = matcher or PRIVACY_LINK_INDICATORS
+    return matcher.search(href, text) is not None
 
 def make_absolute_url(base_url, relative_url):
     """Convert relative URLs to absolute URLs"""
@@ -90,18 +256,43 @@ def make_absolute_url(base_url, relative_url):
     except:
         logger.warning(f"Could not make absolute URL from {base_url} and {relative_url}.")
         return None
-    
+
 def get_page_html(url):
     """Get HTML content of a page (using browser for JS rendering)"""
-    with sync_playwright() as p:
-        try:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
-            page = context.new_page()
-            page.goto(url)
-            content = page.content()
-            browser.close()
-            return content
-        except Exception as e:
-            logger.error(f"Error getting HTML from {url}: {e}.")
-            return None
\ No newline at end of file
+    try:
+        return get_browser_pool().run(lambda page: render_page(page, url),
+                                      timeout=config.BROWSER_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.error(f"Error getting HTML from {url}: {e}.")
+        return None
+
+def render_page(page, url):
+    """Load url in a pooled page and return its HTML"""
+    open_page(page, url)
+    return page.content()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Discover the privacy pages of a site and optionally monitor them.")
+    parser.add_argument("url", help="main privacy page of the site")
+    parser.add_argument("--depth", type=int, default=None, help="hops to follow (default: discovery.max_depth)")
+    parser.add_argument("--max-pages", type=int, default=None, help="pages to fetch at most")
+    parser.add_argument("--name", help="company name, used as the prefix of the site names")
+    parser.add_argument("--add", action="store_true", help="add the start page and the discovered pages to the monitor")
+    args = parser.parse_args(argv)
+
+    links = discover_privacy_links(args.url, args.depth, args.max_pages)
+    for url, text in sorted(links):
+        print(f"{url}  {text}")
+
+    if args.add:
+        prefix = args.name or site_domain(urlparse(args.url).hostname or "")
+        sites = [(normalize_url(args.url), prefix)]
+        sites.extend((url, f"{prefix} - {text}" if text else prefix) for url, text in sorted(links))
+        print(f"Added {add_sites(sites)} new sites.")
+
+if __name__ == "__main__":
+    from browser_pool import shutdown_browser_pool
+    try:
+        main()
+    finally:
+        shutdown_browser_pool()
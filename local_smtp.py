@@ -0,0 +1,158 @@
+import argparse
+import base64
+import socketserver
+import threading
+from email import message_from_bytes, policy
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# A minimal SMTP server that keeps the messages it receives, for trying the
+# alerts without a real mail server:
+#   python local_smtp.py --port 8025
+# and set email.smtp_server: "127.0.0.1", smtp_port: 8025, starttls: false.
+# It accepts any AUTH PLAIN/LOGIN credentials and does not support STARTTLS.
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Handle one SMTP session"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def read_line(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self):
+        self.server.record("connections")
+        self.reply("220 localhost privacy monitor SMTP stand-in")
+        sender, recipients = None, []
+        while True:
+            line = self.read_line()
+            if line is None:
+                return
+            command, _, argument = line.partition(" ")
+            command = command.upper()
+
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif command == "HELO":
+                self.reply("250 localhost")
+            elif command == "AUTH":
+                self.authenticate(argument)
+            elif command == "MAIL":
+                sender, recipients = argument.partition(":")[2].strip(), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(argument.partition(":")[2].strip())
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.store(sender, recipients, self.read_data())
+                self.reply("250 OK")
+            elif command == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def authenticate(self, argument):
+        mechanism, _, initial = argument.partition(" ")
+        mechanism = mechanism.upper()
+        if mechanism == "PLAIN":
+            if not initial:
+                self.reply("334 ")
+                initial = self.read_line()
+            user = base64.b64decode(initial).split(b"\0")[1].decode("utf-8", "replace")
+        elif mechanism == "LOGIN":
+            if initial:
+                user = base64.b64decode(initial).decode("utf-8", "replace")
+            else:
+                self.reply("334 VXNlcm5hbWU6") # "Username:"
+                user = base64.b64decode(self.read_line()).decode("utf-8", "replace")
+            self.reply("334 UGFzc3dvcmQ6") # "Password:"
+            self.read_line()
+        else:
+            self.reply("504 Unrecognized authentication type")
+            return
+        self.server.record("logins")
+        logger.debug(f"SMTP login as {user}.")
+        self.reply("235 Authentication successful")
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    SMTP stand-in. Received messages are kept in `messages` (email.message
+    objects) and `stats` counts connections, logins and messages.
+    Port 0 picks a free port, see `port`.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), SMTPHandler)
+        self.messages = []
+        self.stats = {"connections": 0, "logins": 0, "messages": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def store(self, sender, recipients, data):
+        message = message_from_bytes(data, policy=policy.default)
+        with self._lock:
+            self.messages.append(message)
+            self.stats["messages"] += 1
+        logger.info(f"Received message from {sender} to {', '.join(recipients)}: {message['Subject']}")
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name="local-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local SMTP server that logs the alerts it receives.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args(argv)
+
+    server = LocalSMTPServer(args.host, args.port)
+    logger.info(f"Local SMTP server listening on {args.host}:{server.port}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
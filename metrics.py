@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+import config # type: ignore
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Returned by timer() when metrics are off: entering it costs next to nothing
+_NO_TIMER = nullcontext()
+
+class StageTimer:
+    """Context manager adding the time spent inside it to one stage"""
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time(self.stage, time.perf_counter() - self.started)
+
+class RunMetrics:
+    """
+    Timers and counters for one check run.
+
+    Each stage of a site check (http, download, extract, browser, fingerprint,
+    diff, db, smtp...) adds its time with `with run_metrics.timer("stage"):`.
+    check_sites starts a run, records each site's outcome and timings, and
+    stores the summary in the check_runs and check_run_sites tables at the end.
+
+    With metrics.enabled off, timer() returns a shared no-op context manager
+    and nothing per site is kept; only the run totals are stored.
+
+    keep_samples=True also keeps every timing of every stage in `samples`
+    (used by bench_suite.py for percentiles).
+    """
+
+    def __init__(self, enabled=None, keep_samples=False):
+        self.enabled = config.METRICS_ENABLED if enabled is None else enabled
+        self.keep_samples = keep_samples
+        self._lock = threading.Lock()
+        self.start_run()
+
+    def start_run(self):
+        """Forget the previous run's numbers"""
+        with self._lock:
+            self.started_at = datetime.utcnow().isoformat()
+            self._started = time.perf_counter()
+            self.stages = {} # stage -> [calls, seconds, max seconds]
+            self.counters = Counter()
+            self.sites = []
+            self.samples = {} # stage -> [seconds, ...] with keep_samples
+
+    def timer(self, stage):
+        if not self.enabled:
+            return _NO_TIMER
+        return StageTimer(self, stage)
+
+    def add_time(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.keep_samples:
+                self.samples.setdefault(stage, []).append(seconds)
+            totals = self.stages.get(stage)
+            if totals is None:
+                self.stages[stage] = [1, seconds, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+
+    def record_site(self, site_id, outcome, fetch_seconds, process_seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.sites.append((site_id, outcome, fetch_seconds, process_seconds))
+
+    def finish_run(self, run_stats):
+        """
+        Return the summary of the run (the dict stored by SiteRepository.record_check_run)
+
+        Args:
+            run_stats (Counter): the per-run counts of check_sites
+        """
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "finished_at": datetime.utcnow().isoformat(),
+                "duration_seconds": round(time.perf_counter() - self._started, 3),
+                "stats": dict(run_stats),
+                "counters": dict(self.counters),
+                "stages": {stage: {"calls": calls, "seconds": round(seconds, 4), "max_seconds": round(longest, 4)}
+                           for stage, (calls, seconds, longest) in self.stages.items()},
+                "sites": list(self.sites),
+            }
+
+run_metrics = RunMetrics()
+
+def log_run_summary(run):
+    """Log where the run's time went, slowest stage first"""
+    stages = sorted(run["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+    if not stages:
+        return
+    breakdown = ", ".join(f"{stage} {totals['seconds']:.2f}s/{totals['calls']}" for stage, totals in stages)
+    logger.info(f"Run took {run['duration_seconds']:.2f}s. Time per stage (total/calls): {breakdown}.")
+
+def format_prometheus(run):
+    """Prometheus text exposition format of a run summary (for the node_exporter textfile collector)"""
+    lines = [
+        "# HELP privacy_monitor_run_duration_seconds Wall clock time of the last check run.",
+        "# TYPE privacy_monitor_run_duration_seconds gauge",
+        f"privacy_monitor_run_duration_seconds {run['duration_seconds']}",
+        "# HELP privacy_monitor_run_finished_timestamp_seconds When the last check run finished.",
+        "# TYPE privacy_monitor_run_finished_timestamp_seconds gauge",
+        f"privacy_monitor_run_finished_timestamp_seconds {_timestamp(run['finished_at'])}",
+        "# HELP privacy_monitor_run_sites Sites of the last check run by outcome.",
+        "# TYPE privacy_monitor_run_sites gauge",
+    ]
+    lines.extend(f'privacy_monitor_run_sites{{outcome="{name}"}} {value}' for name, value in sorted(run["stats"].items()))
+    lines += [
+        "# HELP privacy_monitor_stage_seconds Time spent in each stage during the last check run.",
+        "# TYPE privacy_monitor_stage_seconds gauge",
+    ]
+    lines.extend(f'privacy_monitor_stage_seconds{{stage="{stage}"}} {totals["seconds"]}'
+                 for stage, totals in sorted(run["stages"].items()))
+    lines += [
+        "# HELP privacy_monitor_stage_calls Times each stage ran during the last check run.",
+        "# TYPE privacy_monitor_stage_calls gauge",
+    ]
+    lines.extend(f'privacy_monitor_stage_calls{{stage="{stage}"}} {totals["calls"]}'
+                 for stage, totals in sorted(run["stages"].items()))
+    lines += [
+        "# HELP privacy_monitor_stage_max_seconds Longest single run of each stage during the last check run.",
+        "# TYPE privacy_monitor_stage_max_seconds gauge",
+    ]
+    lines.extend(f'privacy_monitor_stage_max_seconds{{stage="{stage}"}} {totals["max_seconds"]}'
+                 for stage, totals in sorted(run["stages"].items()))
+    if run["counters"]:
+        lines += [
+            "# HELP privacy_monitor_run_events Events counted during the last check run.",
+            "# TYPE privacy_monitor_run_events gauge",
+        ]
+        lines.extend(f'privacy_monitor_run_events{{event="{name}"}} {value}'
+                     for name, value in sorted(run["counters"].items()))
+    return "\n".join(lines) + "\n"
+
+def format_json(run):
+    summary = {key: value for key, value in run.items() if key != "sites"}
+    return json.dumps(summary, indent=2, sort_keys=True)
+
+def _timestamp(iso_time):
+    return round((datetime.fromisoformat(iso_time) - datetime(1970, 1, 1)).total_seconds(), 3)
+
+def export_run(run, path=None):
+    """
+    Write a run summary to metrics.export_path (Prometheus text format, or JSON
+    for a .json path). The file is replaced atomically so a scraper never
+    reads half of it.
+    """
+    path = path or config.METRICS_EXPORT_PATH
+    if not path:
+        return
+    path = config.resolve_path(path)
+    text = format_json(run) if path.endswith(".json") else format_prometheus(run)
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.error(f"Could not write metrics to {path}: {e}.")
+
+def load_runs(conn, limit=10):
+    """Return the last runs stored in check_runs, newest first, in the finish_run format"""
+    rows = conn.execute(
+        "SELECT id, started_at, finished_at, duration_seconds, stats, counters, stages FROM check_runs "
+        "ORDER BY id DESC LIMIT ?", (limit,)
+    ).fetchall()
+    return [{
+        "id": row[0], "started_at": row[1], "finished_at": row[2], "duration_seconds": row[3],
+        "stats": json.loads(row[4] or "{}"), "counters": json.loads(row[5] or "{}"),
+        "stages": json.loads(row[6] or "{}"),
+    } for row in rows]
+
+def load_slowest_sites(conn, run_id, limit=10):
+    """Return (url, outcome, fetch seconds, process seconds) of the slowest sites of a run"""
+    return conn.execute('''
+        SELECT monitored_sites.url, check_run_sites.outcome, check_run_sites.fetch_seconds,
+               check_run_sites.process_seconds
+        FROM check_run_sites LEFT JOIN monitored_sites ON monitored_sites.id = check_run_sites.site_id
+        WHERE check_run_sites.run_id = ?
+        ORDER BY check_run_sites.fetch_seconds + check_run_sites.process_seconds DESC
+        LIMIT ?
+    ''', (run_id, limit)).fetchall()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or export the metrics of past check runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show = subparsers.add_parser("show", help="list the last runs and the slowest sites of the latest one")
+    show.add_argument("--runs", type=int, default=10)
+    show.add_argument("--slowest", type=int, default=10)
+    export = subparsers.add_parser("export", help="print the latest run as Prometheus text or JSON")
+    export.add_argument("--format", choices=["prometheus", "json"], default="prometheus")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        runs = load_runs(conn, args.runs if args.command == "show" else 1)
+        if not runs:
+            print("No check runs recorded yet.")
+            return
+        if args.command == "export":
+            print(format_prometheus(runs[0]) if args.format == "prometheus" else format_json(runs[0]), end="")
+            return
+        for run in runs:
+            stats = run["stats"]
+            print(f"#{run['id']} {run['started_at']}  {run['duration_seconds']:8.2f}s  "
+                  f"{stats.get('checked', 0)} checked, {stats.get('changed', 0)} changed, {stats.get('failed', 0)} failed")
+        latest = runs[0]
+        for stage, totals in sorted(latest["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True):
+            print(f"  {stage:<16} {totals['seconds']:8.2f}s  {totals['calls']:6} calls  max {totals['max_seconds']:.2f}s")
+        for url, outcome, fetch_seconds, process_seconds in load_slowest_sites(conn, latest["id"], args.slowest):
+            print(f"  {fetch_seconds + process_seconds:8.2f}s  {outcome:<12} {url}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+from datetime import datetime
+from database import get_db_connection
+from fingerprint import content_fingerprint
+from policy_history import compress_text
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Every schema change is a numbered migration. The applied versions are kept
+# in the schema_version table and pending migrations run once, in order, at
+# startup (init_db, SiteRepository.ensure_schema or `python migrations.py apply`).
+# To change the schema, add a new function at the end of MIGRATIONS instead of
+# altering tables from the code that reads or writes them.
+#
+# Migrations must also work on databases created before schema_version existed,
+# which is why they use IF NOT EXISTS / add_column_if_missing.
+
+def add_column_if_missing(conn, table, column_name, column_definition):
+    """Add a column to a table unless it already exists. Returns True if it was added."""
+    columns = [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+    if column_name in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_definition}")
+    logger.info(f"Added column '{column_name}' to {table}.")
+    return True
+
+def create_monitored_sites(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monitored_sites (
+            id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL,
+            site_name TEXT,
+            last_checked TEXT,
+            last_content TEXT,
+            requires_browser INTEGER DEFAULT 0
+        )
+    ''')
+    # Databases from before requires_browser was part of the table
+    add_column_if_missing(conn, "monitored_sites", "requires_browser", "INTEGER DEFAULT 0")
+
+def add_http_validators(conn):
+    add_column_if_missing(conn, "monitored_sites", "etag", "TEXT")
+    add_column_if_missing(conn, "monitored_sites", "last_modified", "TEXT")
+    add_column_if_missing(conn, "monitored_sites", "content_length", "INTEGER")
+
+def add_content_hash(conn):
+    add_column_if_missing(conn, "monitored_sites", "content_hash", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_monitored_sites_content_hash ON monitored_sites (content_hash)")
+
+    # Fingerprint the content stored before this column existed, one row at a time
+    rows = conn.execute(
+        "SELECT id, last_content FROM monitored_sites WHERE content_hash IS NULL AND last_content IS NOT NULL"
+    )
+    for site_id, last_content in rows.fetchall():
+        conn.execute("UPDATE monitored_sites SET content_hash = ? WHERE id = ?",
+                     (content_fingerprint(last_content), site_id))
+
+def create_policy_history(conn):
+    # Every distinct policy text is stored once in policy_blobs (keyed by its
+    # fingerprint and zlib-compressed). policy_versions records, per site, which
+    # blob each version points to.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS policy_blobs (
+            content_hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL DEFAULT 'zlib',
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS policy_versions (
+            id INTEGER PRIMARY KEY,
+            site_id INTEGER NOT NULL REFERENCES monitored_sites (id),
+            version INTEGER NOT NULL,
+            content_hash TEXT NOT NULL REFERENCES policy_blobs (content_hash),
+            created_at TEXT NOT NULL,
+            UNIQUE (site_id, version)
+        )
+    ''')
+
+    # The policy we already have for each site becomes its first version
+    site_ids = [row[0] for row in conn.execute('''
+        SELECT id FROM monitored_sites s
+        WHERE last_content IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM policy_versions v WHERE v.site_id = s.id)
+    ''')]
+    created_at = datetime.utcnow().isoformat()
+    for site_id in site_ids:
+        last_content, content_hash = conn.execute(
+            "SELECT last_content, content_hash FROM monitored_sites WHERE id = ?", (site_id,)
+        ).fetchone()
+        conn.execute(
+            "INSERT OR IGNORE INTO policy_blobs (content_hash, codec, size, data) VALUES (?, 'zlib', ?, ?)",
+            (content_hash, len(last_content.encode("utf-8")), compress_text(last_content))
+        )
+        conn.execute(
+            "INSERT INTO policy_versions (site_id, version, content_hash, created_at) VALUES (?, 1, ?, ?)",
+            (site_id, content_hash, created_at)
+        )
+
+def add_schedule_columns(conn):
+    # NULL check_interval_hours means the default monitor.check_interval_hours
+    add_column_if_missing(conn, "monitored_sites", "check_interval_hours", "REAL")
+    add_column_if_missing(conn, "monitored_sites", "last_changed", "TEXT")
+
+    # Use the newest recorded version as the last change for existing sites
+    conn.execute('''
+        UPDATE monitored_sites SET last_changed = (
+            SELECT MAX(v.created_at) FROM policy_versions v WHERE v.site_id = monitored_sites.id AND v.version > 1
+        )
+        WHERE last_changed IS NULL
+    ''')
+
+def add_extraction_version(conn):
+    # NULL for text stored before extraction was versioned, those sites get a
+    # new baseline on their next check
+    add_column_if_missing(conn, "monitored_sites", "extraction_version", "INTEGER")
+
+def create_alert_outbox(conn):
+    # Alerts waiting to be sent by alert_dispatcher.py, deleted once sent
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_outbox (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL,
+            site_name TEXT,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT
+        )
+    ''')
+
+def add_browser_probe_columns(conn):
+    # When a site that needs the browser last tried requests again, and how many
+    # of those probes failed in a row (see fetch_strategy.py)
+    add_column_if_missing(conn, "monitored_sites", "browser_probe_failures", "INTEGER DEFAULT 0")
+    add_column_if_missing(conn, "monitored_sites", "last_probe", "TEXT")
+    # Start the probe schedule of the sites already marked now instead of probing them all at once
+    conn.execute("UPDATE monitored_sites SET last_probe = ? WHERE requires_browser = 1 AND last_probe IS NULL",
+                 (datetime.utcnow().isoformat(),))
+
+def create_cookie_banners(conn):
+    # Per domain selector that dismissed the cookie banner, NULL when there was none (cookie_banner.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cookie_banners (
+            domain TEXT PRIMARY KEY,
+            selector TEXT,
+            checked_at TEXT NOT NULL
+        )
+    ''')
+
+def create_check_runs(conn):
+    # Summary of each check run and per site outcome and timings (metrics.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS check_runs (
+            id INTEGER PRIMARY KEY,
+            started_at TEXT NOT NULL,
+            finished_at TEXT NOT NULL,
+            duration_seconds REAL NOT NULL,
+            stats TEXT,
+            counters TEXT,
+            stages TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS check_run_sites (
+            run_id INTEGER NOT NULL,
+            site_id INTEGER NOT NULL,
+            outcome TEXT NOT NULL,
+            fetch_seconds REAL,
+            process_seconds REAL,
+            PRIMARY KEY (run_id, site_id)
+        )
+    ''')
+
+def add_lease_columns(conn):
+    # Shard workers claim sites by setting claimed_by and lease_until (shard_worker.py).
+    # A lease_until in the past is free to claim again.
+    add_column_if_missing(conn, "monitored_sites", "claimed_by", "TEXT")
+    add_column_if_missing(conn, "monitored_sites", "lease_until", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_monitored_sites_lease_until ON monitored_sites (lease_until)")
+
+def create_checkpoints(conn):
+    # Progress of check_all_sites runs, so an interrupted run can be resumed
+    # (run_checkpoint.py). status is running, finished or abandoned; a run
+    # still "running" after the process died is the one --resume continues.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS checkpoint_runs (
+            id INTEGER PRIMARY KEY,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            status TEXT NOT NULL,
+            site_count INTEGER
+        )
+    ''')
+    # state is "fetched" (fetch_result holds the compressed FetchResult, not
+    # processed yet) or "done". The rows are deleted when the run finishes.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS checkpoint_sites (
+            run_id INTEGER NOT NULL,
+            site_id INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            fetch_result BLOB,
+            PRIMARY KEY (run_id, site_id)
+        )
+    ''')
+
+# (version, description, function) in the order they must be applied
+MIGRATIONS = [
+    (1, "Create monitored_sites table", create_monitored_sites),
+    (2, "Add ETag/Last-Modified/content length columns", add_http_validators),
+    (3, "Add indexed content_hash fingerprint column", add_content_hash),
+    (4, "Add policy_blobs and policy_versions history tables", create_policy_history),
+    (5, "Add per-site check interval and last_changed columns", add_schedule_columns),
+    (6, "Add extraction_version column", add_extraction_version),
+    (7, "Add alert_outbox table", create_alert_outbox),
+    (8, "Add browser probe columns", add_browser_probe_columns),
+    (9, "Add cookie_banners table", create_cookie_banners),
+    (10, "Add check_runs and check_run_sites tables", create_check_runs),
+    (11, "Add claimed_by and lease_until columns", add_lease_columns),
+    (12, "Add checkpoint_runs and checkpoint_sites tables", create_checkpoints),
+]
+
+def ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a new database)"""
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def pending_migrations(conn, target=None):
+    """Return the migrations that still have to be applied (up to target)"""
+    current = get_schema_version(conn)
+    return [m for m in MIGRATIONS if m[0] > current and (target is None or m[0] <= target)]
+
+def migrate(conn=None, target=None):
+    """
+    Apply all pending migrations (up to target) in order.
+
+    Each migration runs in its own IMMEDIATE transaction and the version is
+    checked again inside it, so two processes starting at the same time do not
+    apply the same migration twice.
+
+    Returns:
+        int: the schema version after migrating
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        ensure_version_table(conn)
+        for version, description, migration in pending_migrations(conn, target):
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                migration(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, datetime.utcnow().isoformat())
+                )
+                conn.commit()
+                logger.info(f"Applied migration {version}: {description}.")
+            except Exception:
+                conn.rollback()
+                logger.error(f"Migration {version} ({description}) failed.")
+                raise
+        return get_schema_version(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+def init_db():
+    """Initialize the database with the required tables."""
+    logger.info("Initializing database")
+    version = migrate()
+    logger.info(f"Database initialized successfully (schema version {version}).")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and apply database schema migrations.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="show the current schema version and pending migrations")
+    apply_parser = subparsers.add_parser("apply", help="apply pending migrations")
+    apply_parser.add_argument("--to", type=int, dest="target", help="stop after this version")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    try:
+        ensure_version_table(conn)
+        if args.command == "status":
+            print(f"Schema version: {get_schema_version(conn)} (latest: {MIGRATIONS[-1][0]})")
+            pending = pending_migrations(conn)
+            for version, description, _ in pending:
+                print(f"  pending {version}: {description}")
+            if not pending:
+                print("  up to date")
+        else:
+            print(f"Schema version: {migrate(conn, args.target)}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
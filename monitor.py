@@ -1,221 +1,511 @@
-from database import get_db_connection
 from database import mark_site_as_requires_browser
+from repository import SiteRepository
+from fingerprint import content_fingerprint
+from text_extraction import EXTRACTION_VERSION
+from policy_diff import alert_diff
+from page_classifier import should_use_browser, BROWSER_INDICATORS, COOKIE_INDICATORS
+from cpu_pool import process_page, run_cpu, shutdown_cpu_pool
+from fetch_strategy import FetchStrategyResolver, REQUESTS, PROBE, BROWSER
+import argparse
+import sqlite3
+import time
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from collections import Counter, namedtuple
 import config # type: ignore
 from log_config import setup_logger
-from browser_handler import get_page_text_with_browser
-
-# Need to figure out how to check if 'privacy_policies.db exists and if not to create it,
-# I only ran it in a seperate script to create it for now.
-"""conn = sqlite3.connect('privacy_polices.db')
-c = conn.cursor()
-
-# Create a table to storethe monitored sites and their latest content
-c.execute('''
-    CREATE TABLE IF NOT EXISTS monitored_sites (
-          id INTEGER PRIMARY KEY,
-          url TEXT UNIQUE NOT NULL,
-          site_name TEXT,
-          last_checked TEXT,
-          last_content TEXT
-    )
-''')
+from browser_handler import get_page_text_with_browser, log_load_stats
+from browser_pool import shutdown_browser_pool
+from alert_dispatcher import get_alert_dispatcher, flush_alert_dispatcher, shutdown_alert_dispatcher, outbox_row
+from fetch_engine import run_fetch_engine
+from http_client import discard, log_client_stats
+from metrics import run_metrics, export_run, log_run_summary
+from rate_limiter import get_host_limiter, request_with_retry, RETRY_STATUSES
+from response_reader import content_kind, read_text, ResponseTooLarge, UnsupportedContentType
+from response_cache import get_response_cache, store_response, replay
+from run_checkpoint import start_checkpoint
+from scheduler import run_daemon
+from shard_worker import run_shard_worker
 
-conn.commit()
-conn.close()
-print("Database initialized.")"""
 # Set up centralized logger
 logger = setup_logger(__name__) # __name__ will be 'monitor for this file
 
+# Why a requests fetch failed (FetchResult.failure)
+FAILED_ERROR = "error" # e.g. 403 or 404, the browser may still get the page
+FAILED_TRANSIENT = "transient" # timeout, connection error or 429/5xx after the retries
+FAILED_TOO_LARGE = "too_large" # body larger than monitor.max_page_bytes
+FAILED_UNSUPPORTED = "unsupported_type" # not HTML or plain text (PDF, image, download...)
+
+# Failures the browser would not fix either, so there is no browser fallback
+NO_BROWSER_FAILURES = frozenset([FAILED_TRANSIENT, FAILED_TOO_LARGE, FAILED_UNSUPPORTED])
+FAILED_OUTCOMES = NO_BROWSER_FAILURES | {FAILED_ERROR}
+
+# Result of fetching a page. not_modified is True when the server answered a
+# conditional request with 304, in which case text is None. failure is one of
+# the FAILED_* categories when text is None because the fetch failed.
+# fingerprint is the content fingerprint of the text; text is also None when
+# the fingerprint equals the stored one, the unchanged text is not passed around.
+# needs_browser is set for pages read with requests, diff is the alert text of
+# a changed page when it was built in the fetch thread.
+FetchResult = namedtuple(
+    "FetchResult",
+    ["text", "not_modified", "etag", "last_modified", "content_length", "failure",
+     "fingerprint", "needs_browser", "diff"],
+    defaults=(False, None, None, None, None, None, None, None)
+)
+
 def get_page_text(url, use_browser=False):
     """Function to fetch and clean text from a URL"""
     if use_browser:
-        return get_page_text_with_browser(url)
+        with run_metrics.timer("browser"):
+            return get_page_text_with_browser(url)
     else:
-        try:
-            logger.debug(f"Fetching URL: {url}")  # Debug level for very detailed info
-            response = requests.get(url, timeout=10)
-            response.raise_for_status() # Raises an error for bad status codes
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Remove scripts, styles, and extra whitespace
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            text = soup.get_text()
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            cleaned_text = '\n'.join(chunk for chunk in chunks if chunk)
-
-            return cleaned_text
-        
-        except requests.exceptions.RequestException as e:
+        return fetch_page(url).text
+
+def fetch_page(url, etag=None, last_modified=None, known_hash=None):
+    """
+    Fetch and clean text from a URL with requests, using a conditional request
+    when we have validators (ETag / Last-Modified) from the previous check.
+    Requests are rate limited per host and retried (see rate_limiter.py). The
+    body is streamed and the download stops at monitor.max_page_bytes, and
+    only the monitor.accepted_content_types are downloaded at all. The text is
+    extracted in the process pool when processing.workers is set (cpu_pool.py).
+
+    Args:
+        known_hash (str): fingerprint of the stored text, the text is left out
+            of the result when it has not changed
+
+    Returns:
+        FetchResult: text is None if the fetch failed, the page was not modified
+            or its fingerprint is known_hash
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    try:
+        logger.debug(f"Fetching URL: {url}")  # Debug level for very detailed info
+        with run_metrics.timer("http"):
+            response = request_with_retry(url, headers=headers, timeout=10, stream=True)
+        if response.status_code == 304:
+            discard(response) # Keeps the connection for the next site on the host
+            logger.debug(f"{url} not modified since the last check.")
+            return FetchResult(None, not_modified=True, etag=etag, last_modified=last_modified)
+        response.raise_for_status() # Raises an error for bad status codes
+        kind = content_kind(response) # Before downloading the body
+        with run_metrics.timer("download"):
+            body, size = read_text(response)
+        with run_metrics.timer("cache"):
+            store_response(url, body, kind, "requests")
+        # Same extraction as the browser path so both give the same text for a page
+        with run_metrics.timer("extract"):
+            page = run_cpu(process_page, body, kind, url, known_hash, size=size)
+
+        return FetchResult(
+            page.text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            content_length=size,
+            fingerprint=page.fingerprint,
+            needs_browser=page.needs_browser
+        )
+    
+    except requests.exceptions.RequestException as e:
+        failure = failure_category(e)
+        if failure == FAILED_TOO_LARGE or failure == FAILED_UNSUPPORTED:
+            logger.warning(f"Skipping {url}: {e}.")
+        else:
             logger.error(f"Error fetching {url}: {e}.")
-            return None
+        if e.response is not None:
+            e.response.close()
+        return FetchResult(None, failure=failure)
+
+def failure_category(error):
+    """The FAILED_* category of a requests error"""
+    if isinstance(error, ResponseTooLarge):
+        return FAILED_TOO_LARGE
+    if isinstance(error, UnsupportedContentType):
+        return FAILED_UNSUPPORTED
+    if isinstance(error, requests.exceptions.HTTPError):
+        if error.response is not None and error.response.status_code in RETRY_STATUSES:
+            return FAILED_TRANSIENT
+        return FAILED_ERROR
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return FAILED_TRANSIENT
+    return FAILED_ERROR
 
 def find_diffs(old_text, new_text):
-    """Function to compare new text from get_page_text with old text"""
-    if old_text == new_text:
-        return None
-    
-    # This creates a unified diff output
-    diff = difflib.unified_diff(
-        old_text.splitlines(keepends=True),
-        new_text.splitlines(keepends=True),
-        fromfile='Previous Version',
-        tofile='Current Version',
-        n=3 # Number of context lines around changes
-    )
-    return ''.join(diff)
+    """
+    Function to compare new text from get_page_text with old text.
+    Returns a summary of the changed sections followed by a unified diff
+    of the changed blocks, or None if nothing changed.
+    """
+    return alert_diff(old_text, new_text)
 
 def get_all_sites():
-    """ Function to get all monitored sites from the database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, url, site_name, last_content FROM monitored_sites")
-    sites = cursor.fetchall()
-    conn.close()
-    return sites
-
-def update_site_content(site_id, new_content):
-    """Function to update a site's content and timestamp in the database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    current_time = datetime.utcnow().isoformat()
-    cursor.execute(
-        "UPDATE monitored_sites SET last_content = ?, last_checked = ? WHERE id = ?",
-        (new_content, current_time, site_id)
-    )
-    conn.commit()
-    conn.close()
+    """
+    Function to get all monitored sites from the database.
+    Only the content fingerprint is loaded, the policy text itself is loaded
+    with SiteRepository.get_site_content when a site has actually changed.
+    """
+    with SiteRepository() as repo:
+        return repo.get_all_sites()
+
+def deliver_alerts():
+    """Function to wake the alert dispatcher, which sends the alerts stored with the content in the background"""
+    get_alert_dispatcher().notify()
+
+def check_all_sites(concurrency=None, per_host_concurrency=None, resume=False):
+    """
+    Main function to check all sites
 
-def send_alert(url, site_name, diff_output):
-    """Function to send email alert"""
-    msg = MIMEMultipart()
-    msg['Subject'] = f'ALERT: Privacy Policy Changed for {site_name or url}'
-    msg['From'] = config.EMAIL_ADDRESS
-    msg['To'] = config.EMAIL_ADDRESS
+    Args:
+        concurrency (int): number of sites fetched at the same time. 1 checks
+            the sites one after another (defaults to monitor.concurrency in config)
+        per_host_concurrency (int): maximum fetches running against one host
+        resume (bool): continue the last run that was interrupted, skipping the
+            sites it already checked (see run_checkpoint.py)
 
-    body = f"""
-    Changes detected for the privacy policy at: {url}
-    Site Name: {site_name}
+    Returns:
+        Counter: per-run counts (checked, not_modified, changed, unchanged, new, failed,
+            and the failures without a browser fallback by FAILED_* category)
+    """
+    repo = SiteRepository()
+    try:
+        # Apply any pending schema migrations (once per run)
+        repo.ensure_schema()
 
-    Diff Output:
-    {diff_output}
+        sites = repo.get_all_sites()
+        logger.info(f"Found {len(sites)} sites to monitor")
+        checkpoint = start_checkpoint(repo, len(sites), resume)
+        return check_sites(sites, repo, concurrency, per_host_concurrency, checkpoint)
+    finally:
+        # Write any queued status updates, close the browsers kept open for JS-rendered
+        # sites, stop the extraction processes and send the alerts that are still queued
+        repo.close()
+        shutdown_browser_pool()
+        shutdown_cpu_pool()
+        shutdown_alert_dispatcher()
+
+def check_sites(sites, repo, concurrency=None, per_host_concurrency=None, checkpoint=None):
+    """
+    Check a list of sites (rows from SiteRepository) and return the per-run counts.
+    Used by check_all_sites and by the scheduler daemon for the sites that are due.
+    The run's summary and stage timings are stored in check_runs (see metrics.py).
+    With a RunCheckpoint the progress is recorded as the sites are checked,
+    and the sites it already has are skipped or processed without fetching.
     """
-    msg.attach(MIMEText(body, 'plain'))
+    concurrency = concurrency or config.CONCURRENCY
+    per_host_concurrency = per_host_concurrency or config.PER_HOST_CONCURRENCY
+
+    run_metrics.start_run()
+    run_stats = Counter()
+    resolver = FetchStrategyResolver(repo)
+    def fetch(site):
+        started = time.perf_counter()
+        result = fetch_site_text(site, repo, resolver)
+        if checkpoint is not None and result.text is not None:
+            checkpoint.save_fetched(site[0], result._asdict())
+        return result, time.perf_counter() - started
+    def process(site, timed_result):
+        fetch_result, fetch_seconds = timed_result or (None, 0.0)
+        started = time.perf_counter()
+        outcome = process_site(site, fetch_result, run_stats, repo)
+        run_metrics.record_site(site[0], outcome, round(fetch_seconds, 3), round(time.perf_counter() - started, 3))
+        if checkpoint is not None and outcome not in FAILED_OUTCOMES:
+            checkpoint.mark_done(site[0])
+
+    if checkpoint is not None:
+        total = len(sites)
+        sites, fetched = checkpoint.split(sites)
+        if total > len(sites) + len(fetched):
+            run_stats["resumed"] = total - len(sites) - len(fetched)
+        # Fetched before the interruption: diff, alert and store them first
+        for site, result_fields in fetched:
+            process(site, (FetchResult(**result_fields), 0.0))
+
+    host_limiter = get_host_limiter()
+    if concurrency > 1 and len(sites) > 1:
+        logger.info(f"Checking sites concurrently (concurrency={concurrency}, per host={per_host_concurrency}).")
+        run_fetch_engine(sites, fetch, process, concurrency, per_host_concurrency,
+                         host_limiter if config.RATE_LIMIT_ADAPTIVE else None)
+    else:
+        # One site's unexpected error fails that site only, as in the fetch engine
+        for site in sites:
+            try:
+                timed_result = fetch(site)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching {site[1]}: {e}.")
+                timed_result = None
+            try:
+                process(site, timed_result)
+            except Exception as e:
+                logger.error(f"Error processing result for {site[1]}: {e}.")
 
+    # Send this run's alerts (the digest in digest mode) without waiting for the mail server
+    flush_alert_dispatcher(wait=False)
+
+    logger.info(
+        f"Run summary: {run_stats['checked']} checked, {run_stats['not_modified']} skipped as not modified (304), "
+        f"{run_stats['changed']} changed, {run_stats['unchanged']} unchanged, {run_stats['new']} new, "
+        f"{run_stats['rebaselined']} re-baselined, {run_stats['failed']} failed "
+        f"({run_stats[FAILED_TRANSIENT]} unreachable, {run_stats[FAILED_TOO_LARGE]} too large, "
+        f"{run_stats[FAILED_UNSUPPORTED]} not HTML)."
+        + (f" {run_stats['resumed']} sites were already checked by the interrupted run." if run_stats["resumed"] else "")
+    )
+    resolver.log_summary()
+    host_limiter.log_summary()
+    log_client_stats()
+    log_load_stats()
+    cache = get_response_cache()
+    if cache is not None:
+        cache.evict()
+    record_run(run_metrics.finish_run(run_stats), repo)
+    if checkpoint is not None:
+        checkpoint.finish()
+    return run_stats
+
+def replay_all_sites():
+    """Print what the current extraction and diffing make of the cached responses (no network, no writes)"""
+    with SiteRepository() as repo:
+        repo.ensure_schema()
+        sites = repo.get_all_sites()
+    try:
+        stats, results = replay(sites)
+    finally:
+        shutdown_cpu_pool()
+    for url, stored, diff in results:
+        if stored == "differs_from_stored" or diff:
+            print(f"{url}: {'text differs from the stored version' if stored == 'differs_from_stored' else 'same text'}"
+                  + (", changed since the previous cached response:" if diff else ""))
+            if diff:
+                print(diff.split("\n\n", 1)[0])
+    print(f"{stats['replayed']} sites replayed: {stats['same_as_stored']} give the stored text, "
+          f"{stats['differs_from_stored']} differ from it, {stats['changed']} changed since their previous cached "
+          f"response, {stats['needs_browser']} look like they need the browser, {stats['not_cached']} not cached.")
+    return stats
+
+def record_run(run, repo):
+    """Log, store and export the metrics of a run"""
+    log_run_summary(run)
     try:
-        with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as server:
-            server.starttls()
-            server.login(config.EMAIL_ADDRESS, config.EMAIL_PASSWORD)
-            server.send_message(msg)
-        logger.info(f"Alert email sent for {url}.")
-    except Exception as e:
-        logger.error(f"Failed to send email for {url}.")
-
-def check_all_sites():
-    """Main function to check all sites"""
-    sites = get_all_sites()
-    logger.info(f"Found {len(sites)} sites to monitor")
-
-    for site in sites:
-        site_id, url, site_name, old_content, requires_browser = site  # Updated to get the new column
-        logger.info(f"Checking {url}...")
-
-        # Use browser directly if we know its required already
-        if requires_browser:
-            current_text = get_page_text(url, use_browser=True)
+        repo.record_check_run(run)
+    except sqlite3.OperationalError as e:
+        # Schema not migrated yet (check_all_sites migrates at startup)
+        logger.warning(f"Run metrics not stored: {e}.")
+    export_run(run)
+
+def fetch_site_text(site, repo=None, resolver=None):
+    """
+    Fetch the current text of a monitored site with the strategy the resolver
+    picks for it, falling back to the browser if needed
+
+    Returns:
+        FetchResult: the fetched text, or not_modified=True if the server answered 304
+    """
+    site_id, url, site_name, content_hash, requires_browser, etag, last_modified, extraction_version = site
+    logger.info(f"Checking {url}...")
+    if resolver is not None:
+        strategy = resolver.choose(site_id, url, requires_browser, is_new=content_hash is None)
+    else:
+        strategy = BROWSER if requires_browser else REQUESTS
+
+    # Use browser directly if we know its required already
+    if strategy == BROWSER:
+        current_text = get_page_text(url, use_browser=True)
+        if resolver is not None:
+            resolver.record(strategy, False, browser_used=True, browser_ok=current_text is not None)
+        if current_text is not None and not requires_browser and repo:
+            repo.mark_requires_browser(site_id)
+        return with_diff(site, FetchResult(current_text), repo)
+
+    # Try with requests first (fast), sending the validators from the last check.
+    # Only do a conditional request if we actually have the previous content to compare with.
+    # A probe needs the page itself: the validators are from before the site moved
+    # to the browser, and a 304 would not tell whether requests gets the policy.
+    # After a change of the text extraction the unchanged page is needed again to
+    # store a new baseline, a 304 would put it off until the policy really changes.
+    current_extraction = extraction_version == EXTRACTION_VERSION
+    if content_hash is None or strategy == PROBE or not current_extraction:
+        etag = last_modified = None
+    known_hash = content_hash if current_extraction else None
+    result = fetch_page(url, etag, last_modified, known_hash)
+    if result.not_modified:
+        if resolver is not None:
+            resolver.record(strategy, True)
+        return result
+    if result.failure in NO_BROWSER_FAILURES:
+        # Down, overloaded, too large or not a page: the browser would load the same thing
+        logger.warning(f"Not falling back to the browser for {url} ({result.failure}).")
+        if resolver is not None:
+            resolver.record(strategy, False)
+        return result
+
+    # A browser site only goes back to requests if requests gives the stored text,
+    # otherwise a different extraction of the same policy would look like a change.
+    # A failed fetch (FAILED_ERROR, e.g. 403) has no text and goes to the browser too.
+    got_page = result.text is not None or result.fingerprint is not None
+    requests_ok = got_page and not result.needs_browser
+    if strategy == PROBE and requests_ok and result.fingerprint != content_hash:
+        logger.debug(f"Requests text of {url} differs from the stored browser text, keeping the browser.")
+        requests_ok = False
+    if strategy == PROBE and repo:
+        repo.record_probe(site_id, recovered=requests_ok)
+    if requests_ok:
+        if resolver is not None:
+            resolver.record(strategy, True)
+        return with_diff(site, result, repo)
+
+    # Fall back to browser if the content looks like a cookie wall or JS page
+    logger.info(f"Falling back to browser for {url}.")
+    current_text = get_page_text(url, use_browser=True)
+    if resolver is not None:
+        resolver.record(strategy, False, browser_used=True, browser_ok=current_text is not None)
+    if current_text is not None and not requires_browser:
+        logger.info(f"Successfully used browser for {url}. Marking it as requiring the browser.")
+        if repo:
+            repo.mark_requires_browser(site_id)
         else:
-            # Try with requests first, then fall back to browser if needed
-            current_text = get_page_text(url, use_browser=False)
-            if should_use_browser(current_text, url):
-                current_text = get_page_text(url, use_browser=True)
-                mark_site_as_requires_browser(site_id)
-
-        # Try with requests first (fast), fall back to browser if needed
-        current_text = None
-        use_browser = False
-        
-        # First attempt: try regular requests
-        current_text = get_page_text(url, use_browser=False)
-
-        if should_use_browser(current_text, url):
-            logger.info(f"Falling back to browser for {url}.")
-            current_text = get_page_text(url, use_browser=True)
-            use_browser = True
-
-        if current_text is None:
-            logger.error(f"Failed to fetch content for {url} even with browser fallback.")
-            continue # Skip to next site if we cant fetch this one
+            mark_site_as_requires_browser(site_id)
+    return with_diff(site, FetchResult(current_text), repo)
+
+def with_diff(site, result, repo=None):
+    """
+    Fingerprint the fetched text and, if it changed, build the alert diff here in
+    the fetch thread (in the process pool when processing.workers is set) rather
+    than in process_site, which runs on the fetch engine's event loop.
+    """
+    site_id, url, site_name, content_hash, requires_browser, etag, last_modified, extraction_version = site
+    if result.text is None:
+        return result
+    if result.fingerprint is None:
+        with run_metrics.timer("fingerprint"):
+            result = result._replace(fingerprint=content_fingerprint(result.text))
+    if content_hash is None or extraction_version != EXTRACTION_VERSION:
+        return result
+    if result.fingerprint == content_hash:
+        # Unchanged: as on the requests path the text is not needed (nor checkpointed)
+        return result._replace(text=None)
+    if repo is None:
+        return result
+    old_content = repo.get_site_content(site_id) or ""
+    with run_metrics.timer("diff"):
+        diff = run_cpu(alert_diff, old_content, result.text, size=len(old_content) + len(result.text))
+    return result._replace(diff=diff)
+
+def process_site(site, fetch_result, run_stats=None, repo=None):
+    """
+    Compare freshly fetched text with the stored version, alert and update the database
 
-        if use_browser:
-            # Could add logic here to mark this site as requiring browser in the future
-            logger.info(f"Successfully used brownser for {url}. Consider adding to browser list.")
+    Returns:
+        str: the outcome (not_modified, new, rebaselined, unchanged, changed, or
+            the FAILED_* category of a failure)
+    """
+    if repo is None:
+        with SiteRepository() as repo:
+            return process_site(site, fetch_result, run_stats, repo)
 
+    site_id, url, site_name, content_hash, requires_browser, etag, last_modified, extraction_version = site
+    run_stats = run_stats if run_stats is not None else Counter()
+    fetch_result = fetch_result or FetchResult(None)
+    current_text = fetch_result.text
+    validators = {
+        "etag": fetch_result.etag,
+        "last_modified": fetch_result.last_modified,
+        "content_length": fetch_result.content_length,
+        "extraction_version": EXTRACTION_VERSION,
+    }
+    run_stats["checked"] += 1
 
-        # If we have no previous content, just store the current content
-        if old_content is None:
-            logger.info(f"First run for {url}. Storing initial version.")
-            update_site_content(site_id, current_text)
-            continue
+    if fetch_result.not_modified:
+        logger.info(f"No changes for {url} (not modified since last check).")
+        run_stats["not_modified"] += 1
+        repo.queue_last_checked(site_id)
+        return "not_modified"
 
-        # Check for differences
-        differences = find_diffs(old_content, current_text)
-        if differences:
-            logger.warning(f"CHANGES DETECTED for {url}!")
-            send_alert(url, site_name, differences)
-            update_site_content(site_id, old_content)
+    if current_text is None and fetch_result.fingerprint is None:
+        if fetch_result.failure in NO_BROWSER_FAILURES:
+            logger.error(f"Failed to fetch content for {url} ({fetch_result.failure}).")
+            run_stats[fetch_result.failure] += 1
         else:
-            logger.info(f"No changes for {url}.")
-            # Update the last_checked timestamp, even if no changes
-            update_site_content(site_id, old_content)    
-
-def should_use_browser(content, url): 
-    """
-    Determine if we should use browser automation for this site.
-    Returns True if content suggests JS-rendered page or cookie wall"""
-    if content is None:
-        logger.debug(f"Content is None for {url}, will try browser.")
-        return True
-
-    # Check if content is suspiciously short (suggesting a cookie wall)
-    if len(content) < 1000: # Privacy policies are typically long
-        logger.debug(f"Content too short ({len(content)} chars) for {url}, will try browser.") 
-        return True
-    
-    # Check for common cookie banner indicators
-    cookie_indicators = [
-        "cookie", "consent", "gdpr", "privacy settings", 
-        "accept all", "agree", "manage cookies"
-        ]
-
-    content_lower = content.lower()
-    for indicator in cookie_indicators:
-        if indicator in content_lower:
-            logger.debug(f"Found cookie indicator '{indicator}' in {url}, will try browser.")
-            return True
-
-    # Check for JS framework indicators
-    js_indicators = [
-        "react", "vue", "angular", "window.__", "window.gon",
-        "script", "function(", "var ", "const ", "let "
-    ]    
-
-    for indicator in js_indicators:
-        if indicator in content_lower:
-            logger.debug(f"Found JS indicator '{indicator}' in {url}, will try browser.")
-            return True
-    
-    return False
-       
+            logger.error(f"Failed to fetch content for {url} even with browser fallback.")
+        run_stats["failed"] += 1
+        return fetch_result.failure or FAILED_ERROR # Skip to next site if we cant fetch this one
+
+    new_hash = fetch_result.fingerprint
+    if new_hash is None:
+        with run_metrics.timer("fingerprint"):
+            new_hash = content_fingerprint(current_text)
+
+    # If we have no previous content, just store the current content
+    if content_hash is None:
+        logger.info(f"First run for {url}. Storing initial version.")
+        run_stats["new"] += 1
+        repo.update_site_content(site_id, current_text, new_hash, **validators)
+        return "new"
+
+    # Stored with an older text extraction: the text may differ without the policy
+    # having changed, so store the new baseline without alerting
+    if extraction_version != EXTRACTION_VERSION:
+        logger.info(f"Text extraction changed since {url} was stored. Storing a new baseline.")
+        run_stats["rebaselined"] += 1
+        repo.update_site_content(site_id, current_text, new_hash, **validators)
+        return "rebaselined"
+
+    # Fast path: same fingerprint means no change, the old text is never loaded
+    if new_hash == content_hash:
+        logger.info(f"No changes for {url}.")
+        run_stats["unchanged"] += 1
+        # Update the last_checked timestamp, even if no changes
+        repo.queue_last_checked(site_id, fetch_result.etag, fetch_result.last_modified, fetch_result.content_length)
+        return "unchanged"
+
+    # Fingerprints differ, load the previous version to build the diff
+    # (unless fetch_site_text already did)
+    differences = fetch_result.diff
+    if differences is None:
+        old_content = repo.get_site_content(site_id) or ""
+        with run_metrics.timer("diff"):
+            differences = find_diffs(old_content, current_text)
+    logger.warning(f"CHANGES DETECTED for {url}!")
+    run_stats["changed"] += 1
+    repo.update_site_content(site_id, current_text, new_hash, changed=True,
+                             alert=outbox_row(url, site_name, differences), **validators)
+    deliver_alerts()
+    return "changed"
+
 # --- Main Execution for Testing ---
+def parse_args(argv=None):
+    """Parse the command line options of the monitor"""
+    parser = argparse.ArgumentParser(description="Check monitored privacy policies for changes.")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="number of sites to fetch at the same time (default: monitor.concurrency)")
+    parser.add_argument("--per-host", type=int, default=None, dest="per_host_concurrency",
+                        help="maximum concurrent fetches per host (default: monitor.per_host_concurrency)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and check each site when it is due (see the scheduler section in config)")
+    parser.add_argument("--replay", action="store_true",
+                        help="re-run extraction and diffing over the cached raw responses (response_cache section "
+                             "in config) without network access or database changes")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last run that was interrupted instead of checking every site again")
+    parser.add_argument("--shard", action="store_true",
+                        help="check due sites in leased batches, sharing the database with other workers "
+                             "(see the sharding section in config). Stops when nothing is due unless --daemon is set")
+    parser.add_argument("--worker-id", default=None, help="name of this shard worker (default: sharding.worker_id)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    check_all_sites()
+    args = parse_args()
+    if args.replay:
+        replay_all_sites()
+    elif args.shard:
+        run_shard_worker(lambda sites, repo: check_sites(sites, repo, args.concurrency, args.per_host_concurrency),
+                         args.worker_id, keep_running=args.daemon)
+    elif args.daemon:
+        run_daemon(lambda sites, repo: check_sites(sites, repo, args.concurrency, args.per_host_concurrency))
+    else:
+        check_all_sites(args.concurrency, args.per_host_concurrency, args.resume)
 
-    """ 1. Do better scrap
-        2. Set up scheduling"""
\ No newline at end of file
+    """ 1. Do better scrap"""
\ No newline at end of file
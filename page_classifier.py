@@ -0,0 +1,31 @@
+import config # type: ignore
+from indicator_matcher import IndicatorMatcher
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Cookie wall indicators are checked before JS indicators
+BROWSER_INDICATORS = IndicatorMatcher(config.COOKIE_INDICATORS + config.JS_INDICATORS)
+COOKIE_INDICATORS = frozenset(term.lower() for term in config.COOKIE_INDICATORS)
+
+def should_use_browser(content, url):
+    """
+    Determine if we should use browser automation for this site.
+    Returns True if content suggests JS-rendered page or cookie wall"""
+    if content is None:
+        logger.debug(f"Content is None for {url}, will try browser.")
+        return True
+
+    # Check if content is suspiciously short (suggesting a cookie wall)
+    if len(content) < config.MIN_CONTENT_LENGTH: # Privacy policies are typically long
+        logger.debug(f"Content too short ({len(content)} chars) for {url}, will try browser.")
+        return True
+
+    # Check for common cookie banner and JS framework indicators (classifier section in config)
+    indicator = BROWSER_INDICATORS.search(content)
+    if indicator is not None:
+        kind = "cookie" if indicator in COOKIE_INDICATORS else "JS"
+        logger.debug(f"Found {kind} indicator '{indicator}' in {url}, will try browser.")
+        return True
+
+    return False
@@ -0,0 +1,253 @@
+import hashlib
+from collections import namedtuple
+from difflib import SequenceMatcher
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Block level policy diff.
+#
+# The extracted policy text has one block (heading, paragraph, list item...)
+# per line. Each block is reduced to a short hash and the two versions are
+# matched on those hashes: the unchanged start and end are skipped without any
+# matching, and SequenceMatcher only runs on the hashes of the part in between.
+# Words are only compared inside blocks that were replaced, so a one-word edit
+# in a long policy is reported as one modified block instead of a large diff.
+
+# A replaced block counts as modified (rather than removed + added) when at
+# least this fraction of its words is unchanged
+MODIFIED_RATIO = 0.5
+
+# How many new blocks are compared with each replaced old block when looking
+# for its modified version (keeps large rewrites from being quadratic)
+PAIR_WINDOW = 20
+
+# One changed block. kind is "added", "removed" or "modified", the indexes are
+# block (line) numbers in the old/new text (None for the side that has no block).
+# words is the word level diff of a modified block: (tag, old words, new words).
+BlockChange = namedtuple(
+    "BlockChange",
+    ["kind", "old_index", "new_index", "old_text", "new_text", "words"],
+    defaults=(None,)
+)
+
+class PolicyDiff:
+    """
+    Result of diff_policies.
+
+    changes: list of BlockChange in document order
+    text: unified diff of the changed blocks ("" when nothing changed)
+    """
+
+    def __init__(self, changes, text):
+        self.changes = changes
+        self.text = text
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def __str__(self):
+        return self.text
+
+    def _of_kind(self, kind):
+        return [change for change in self.changes if change.kind == kind]
+
+    @property
+    def added(self):
+        return self._of_kind("added")
+
+    @property
+    def removed(self):
+        return self._of_kind("removed")
+
+    @property
+    def modified(self):
+        return self._of_kind("modified")
+
+    def counts(self):
+        """Return the number of added, removed and modified blocks"""
+        return {"added": len(self.added), "removed": len(self.removed), "modified": len(self.modified)}
+
+    def summary(self, max_changes=20):
+        """Return a short description of the changes, with word level edits of modified blocks"""
+        counts = self.counts()
+        lines = [f"{counts['modified']} sections modified, {counts['added']} added, {counts['removed']} removed."]
+        for change in self.changes[:max_changes]:
+            if change.kind == "modified":
+                lines.append(f"~ {inline_word_diff(change.words)}")
+            elif change.kind == "added":
+                lines.append(f"+ {change.new_text}")
+            else:
+                lines.append(f"- {change.old_text}")
+        if len(self.changes) > max_changes:
+            lines.append(f"... and {len(self.changes) - max_changes} more changes.")
+        return "\n".join(lines)
+
+def alert_diff(old_text, new_text):
+    """
+    Summary of the changed sections followed by a unified diff of the changed
+    blocks (the body of a change alert), or None if nothing changed.
+    """
+    if old_text == new_text:
+        return None
+    diff = diff_policies(old_text, new_text)
+    if not diff:
+        return None
+    return f"{diff.summary()}\n\n{diff.text}"
+
+def split_blocks(text):
+    """Split policy text into its non-empty blocks with whitespace collapsed"""
+    blocks = (" ".join(line.split()) for line in text.splitlines())
+    return [block for block in blocks if block]
+
+def block_hash(block):
+    return hashlib.blake2b(block.encode("utf-8"), digest_size=8).digest()
+
+def diff_policies(old_text, new_text, fromfile="Previous Version", tofile="Current Version", context=3):
+    """
+    Compare two versions of a policy block by block.
+
+    Args:
+        old_text (str): previous policy text
+        new_text (str): current policy text
+        context (int): unchanged blocks shown around each change in the text diff
+
+    Returns:
+        PolicyDiff: the changed blocks and a unified diff of them
+    """
+    old_blocks = split_blocks(old_text or "")
+    new_blocks = split_blocks(new_text or "")
+    old_keys = [block_hash(block) for block in old_blocks]
+    new_keys = [block_hash(block) for block in new_blocks]
+
+    # Fast path: most changes touch a small part of the policy, skip the
+    # unchanged start and end before matching anything
+    limit = min(len(old_keys), len(new_keys))
+    start = 0
+    while start < limit and old_keys[start] == new_keys[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old_keys[-1 - end] == new_keys[-1 - end]:
+        end += 1
+
+    opcodes = []
+    if start:
+        opcodes.append(("equal", 0, start, 0, start))
+    matcher = SequenceMatcher(None, old_keys[start:len(old_keys) - end], new_keys[start:len(new_keys) - end],
+                              autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + start, i2 + start, j1 + start, j2 + start))
+    if end:
+        opcodes.append(("equal", len(old_keys) - end, len(old_keys), len(new_keys) - end, len(new_keys)))
+
+    changes = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "equal":
+            changes.extend(pair_blocks(old_blocks, new_blocks, i1, i2, j1, j2))
+
+    text = format_unified(opcodes, old_blocks, new_blocks, fromfile, tofile, context) if changes else ""
+    return PolicyDiff(changes, text)
+
+def pair_blocks(old_blocks, new_blocks, i1, i2, j1, j2):
+    """
+    Turn a replaced range of blocks into changes. Each old block is matched, in
+    order, with the first of the next PAIR_WINDOW new blocks that shares enough
+    words with it (modified), otherwise it was removed. New blocks that are not
+    matched were added.
+    """
+    changes = []
+    next_new = j1
+    for i in range(i1, i2):
+        for j in range(next_new, min(j2, next_new + PAIR_WINDOW)):
+            words = word_diff(old_blocks[i], new_blocks[j])
+            if words is not None:
+                changes.extend(BlockChange("added", None, k, None, new_blocks[k]) for k in range(next_new, j))
+                changes.append(BlockChange("modified", i, j, old_blocks[i], new_blocks[j], words))
+                next_new = j + 1
+                break
+        else:
+            changes.append(BlockChange("removed", i, None, old_blocks[i], None))
+    changes.extend(BlockChange("added", None, k, None, new_blocks[k]) for k in range(next_new, j2))
+    return changes
+
+def word_diff(old_block, new_block):
+    """
+    Return the word level diff of two blocks as (tag, old words, new words)
+    tuples, or None if they have too little in common to be the same block.
+    """
+    old_words = old_block.split()
+    new_words = new_block.split()
+    matcher = SequenceMatcher(None, old_words, new_words, autojunk=False)
+    if matcher.real_quick_ratio() < MODIFIED_RATIO or matcher.quick_ratio() < MODIFIED_RATIO \
+            or matcher.ratio() < MODIFIED_RATIO:
+        return None
+    return [(tag, old_words[i1:i2], new_words[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes()]
+
+def inline_word_diff(words, context=6):
+    """Render a word diff as text with [-removed-]{+added+} markers, shortening long unchanged runs"""
+    parts = []
+    for index, (tag, old_words, new_words) in enumerate(words):
+        if tag == "equal":
+            if len(old_words) > 2 * context:
+                head = old_words[:context] if index > 0 else []
+                tail = old_words[-context:] if index < len(words) - 1 else []
+                old_words = head + ["..."] + tail
+            parts.append(" ".join(old_words))
+            continue
+        if old_words:
+            parts.append(f"[-{' '.join(old_words)}-]")
+        if new_words:
+            parts.append(f"{{+{' '.join(new_words)}+}}")
+    return " ".join(part for part in parts if part)
+
+def format_unified(opcodes, old_blocks, new_blocks, fromfile, tofile, context=3):
+    """Render block opcodes as a unified diff (one block per line)"""
+    lines = [f"--- {fromfile}\n", f"+++ {tofile}\n"]
+    for group in group_opcodes(opcodes, context):
+        first, last = group[0], group[-1]
+        old_start, old_len = first[1], last[2] - first[1]
+        new_start, new_len = first[3], last[4] - first[3]
+        lines.append(f"@@ -{_hunk_range(old_start, old_len)} +{_hunk_range(new_start, new_len)} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(f" {block}\n" for block in old_blocks[i1:i2])
+                continue
+            lines.extend(f"-{block}\n" for block in old_blocks[i1:i2])
+            lines.extend(f"+{block}\n" for block in new_blocks[j1:j2])
+    return "".join(lines)
+
+def _hunk_range(start, length):
+    # Same convention as difflib.unified_diff
+    if length == 1:
+        return f"{start + 1}"
+    if not length:
+        start -= 1
+    return f"{start + 1},{length}"
+
+def group_opcodes(opcodes, context=3):
+    """Split opcodes into hunks with up to `context` unchanged blocks around each change
+    (difflib.SequenceMatcher.get_grouped_opcodes for an already computed opcode list)"""
+    codes = list(opcodes)
+    if not codes:
+        return []
+    # Trim the unchanged blocks at the start and end to the context
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # Split the hunk at long unchanged runs
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
@@ -0,0 +1,135 @@
+import argparse
+import zlib
+from datetime import datetime
+from database import get_db_connection
+from fingerprint import content_fingerprint
+from policy_diff import diff_policies
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Every distinct policy text is stored once in policy_blobs (keyed by its
+# fingerprint and zlib-compressed). policy_versions records, per site, which
+# blob each version points to, so the storage only grows when a policy really
+# changes and a site that reverts to an older text costs one small row.
+# The tables are created by migrations.py.
+
+def compress_text(text):
+    """Compress policy text for storage"""
+    return zlib.compress(text.encode("utf-8"), 9)
+
+def decompress_text(data, codec="zlib"):
+    """Decompress policy text read from policy_blobs"""
+    if codec != "zlib":
+        raise ValueError(f"Unknown policy blob codec: {codec}.")
+    return zlib.decompress(data).decode("utf-8")
+
+def record_version(site_id, text, content_hash=None, conn=None):
+    """
+    Store a new version of a site's policy if it differs from the latest one.
+    If a connection is passed in, the caller is responsible for committing.
+
+    Returns:
+        int: the version number of the text (an existing one if nothing changed)
+    """
+    content_hash = content_hash or content_fingerprint(text)
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        latest = conn.execute(
+            "SELECT version, content_hash FROM policy_versions WHERE site_id = ? ORDER BY version DESC LIMIT 1",
+            (site_id,)
+        ).fetchone()
+        if latest and latest["content_hash"] == content_hash:
+            return latest["version"]
+
+        # The blob is shared by every site/version with the same text
+        conn.execute(
+            "INSERT OR IGNORE INTO policy_blobs (content_hash, codec, size, data) VALUES (?, 'zlib', ?, ?)",
+            (content_hash, len(text.encode("utf-8")), compress_text(text))
+        )
+        version = latest["version"] + 1 if latest else 1
+        conn.execute(
+            "INSERT INTO policy_versions (site_id, version, content_hash, created_at) VALUES (?, ?, ?, ?)",
+            (site_id, version, content_hash, datetime.utcnow().isoformat())
+        )
+        if own_conn:
+            conn.commit()
+        logger.info(f"Stored version {version} of site ID {site_id}.")
+        return version
+    finally:
+        if own_conn:
+            conn.close()
+
+def get_version(site_id, version=None):
+    """
+    Return the text of one version of a site's policy (the latest if version is None),
+    or None if it does not exist.
+    """
+    conn = get_db_connection()
+    try:
+        query = '''
+            SELECT b.codec, b.data FROM policy_versions v
+            JOIN policy_blobs b ON b.content_hash = v.content_hash
+            WHERE v.site_id = ?
+        '''
+        if version is None:
+            row = conn.execute(query + " ORDER BY v.version DESC LIMIT 1", (site_id,)).fetchone()
+        else:
+            row = conn.execute(query + " AND v.version = ?", (site_id, version)).fetchone()
+        return decompress_text(row["data"], row["codec"]) if row else None
+    finally:
+        conn.close()
+
+def list_versions(site_id):
+    """Return (version, content_hash, created_at, size) for every stored version of a site"""
+    conn = get_db_connection()
+    try:
+        return conn.execute(
+            '''
+            SELECT v.version, v.content_hash, v.created_at, b.size FROM policy_versions v
+            JOIN policy_blobs b ON b.content_hash = v.content_hash
+            WHERE v.site_id = ? ORDER BY v.version
+            ''',
+            (site_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+def diff_versions(site_id, from_version, to_version):
+    """Return a unified diff between two stored versions of a site's policy"""
+    old_text = get_version(site_id, from_version)
+    new_text = get_version(site_id, to_version)
+    if old_text is None or new_text is None:
+        raise ValueError(f"Site ID {site_id} has no version {from_version if old_text is None else to_version}.")
+
+    return diff_policies(old_text, new_text, f'Version {from_version}', f'Version {to_version}').text
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the stored history of monitored privacy policies.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="list the versions of a site")
+    list_parser.add_argument("site_id", type=int)
+
+    show_parser = subparsers.add_parser("show", help="print one version of a site (latest by default)")
+    show_parser.add_argument("site_id", type=int)
+    show_parser.add_argument("version", type=int, nargs="?")
+
+    diff_parser = subparsers.add_parser("diff", help="diff two versions of a site")
+    diff_parser.add_argument("site_id", type=int)
+    diff_parser.add_argument("from_version", type=int)
+    diff_parser.add_argument("to_version", type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for version, content_hash, created_at, size in list_versions(args.site_id):
+            print(f"Version {version}: {created_at} {size} bytes {content_hash[:12]}")
+    elif args.command == "show":
+        text = get_version(args.site_id, args.version)
+        print(text if text is not None else "No such version.")
+    else:
+        print(diff_versions(args.site_id, args.from_version, args.to_version) or "No differences.")
+
+if __name__ == "__main__":
+    main()
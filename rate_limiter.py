@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+import config # type: ignore
+from url_utils import host_of
+from http_client import get_session, discard
+from metrics import run_metrics
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Responses worth retrying: rate limited or a (probably) passing server problem
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class HostState:
+    """Politeness state of one host, guarded by the HostRateLimiter lock"""
+
+    def __init__(self, burst, concurrency, now):
+        self.tokens = float(burst)
+        self.refilled = now
+        self.blocked_until = now
+        self.concurrency = float(concurrency)
+        self.latency = None # moving average of the response time
+        self.fastest = None # lowest response time seen, the host's unloaded latency
+        self.stats = Counter()
+
+class HostRateLimiter:
+    """
+    Per-host politeness shared by every requests fetch of a run.
+
+    - A token bucket per host caps the request rate (rate_limit.requests_per_second,
+      with bursts of rate_limit.burst).
+    - A Retry-After answer pauses every request to that host, not just the one retried.
+    - The concurrency allowed per host adapts to how the host responds (AIMD):
+      it grows by about one for every round of fast, successful responses and is
+      halved on errors, or lowered slowly when responses get much slower than
+      the fastest seen. The fetch engine reads it through concurrency().
+    """
+
+    def __init__(self, rate=None, burst=None, min_concurrency=None, max_concurrency=None,
+                 slow_factor=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate or config.RATE_LIMIT_REQUESTS_PER_SECOND
+        self.burst = burst or config.RATE_LIMIT_BURST
+        self.min_concurrency = min_concurrency or config.RATE_LIMIT_MIN_PER_HOST_CONCURRENCY
+        self.max_concurrency = max_concurrency or config.RATE_LIMIT_MAX_PER_HOST_CONCURRENCY
+        self.slow_factor = slow_factor or config.RATE_LIMIT_SLOW_FACTOR
+        self.clock = clock
+        self.sleep = sleep
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host, concurrency=None):
+        state = self._hosts.get(host)
+        if state is None:
+            start = concurrency or config.PER_HOST_CONCURRENCY
+            start = min(max(start, self.min_concurrency), self.max_concurrency)
+            state = self._hosts[host] = HostState(self.burst, start, self.clock())
+        return state
+
+    def concurrency(self, host, initial=None):
+        """Number of fetches currently allowed at the same time for a host"""
+        with self._lock:
+            return max(1, int(self._state(host, initial).concurrency))
+
+    def wait_for_token(self, host):
+        """Block until a request to host is allowed, returning the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                state = self._state(host)
+                now = self.clock()
+                state.tokens = min(self.burst, state.tokens + (now - state.refilled) * self.rate)
+                state.refilled = now
+                wait = max(state.blocked_until - now, (1 - state.tokens) / self.rate)
+                if wait <= 0:
+                    state.tokens -= 1
+                    state.stats["requests"] += 1
+                    if waited:
+                        state.stats["throttled"] += 1
+                    return waited
+            self.sleep(wait)
+            waited += wait
+
+    def block(self, host, seconds):
+        """Hold back every request to host for seconds (Retry-After)"""
+        with self._lock:
+            state = self._state(host)
+            state.blocked_until = max(state.blocked_until, self.clock() + seconds)
+            state.stats["retry_after"] += 1
+
+    def record(self, host, latency=None, ok=True):
+        """Adapt the host's concurrency to the outcome of one request"""
+        with self._lock:
+            state = self._state(host)
+            if not ok:
+                state.stats["errors"] += 1
+                state.concurrency = max(self.min_concurrency, state.concurrency / 2)
+                return
+            if latency is None:
+                return
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            state.fastest = latency if state.fastest is None else min(state.fastest, latency)
+            if state.latency > state.fastest * self.slow_factor:
+                state.concurrency = max(self.min_concurrency, state.concurrency * 0.9)
+            else:
+                # About +1 once every request of the current window succeeded
+                state.concurrency = min(self.max_concurrency, state.concurrency + 1 / state.concurrency)
+
+    def count_retry(self, host):
+        with self._lock:
+            self._state(host).stats["retries"] += 1
+
+    def get_stats(self, reset=False):
+        """Return {host: (stats Counter, current concurrency)}, optionally starting new counts"""
+        with self._lock:
+            stats = {host: (Counter(state.stats), state.concurrency) for host, state in self._hosts.items()}
+            if reset:
+                for state in self._hosts.values():
+                    state.stats.clear()
+            return stats
+
+    def log_summary(self):
+        """Log the counts since the last summary (the learned per host state is kept)"""
+        totals = Counter()
+        busiest = []
+        for host, (stats, concurrency) in self.get_stats(reset=True).items():
+            totals.update(stats)
+            busiest.append((stats["requests"], host, concurrency))
+        if not totals["requests"]:
+            return
+        logger.info(
+            f"Rate limiting: {totals['requests']} requests to {len(busiest)} hosts, {totals['retries']} retried, "
+            f"{totals['errors']} errors, {totals['throttled']} throttled, {totals['retry_after']} Retry-After pauses."
+        )
+        for requests_made, host, concurrency in sorted(busiest, reverse=True)[:5]:
+            logger.debug(f"  {host}: {requests_made} requests, per host concurrency now {concurrency:.1f}.")
+
+_host_limiter = None
+_host_limiter_lock = threading.Lock()
+
+def get_host_limiter():
+    """Return the limiter shared by the fetches of this process (created on first use)"""
+    global _host_limiter
+    with _host_limiter_lock:
+        if _host_limiter is None:
+            _host_limiter = HostRateLimiter()
+        return _host_limiter
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given retry (0 = first retry)"""
+    ceiling = min(config.RATE_LIMIT_BACKOFF_MAX_SECONDS, config.RATE_LIMIT_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+def request_with_retry(url, headers=None, timeout=10, limiter=None, max_retries=None, **kwargs):
+    """
+    GET through the shared session (http_client.py) with per-host rate limiting and retries.
+
+    Connection errors, timeouts and RETRY_STATUSES answers are retried up to
+    max_retries times (rate_limit.max_retries) with exponential backoff and
+    jitter, or after the Retry-After delay when the server sends one. A
+    Retry-After longer than rate_limit.max_retry_after_seconds is not waited for.
+
+    Returns:
+        requests.Response: the last response (which may still be an error status)
+
+    Raises:
+        requests.exceptions.RequestException: if the last try failed without a response
+    """
+    limiter = limiter or get_host_limiter()
+    max_retries = config.RATE_LIMIT_MAX_RETRIES if max_retries is None else max_retries
+    host = host_of(url)
+
+    for attempt in range(max_retries + 1):
+        if attempt:
+            limiter.count_retry(host)
+        waited = limiter.wait_for_token(host)
+        if waited:
+            run_metrics.add_time("rate_limit_wait", waited)
+        started = limiter.clock()
+        try:
+            response = get_session().get(url, headers=headers, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            limiter.record(host, ok=False)
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            logger.info(f"{e.__class__.__name__} for {url}, retrying in {delay:.1f}s ({attempt + 1}/{max_retries}).")
+            limiter.sleep(delay)
+            continue
+
+        if response.status_code not in RETRY_STATUSES:
+            limiter.record(host, limiter.clock() - started)
+            return response
+
+        limiter.record(host, ok=False)
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if attempt == max_retries:
+            return response
+        if retry_after is not None and retry_after > config.RATE_LIMIT_MAX_RETRY_AFTER_SECONDS:
+            logger.warning(f"{url} asks to retry after {retry_after:.0f}s, giving up for this run.")
+            return response
+        discard(response) # Frees the connection of a streamed response
+        if retry_after is not None:
+            logger.info(f"{url} answered {response.status_code}, retrying after {retry_after:.1f}s (Retry-After).")
+            # The whole host waits, wait_for_token holds the next try until then
+            limiter.block(host, retry_after)
+        else:
+            delay = backoff_delay(attempt)
+            logger.info(f"{url} answered {response.status_code}, retrying in {delay:.1f}s ({attempt + 1}/{max_retries}).")
+            limiter.sleep(delay)
+    return response
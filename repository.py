@@ -0,0 +1,384 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+import config # type: ignore
+from fingerprint import content_fingerprint
+from metrics import run_metrics
+from migrations import migrate
+from policy_history import record_version
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# SQL used on the per-site paths. They are constants so sqlite3's statement
+# cache on the repository connection only has to prepare each one once.
+SELECT_SITES_SQL = '''
+    SELECT id, url, site_name, content_hash, requires_browser, etag, last_modified, extraction_version
+    FROM monitored_sites
+'''
+SELECT_SCHEDULE_SQL = "SELECT id, last_checked, last_changed, check_interval_hours FROM monitored_sites"
+SELECT_CONTENT_SQL = "SELECT last_content FROM monitored_sites WHERE id = ?"
+UPDATE_CONTENT_SQL = '''
+    UPDATE monitored_sites
+    SET last_content = ?, content_hash = ?, last_checked = ?, etag = ?, last_modified = ?, content_length = ?,
+        extraction_version = ?, last_changed = COALESCE(?, last_changed)
+    WHERE id = ?
+'''
+UPDATE_CHECKED_SQL = '''
+    UPDATE monitored_sites
+    SET last_checked = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified),
+        content_length = COALESCE(?, content_length)
+    WHERE id = ?
+'''
+SELECT_FETCH_STRATEGY_SQL = '''
+    SELECT id, url, content_hash, requires_browser, browser_probe_failures, last_probe FROM monitored_sites
+'''
+MARK_BROWSER_SQL = '''
+    UPDATE monitored_sites SET requires_browser = 1, browser_probe_failures = 0, last_probe = ? WHERE id = ?
+'''
+RECORD_PROBE_SQL = '''
+    UPDATE monitored_sites
+    SET requires_browser = ?, browser_probe_failures = CASE WHEN ? THEN 0 ELSE browser_probe_failures + 1 END,
+        last_probe = ?
+    WHERE id = ?
+'''
+INSERT_RUN_SQL = '''
+    INSERT INTO check_runs (started_at, finished_at, duration_seconds, stats, counters, stages)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+INSERT_RUN_SITE_SQL = '''
+    INSERT OR REPLACE INTO check_run_sites (run_id, site_id, outcome, fetch_seconds, process_seconds)
+    VALUES (?, ?, ?, ?, ?)
+'''
+# Claim up to :limit due sites that nobody holds a lease on. A site is due once
+# its interval (scaled like Scheduler.interval_hours) has passed since its last check.
+CLAIM_SITES_SQL = '''
+    UPDATE monitored_sites SET claimed_by = :worker, lease_until = :lease_until
+    WHERE id IN (
+        SELECT id FROM monitored_sites
+        WHERE (lease_until IS NULL OR lease_until < :now)
+          AND (last_checked IS NULL OR julianday(last_checked) + COALESCE(check_interval_hours, :interval) *
+               CASE WHEN last_changed IS NULL THEN 1
+                    WHEN julianday(:now) - julianday(last_changed) < :recent_days THEN :recent_factor
+                    WHEN julianday(:now) - julianday(last_changed) > :stable_days THEN :stable_factor
+                    ELSE 1 END / 24.0 <= julianday(:now))
+        ORDER BY last_checked
+        LIMIT :limit
+    )
+    RETURNING id, url, site_name, content_hash, requires_browser, etag, last_modified, extraction_version
+'''
+RENEW_LEASES_SQL = "UPDATE monitored_sites SET lease_until = ? WHERE claimed_by = ?"
+RELEASE_SITES_SQL = "UPDATE monitored_sites SET claimed_by = NULL, lease_until = ? WHERE claimed_by = ?"
+INSERT_CHECKPOINT_RUN_SQL = "INSERT INTO checkpoint_runs (started_at, status, site_count) VALUES (?, 'running', ?)"
+ABANDON_CHECKPOINT_RUNS_SQL = "UPDATE checkpoint_runs SET status = 'abandoned' WHERE status = 'running'"
+FINISH_CHECKPOINT_RUN_SQL = "UPDATE checkpoint_runs SET status = 'finished', finished_at = ? WHERE id = ?"
+DELETE_CHECKPOINT_SITES_SQL = '''
+    DELETE FROM checkpoint_sites WHERE run_id IN (SELECT id FROM checkpoint_runs WHERE status != 'running')
+'''
+SELECT_INTERRUPTED_RUN_SQL = '''
+    SELECT id, started_at, site_count FROM checkpoint_runs WHERE status = 'running' ORDER BY id DESC LIMIT 1
+'''
+SELECT_CHECKPOINT_SITES_SQL = "SELECT site_id, state, fetch_result FROM checkpoint_sites WHERE run_id = ?"
+SAVE_CHECKPOINT_SQL = '''
+    INSERT OR REPLACE INTO checkpoint_sites (run_id, site_id, state, fetch_result) VALUES (?, ?, ?, ?)
+'''
+INSERT_ALERT_SQL = "INSERT INTO alert_outbox (url, site_name, subject, body, created_at) VALUES (?, ?, ?, ?, ?)"
+SELECT_COOKIE_BANNERS_SQL = "SELECT domain, selector, checked_at FROM cookie_banners"
+SAVE_COOKIE_BANNER_SQL = "INSERT OR REPLACE INTO cookie_banners (domain, selector, checked_at) VALUES (?, ?, ?)"
+PRUNE_RUNS_SQL = "DELETE FROM check_runs WHERE id <= ?"
+PRUNE_RUN_SITES_SQL = "DELETE FROM check_run_sites WHERE run_id <= ?"
+
+class SiteRepository:
+    """
+    Data access for a monitoring run over one configured SQLite connection.
+
+    - The connection uses WAL journaling so readers (e.g. checked_sites.py) do
+      not block the run, with synchronous=NORMAL and a larger page cache.
+    - "Nothing changed" status updates are queued and written in one
+      transaction per `batch_size` sites. Content changes are written at once.
+      Run checkpoints of finished sites and cookie banner cache entries are
+      queued with the status updates, so they are committed together.
+    - All access goes through one lock, so the repository can be shared by
+      the concurrent fetch engine's threads.
+
+    Use it as a context manager (or call close()) so queued updates are flushed.
+    """
+
+    def __init__(self, db_path=None, batch_size=None):
+        self.db_path = db_path or config.DATABASE_PATH
+        self.batch_size = batch_size or config.DATABASE_BATCH_SIZE
+        self._lock = threading.RLock()
+        self._pending_checked = []
+        self._pending_checkpoints = []
+        self._pending_banners = []
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=128, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self._configure()
+
+    def _configure(self):
+        """Apply the connection settings"""
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(f"PRAGMA cache_size = -{int(config.DATABASE_CACHE_SIZE_MB) * 1024}")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+        logger.debug(f"Opened repository connection to {self.db_path}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def ensure_schema(self):
+        """Apply pending migrations once at startup so the per-site paths never check the schema"""
+        with self._lock:
+            migrate(self.conn)
+
+    def get_all_sites(self):
+        """Return every monitored site (without the policy text, see get_site_content)"""
+        with self._lock:
+            return self.conn.execute(SELECT_SITES_SQL).fetchall()
+
+    def get_sites(self, site_ids):
+        """Return the rows of the given sites (same columns as get_all_sites)"""
+        return self._select_by_ids(SELECT_SITES_SQL, site_ids)
+
+    def get_schedule_rows(self, site_ids=None):
+        """Return (id, last_checked, last_changed, check_interval_hours) for all or some sites"""
+        if site_ids is None:
+            with self._lock:
+                return self.conn.execute(SELECT_SCHEDULE_SQL).fetchall()
+        return self._select_by_ids(SELECT_SCHEDULE_SQL, site_ids)
+
+    def _select_by_ids(self, select_sql, site_ids):
+        site_ids = list(site_ids)
+        rows = []
+        with self._lock:
+            # Stay below SQLite's limit on the number of bound parameters
+            for start in range(0, len(site_ids), 500):
+                chunk = site_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self.conn.execute(f"{select_sql} WHERE id IN ({placeholders})", chunk).fetchall())
+        return rows
+
+    def get_site_content(self, site_id):
+        """Return the stored policy text of a single site"""
+        with self._lock, run_metrics.timer("db"):
+            row = self.conn.execute(SELECT_CONTENT_SQL, (site_id,)).fetchone()
+            return row[0] if row else None
+
+    def update_site_content(self, site_id, new_content, content_hash=None, etag=None,
+                            last_modified=None, content_length=None, extraction_version=None, changed=False,
+                            alert=None):
+        """
+        Store a new version of a site's policy, record it in the history and commit.
+        changed=True also sets last_changed (used by the scheduler's adaptive intervals).
+        alert (alert_dispatcher.outbox_row) is added to the alert outbox in the
+        same transaction, so the change is never stored without its alert.
+        """
+        content_hash = content_hash or content_fingerprint(new_content)
+        with self._lock, run_metrics.timer("db"):
+            self._flush_checked()
+            current_time = now()
+            self.conn.execute(
+                UPDATE_CONTENT_SQL,
+                (new_content, content_hash, current_time, etag, last_modified, content_length,
+                 extraction_version, current_time if changed else None, site_id)
+            )
+            record_version(site_id, new_content, content_hash, conn=self.conn)
+            if alert is not None:
+                self.conn.execute(INSERT_ALERT_SQL, alert)
+            self.conn.commit()
+
+    def queue_last_checked(self, site_id, etag=None, last_modified=None, content_length=None):
+        """Queue a last_checked (and validator) update, written with the next batch"""
+        with self._lock:
+            self._pending_checked.append((now(), etag, last_modified, content_length, site_id))
+            if len(self._pending_checked) >= self.batch_size:
+                with run_metrics.timer("db"):
+                    self._flush_checked()
+                    self.conn.commit()
+
+    def mark_requires_browser(self, site_id):
+        """Remember that a site needs browser automation (requests is probed again later)"""
+        with self._lock:
+            self.conn.execute(MARK_BROWSER_SQL, (now(), site_id))
+            self.conn.commit()
+        logger.info(f"Marked site ID {site_id} as requiring automation.")
+
+    def get_fetch_strategy_rows(self):
+        """Return the columns the fetch strategy resolver needs for every site"""
+        with self._lock:
+            return self.conn.execute(SELECT_FETCH_STRATEGY_SQL).fetchall()
+
+    def record_probe(self, site_id, recovered):
+        """
+        Store the outcome of trying requests again for a browser site.
+        recovered=True moves the site back to requests.
+        """
+        with self._lock:
+            self.conn.execute(RECORD_PROBE_SQL, (0 if recovered else 1, 1 if recovered else 0, now(), site_id))
+            self.conn.commit()
+        if recovered:
+            logger.info(f"Site ID {site_id} no longer requires automation.")
+
+    def record_check_run(self, run, keep_runs=None):
+        """
+        Store a run summary (metrics.RunMetrics.finish_run) and its per site rows,
+        keeping only the last keep_runs runs (metrics.keep_runs).
+
+        Returns:
+            int: the id of the check_runs row
+        """
+        keep_runs = keep_runs or config.METRICS_KEEP_RUNS
+        with self._lock:
+            self._flush_checked()
+            cursor = self.conn.execute(INSERT_RUN_SQL, (
+                run["started_at"], run["finished_at"], run["duration_seconds"],
+                json.dumps(run["stats"]), json.dumps(run["counters"]), json.dumps(run["stages"])
+            ))
+            run_id = cursor.lastrowid
+            self.conn.executemany(INSERT_RUN_SITE_SQL, [(run_id, *site) for site in run["sites"]])
+            if run_id > keep_runs:
+                self.conn.execute(PRUNE_RUN_SITES_SQL, (run_id - keep_runs,))
+                self.conn.execute(PRUNE_RUNS_SQL, (run_id - keep_runs,))
+            self.conn.commit()
+            return run_id
+
+    def claim_sites(self, worker_id, limit, lease_until, current_time=None):
+        """
+        Lease up to `limit` due sites to a shard worker until lease_until. Sites
+        with an unexpired lease are skipped, expired leases (e.g. of a worker
+        that crashed) are taken over. The claim is one UPDATE, so two workers
+        never get the same site.
+
+        Returns:
+            list: the claimed rows (same columns as get_all_sites)
+        """
+        with self._lock, run_metrics.timer("db"):
+            self._flush_checked()
+            self.conn.commit()
+            rows = self.conn.execute(CLAIM_SITES_SQL, {
+                "worker": worker_id, "lease_until": lease_until, "now": current_time or now(), "limit": limit,
+                "interval": config.CHECK_INTERVAL_HOURS,
+                "recent_days": config.SCHEDULER_RECENT_CHANGE_DAYS,
+                "recent_factor": config.SCHEDULER_RECENT_CHANGE_FACTOR,
+                "stable_days": config.SCHEDULER_STABLE_DAYS, "stable_factor": config.SCHEDULER_STABLE_FACTOR,
+            }).fetchall()
+            self.conn.commit()
+            return rows
+
+    def renew_leases(self, worker_id, site_ids, lease_until):
+        """Extend a worker's leases on the given sites. Returns how many it still held."""
+        return self._update_claimed(RENEW_LEASES_SQL, (lease_until, worker_id), site_ids)
+
+    def release_sites(self, worker_id, site_ids, hold_until=None):
+        """
+        Give up a worker's leases on the given sites. With hold_until, no worker
+        claims them again before that time (used to retry failed checks later).
+        """
+        return self._update_claimed(RELEASE_SITES_SQL, (hold_until, worker_id), site_ids)
+
+    def _update_claimed(self, update_sql, params, site_ids):
+        site_ids = list(site_ids)
+        updated = 0
+        with self._lock, run_metrics.timer("db"):
+            self._flush_checked()
+            for start in range(0, len(site_ids), 500):
+                chunk = site_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                updated += self.conn.execute(f"{update_sql} AND id IN ({placeholders})", (*params, *chunk)).rowcount
+            self.conn.commit()
+        return updated
+
+    def start_checkpoint_run(self, site_count):
+        """
+        Record the start of a check_all_sites run and return its id. Earlier runs
+        that never finished are abandoned (their checkpoints are deleted).
+        """
+        with self._lock:
+            self._flush_checked()
+            self.conn.execute(ABANDON_CHECKPOINT_RUNS_SQL)
+            self.conn.execute(DELETE_CHECKPOINT_SITES_SQL)
+            run_id = self.conn.execute(INSERT_CHECKPOINT_RUN_SQL, (now(), site_count)).lastrowid
+            self.conn.commit()
+            return run_id
+
+    def get_interrupted_run(self):
+        """Return (id, started_at, site_count) of the last run that did not finish, or None"""
+        with self._lock:
+            return self.conn.execute(SELECT_INTERRUPTED_RUN_SQL).fetchone()
+
+    def get_checkpoints(self, run_id):
+        """Return (site_id, state, fetch_result) of the sites a run got to"""
+        with self._lock:
+            return self.conn.execute(SELECT_CHECKPOINT_SITES_SQL, (run_id,)).fetchall()
+
+    def save_fetched_checkpoint(self, run_id, site_id, fetch_result):
+        """Store a fetched but not yet processed page of a run, committed at once"""
+        with self._lock, run_metrics.timer("db"):
+            self._flush_checked()
+            self.conn.execute(SAVE_CHECKPOINT_SQL, (run_id, site_id, "fetched", fetch_result))
+            self.conn.commit()
+
+    def queue_done_checkpoint(self, run_id, site_id):
+        """Queue the checkpoint of a finished site, written with the next batch of status updates"""
+        with self._lock:
+            self._pending_checkpoints.append((run_id, site_id, "done", None))
+            if len(self._pending_checkpoints) >= self.batch_size:
+                with run_metrics.timer("db"):
+                    self._flush_checked()
+                    self.conn.commit()
+
+    def finish_checkpoint_run(self, run_id):
+        """Mark a run as finished and delete its checkpoints"""
+        with self._lock:
+            self._flush_checked()
+            self.conn.execute(FINISH_CHECKPOINT_RUN_SQL, (now(), run_id))
+            self.conn.execute(DELETE_CHECKPOINT_SITES_SQL)
+            self.conn.commit()
+
+    def get_cookie_banners(self):
+        """Return (domain, selector, checked_at) of every cookie_banners entry"""
+        with self._lock:
+            return self.conn.execute(SELECT_COOKIE_BANNERS_SQL).fetchall()
+
+    def queue_cookie_banner(self, domain, selector, checked_at):
+        """Queue a cookie banner cache entry, written with the next batch of status updates"""
+        with self._lock:
+            self._pending_banners.append((domain, selector, checked_at))
+            if len(self._pending_banners) >= self.batch_size:
+                with run_metrics.timer("db"):
+                    self._flush_checked()
+                    self.conn.commit()
+
+    def flush(self):
+        """Write all queued status updates in one transaction"""
+        with self._lock, run_metrics.timer("db"):
+            self._flush_checked()
+            self.conn.commit()
+
+    def _flush_checked(self):
+        if self._pending_checked:
+            self.conn.executemany(UPDATE_CHECKED_SQL, self._pending_checked)
+            logger.debug(f"Wrote {len(self._pending_checked)} queued status updates.")
+            self._pending_checked = []
+        if self._pending_checkpoints:
+            self.conn.executemany(SAVE_CHECKPOINT_SQL, self._pending_checkpoints)
+            self._pending_checkpoints = []
+        if self._pending_banners:
+            self.conn.executemany(SAVE_COOKIE_BANNER_SQL, self._pending_banners)
+            self._pending_banners = []
+
+    def close(self):
+        """Flush queued updates and close the connection"""
+        with self._lock:
+            if self.conn is None:
+                return
+            self.flush()
+            self.conn.close()
+            self.conn = None
+
+def now():
+    return datetime.utcnow().isoformat()
@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+import config # type: ignore
+from cpu_pool import get_cpu_pool, process_page
+from policy_diff import alert_diff
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Raw responses (the HTML or plain text before extraction) of the requests and
+# browser fetches, kept on disk so changes to the extraction or diffing can be
+# tried on real pages without fetching them again (`python monitor.py --replay`).
+#
+# Bodies are content addressed: each distinct body is stored once, zlib
+# compressed, as objects/<2 hex>/<sha256>.z under response_cache.path. The
+# index.db next to them records which bodies each URL had and when they were
+# last fetched. Entries older than max_age_days are evicted first, then the
+# oldest ones until the bodies fit in max_mb.
+
+INDEX_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS entries (
+        url TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        source TEXT NOT NULL,
+        fetched_at TEXT NOT NULL,
+        PRIMARY KEY (url, digest)
+    );
+    CREATE INDEX IF NOT EXISTS idx_entries_fetched_at ON entries (fetched_at);
+    CREATE TABLE IF NOT EXISTS objects (
+        digest TEXT PRIMARY KEY,
+        size INTEGER NOT NULL
+    );
+'''
+STORE_ENTRY_SQL = '''
+    INSERT INTO entries (url, digest, kind, source, fetched_at) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (url, digest) DO UPDATE SET kind = excluded.kind, source = excluded.source,
+        fetched_at = excluded.fetched_at
+'''
+STORE_OBJECT_SQL = "INSERT OR REPLACE INTO objects (digest, size) VALUES (?, ?)"
+SELECT_VERSIONS_SQL = '''
+    SELECT digest, kind, source, fetched_at FROM entries WHERE url = ? ORDER BY fetched_at DESC LIMIT ?
+'''
+
+COMPRESSION_LEVEL = 6
+
+class ResponseCache:
+    """
+    On-disk cache of raw fetched pages (see above). Safe to share between the
+    fetch threads, and between processes using the same directory.
+    """
+
+    def __init__(self, path=None, max_mb=None, max_age_days=None):
+        self.path = config.resolve_path(path or config.RESPONSE_CACHE_PATH)
+        self.max_bytes = (max_mb or config.RESPONSE_CACHE_MAX_MB) * 1024 * 1024
+        self.max_age_days = max_age_days or config.RESPONSE_CACHE_MAX_AGE_DAYS
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.path, "objects"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.path, "index.db"), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(INDEX_SCHEMA)
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, "objects", digest[:2], f"{digest}.z")
+
+    def store(self, url, body, kind, source):
+        """
+        Keep the raw body of a fetched page
+
+        Args:
+            kind (str): "html" or "text" (how it is extracted, see cpu_pool.process_page)
+            source (str): "requests" or "browser"
+        """
+        data = body.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        size = None
+        if not os.path.exists(path):
+            compressed = zlib.compress(data, COMPRESSION_LEVEL)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(temp_path, path)
+            size = len(compressed)
+        with self._lock:
+            if size is not None:
+                self.conn.execute(STORE_OBJECT_SQL, (digest, size))
+                self.stats["stored"] += 1
+                self.stats["stored_bytes"] += size
+            else:
+                self.stats["deduplicated"] += 1
+            self.conn.execute(STORE_ENTRY_SQL, (url, digest, kind, source, datetime.utcnow().isoformat()))
+            self.conn.commit()
+        return digest
+
+    def versions(self, url, limit=2):
+        """Return (digest, kind, source, fetched_at) of the last bodies of a URL, newest first"""
+        with self._lock:
+            return self.conn.execute(SELECT_VERSIONS_SQL, (url, limit)).fetchall()
+
+    def load(self, digest):
+        """Return a stored body, or None if it was evicted"""
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return zlib.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def evict(self, now=None):
+        """
+        Drop entries older than max_age_days, then the oldest entries while the
+        stored bodies take more than max_mb. Returns how many bodies were deleted.
+        """
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=self.max_age_days)).isoformat()
+        with self._lock:
+            self.conn.execute("DELETE FROM entries WHERE fetched_at < ?", (cutoff,))
+            total = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM objects WHERE digest IN (SELECT digest FROM entries)"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                sizes = dict(self.conn.execute("SELECT digest, size FROM objects"))
+                references = Counter(digest for (digest,) in self.conn.execute("SELECT digest FROM entries"))
+                oldest = self.conn.execute("SELECT url, digest FROM entries ORDER BY fetched_at").fetchall()
+                for url, digest in oldest:
+                    if total <= self.max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM entries WHERE url = ? AND digest = ?", (url, digest))
+                    references[digest] -= 1
+                    if references[digest] == 0:
+                        total -= sizes.get(digest, 0)
+            unused = [digest for (digest,) in self.conn.execute(
+                "SELECT digest FROM objects WHERE digest NOT IN (SELECT digest FROM entries)")]
+            for digest in unused:
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+            self.conn.executemany("DELETE FROM objects WHERE digest = ?", [(digest,) for digest in unused])
+            self.conn.commit()
+        if unused:
+            logger.info(f"Evicted {len(unused)} cached responses.")
+        return len(unused)
+
+    def summary(self):
+        """Return the number of URLs, entries and bodies, and the bytes the bodies take"""
+        with self._lock:
+            urls, entries = self.conn.execute("SELECT COUNT(DISTINCT url), COUNT(*) FROM entries").fetchone()
+            objects, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return {"urls": urls, "entries": entries, "objects": objects, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Return the shared cache, or None when response_cache.enabled is off"""
+    global _cache
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+def store_response(url, body, kind, source):
+    """Keep a fetched page in the cache if it is enabled. A cache error never fails the check."""
+    cache = get_response_cache()
+    if cache is None or body is None:
+        return
+    try:
+        cache.store(url, body, kind, source)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Could not cache the response of {url}: {e}.")
+
+def replay_page(url, kind, body, previous_body=None, previous_kind=None):
+    """
+    Extract a cached page with the current code and diff it with the previous
+    cached body of the same URL. Runs in the process pool.
+
+    Returns:
+        tuple: (fingerprint, needs_browser, alert diff or None)
+    """
+    page = process_page(body, kind, url)
+    diff = None
+    if previous_body is not None:
+        previous = process_page(previous_body, previous_kind, url)
+        if previous.fingerprint != page.fingerprint:
+            diff = alert_diff(previous.text, page.text)
+    return page.fingerprint, page.needs_browser, diff
+
+def replay(sites, cache=None):
+    """
+    Run the extraction and diffing over the cached responses of the given site
+    rows, without any network access and without changing the database.
+
+    For each site, the latest cached body is compared with the stored text
+    (fingerprint), and diffed with the body cached before it.
+
+    Returns:
+        tuple: (Counter of outcomes, [(url, outcome, diff or None), ...])
+    """
+    cache = cache or get_response_cache() or ResponseCache()
+    started = time.perf_counter()
+    stats = Counter()
+    work = []
+    for site in sites:
+        versions = cache.versions(site[1], limit=2)
+        body = cache.load(versions[0][0]) if versions else None
+        if body is None:
+            stats["not_cached"] += 1
+            continue
+        previous = (cache.load(versions[1][0]), versions[1][1]) if len(versions) > 1 else (None, None)
+        work.append((site, (site[1], versions[0][1], body, *previous)))
+
+    pool = get_cpu_pool()
+    if pool is not None:
+        outputs = pool.map(replay_page, *zip(*(args for _, args in work)), chunksize=8) if work else []
+    else:
+        outputs = (replay_page(*args) for _, args in work)
+
+    results = []
+    for (site, _), (fingerprint, needs_browser, diff) in zip(work, outputs):
+        stats["replayed"] += 1
+        if needs_browser:
+            stats["needs_browser"] += 1
+        stored = "same_as_stored" if fingerprint == site[3] else "differs_from_stored"
+        stats[stored] += 1
+        if diff:
+            stats["changed"] += 1
+        results.append((site[1], stored, diff))
+    logger.info(f"Replayed {stats['replayed']} cached responses in {time.perf_counter() - started:.2f}s: "
+                f"{stats['same_as_stored']} give the stored text, {stats['differs_from_stored']} do not, "
+                f"{stats['changed']} changed since the previous cached response, {stats['not_cached']} not cached.")
+    return stats, results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or prune the raw response cache.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="show how much is cached")
+    subparsers.add_parser("prune", help="evict old entries now (runs after every check run anyway)")
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache()
+    try:
+        if args.command == "prune":
+            cache.evict()
+        summary = cache.summary()
+        print(f"{summary['urls']} URLs, {summary['entries']} cached responses, {summary['objects']} distinct bodies, "
+              f"{summary['bytes'] / (1024 * 1024):.1f} MB in {cache.path}.")
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+    main()
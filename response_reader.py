@@ -0,0 +1,83 @@
+import codecs
+import re
+import requests
+import config # type: ignore
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """The body is larger than monitor.max_page_bytes"""
+
+class UnsupportedContentType(requests.exceptions.RequestException):
+    """The response is not a page we can extract text from (PDF, image, download...)"""
+
+def content_kind(response):
+    """
+    Return "html" or "text" for the Content-Type of a response.
+    A response without a Content-Type is treated as HTML.
+
+    Raises:
+        UnsupportedContentType: for types not in monitor.accepted_content_types
+    """
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if not content_type:
+        return "html"
+    if content_type not in config.ACCEPTED_CONTENT_TYPES:
+        raise UnsupportedContentType(f"Unsupported content type {content_type} for url: {response.url}",
+                                     response=response)
+    return "text" if content_type == "text/plain" else "html"
+
+def read_text(response, max_bytes=None):
+    """
+    Read the body of a streamed response (requests.get(..., stream=True)) and
+    decode it chunk by chunk, giving up as soon as it passes max_bytes. The
+    response is always closed.
+
+    Returns:
+        tuple: (text, body size in bytes)
+
+    Raises:
+        ResponseTooLarge: if the body (after gzip/deflate decoding) is larger than max_bytes
+    """
+    max_bytes = max_bytes or config.MAX_PAGE_BYTES
+    try:
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ResponseTooLarge(f"{declared} bytes declared, more than {max_bytes} for url: {response.url}",
+                                   response=response)
+
+        decoder = None
+        parts = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ResponseTooLarge(f"More than {max_bytes} bytes for url: {response.url}", response=response)
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(guess_encoding(response, chunk))(errors="replace")
+            parts.append(decoder.decode(chunk))
+        if decoder is not None:
+            parts.append(decoder.decode(b"", final=True))
+        return "".join(parts), size
+    finally:
+        response.close()
+
+def guess_encoding(response, first_chunk):
+    """Charset from the Content-Type header, else from a <meta> tag in the first chunk, else UTF-8"""
+    content_type = response.headers.get("Content-Type", "")
+    if "charset=" in content_type.lower():
+        encoding = requests.utils.get_encoding_from_headers(response.headers)
+    else:
+        match = _META_CHARSET.search(first_chunk[:4096])
+        encoding = match.group(1).decode("ascii", "replace") if match else "utf-8"
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        logger.debug(f"Unknown charset {encoding} for {response.url}, decoding as UTF-8.")
+        return "utf-8"
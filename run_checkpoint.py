@@ -0,0 +1,80 @@
+import json
+import zlib
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# check_all_sites records its progress in the checkpoint_runs and
+# checkpoint_sites tables (created by migrations.py) so a run that crashed or
+# was killed can be continued with `python monitor.py --resume`:
+#
+# - a site whose check finished is marked "done". These marks are written
+#   with the repository's batched status updates, in the same transaction, so
+#   after a crash at most the last batch of sites is checked again.
+# - a page that was fetched with new text (a new or changed policy) is stored
+#   compressed as "fetched" and committed before it is diffed and alerted on,
+#   so on resume it is processed without fetching it again.
+# - sites without a checkpoint are fetched as usual.
+#
+# Starting a run without --resume abandons the interrupted one.
+
+class RunCheckpoint:
+    """Checkpoints of one check_all_sites run (see above)"""
+
+    def __init__(self, repo, run_id, done=(), fetched=None):
+        self.repo = repo
+        self.run_id = run_id
+        self.done = set(done)
+        self.fetched = fetched or {}
+
+    def split(self, sites):
+        """
+        Return (sites to fetch, [(site, stored fetch result fields)...]) of the
+        given site rows, leaving out the sites that are already done
+        """
+        to_fetch = []
+        fetched = []
+        for site in sites:
+            if site[0] in self.done:
+                continue
+            if site[0] in self.fetched:
+                fetched.append((site, decode_result(self.fetched[site[0]])))
+            else:
+                to_fetch.append(site)
+        return to_fetch, fetched
+
+    def save_fetched(self, site_id, result_fields):
+        self.repo.save_fetched_checkpoint(self.run_id, site_id, encode_result(result_fields))
+
+    def mark_done(self, site_id):
+        self.repo.queue_done_checkpoint(self.run_id, site_id)
+
+    def finish(self):
+        self.repo.finish_checkpoint_run(self.run_id)
+        logger.info(f"Run #{self.run_id} finished.")
+
+def start_checkpoint(repo, site_count, resume=False):
+    """
+    Return the RunCheckpoint of a new run, or with resume=True of the last run
+    that did not finish (a new run if there is none)
+    """
+    if resume:
+        run = repo.get_interrupted_run()
+        if run is not None:
+            rows = repo.get_checkpoints(run["id"])
+            done = [row["site_id"] for row in rows if row["state"] == "done"]
+            fetched = {row["site_id"]: row["fetch_result"] for row in rows if row["state"] == "fetched"}
+            logger.info(f"Resuming run #{run['id']} from {run['started_at']}: {len(done)} sites done, "
+                        f"{len(fetched)} fetched and not processed yet.")
+            return RunCheckpoint(repo, run["id"], done, fetched)
+        logger.info("No interrupted run to resume, starting a new run.")
+    run_id = repo.start_checkpoint_run(site_count)
+    logger.info(f"Started run #{run_id}.")
+    return RunCheckpoint(repo, run_id)
+
+def encode_result(result_fields):
+    """Compress the fields of a FetchResult (a dict) for checkpoint_sites"""
+    return zlib.compress(json.dumps(result_fields).encode("utf-8"), 1)
+
+def decode_result(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
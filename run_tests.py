@@ -9,7 +9,32 @@ def run_tests():
     tests = [
         "test_database.py",
         "test_scraping.py",
-        "test_monitor.py" 
+        "test_monitor.py",
+        "test_fetch_engine.py",
+        "test_browser_pool.py",
+        "test_conditional_fetch.py",
+        "test_change_detection.py",
+        "test_policy_history.py",
+        "test_repository.py",
+        "test_migrations.py",
+        "test_scheduler.py",
+        "test_text_extraction.py",
+        "test_policy_diff.py",
+        "test_alert_dispatcher.py",
+        "test_indicator_matcher.py",
+        "test_fetch_strategy.py",
+        "test_browser_lean.py",
+        "test_cookie_banner.py",
+        "test_link_discoverer.py",
+        "test_rate_limiter.py",
+        "test_streaming_fetch.py",
+        "test_metrics.py",
+        "test_bench_suite.py",
+        "test_cpu_pool.py",
+        "test_shard_worker.py",
+        "test_run_checkpoint.py",
+        "test_response_cache.py",
+        "test_http_client.py"
     ]
 
     passed = 0
@@ -0,0 +1,181 @@
+import heapq
+import random
+import signal
+import threading
+from datetime import datetime, timedelta
+import config # type: ignore
+from alert_dispatcher import shutdown_alert_dispatcher
+from browser_pool import shutdown_browser_pool
+from cpu_pool import shutdown_cpu_pool
+from repository import SiteRepository
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class Scheduler:
+    """
+    Decide when each site is due and check the due sites in small batches.
+
+    Sites are kept in a priority queue keyed on their next-due time:
+        next due = last_checked + interval * adaptive factor (+/- jitter)
+
+    - interval is the site's check_interval_hours, or monitor.check_interval_hours
+    - the adaptive factor checks sites that changed recently more often
+      (recent_change_factor) and sites that have been stable for a long time
+      less often (stable_factor)
+    - jitter spreads sites that were last checked together over a window
+      instead of making them all due at the same moment
+
+    check_func(sites, repo) is called with the rows of the due sites.
+    """
+
+    def __init__(self, repo, check_func, rng=None, clock=datetime.utcnow):
+        self.repo = repo
+        self.check_func = check_func
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.default_interval_hours = config.CHECK_INTERVAL_HOURS
+        self.jitter_fraction = config.SCHEDULER_JITTER_FRACTION
+        self.recent_change_days = config.SCHEDULER_RECENT_CHANGE_DAYS
+        self.recent_change_factor = config.SCHEDULER_RECENT_CHANGE_FACTOR
+        self.stable_days = config.SCHEDULER_STABLE_DAYS
+        self.stable_factor = config.SCHEDULER_STABLE_FACTOR
+        self.batch_size = config.SCHEDULER_BATCH_SIZE
+        self.retry_minutes = config.SCHEDULER_RETRY_MINUTES
+        self._queue = []
+        self._scheduled = {}
+
+    def interval_hours(self, row, now):
+        """Return the adaptive check interval of a site in hours"""
+        interval = row["check_interval_hours"] or self.default_interval_hours
+        last_changed = parse_time(row["last_changed"])
+        if last_changed is None:
+            return interval
+        days_since_change = (now - last_changed).total_seconds() / 86400
+        if days_since_change < self.recent_change_days:
+            return interval * self.recent_change_factor
+        if days_since_change > self.stable_days:
+            return interval * self.stable_factor
+        return interval
+
+    def next_due(self, row, now):
+        """Return when a site should be checked next"""
+        interval = timedelta(hours=self.interval_hours(row, now))
+        jitter = interval * self.jitter_fraction
+        last_checked = parse_time(row["last_checked"])
+        if last_checked is None:
+            # Never checked: due now, spread over the jitter window
+            return now + jitter * self.rng.random()
+        return last_checked + interval + jitter * self.rng.uniform(-1, 1)
+
+    def schedule(self, row, now, due=None):
+        due = due or self.next_due(row, now)
+        self._scheduled[row["id"]] = due
+        heapq.heappush(self._queue, (due, row["id"]))
+
+    def load(self):
+        """Add every site that is not scheduled yet (new sites are picked up this way)"""
+        now = self.clock()
+        added = 0
+        for row in self.repo.get_schedule_rows():
+            if row["id"] not in self._scheduled:
+                self.schedule(row, now)
+                added += 1
+        if added:
+            logger.info(f"Scheduled {added} sites.")
+        return added
+
+    def seconds_until_next(self):
+        """Return the number of seconds until the next site is due (None if nothing is scheduled)"""
+        self._drop_stale()
+        if not self._queue:
+            return None
+        return max(0.0, (self._queue[0][0] - self.clock()).total_seconds())
+
+    def _drop_stale(self):
+        # Entries are replaced rather than updated, skip the old ones
+        while self._queue and self._scheduled.get(self._queue[0][1]) != self._queue[0][0]:
+            heapq.heappop(self._queue)
+
+    def pop_due(self):
+        """Remove and return the ids of up to batch_size sites that are due"""
+        now = self.clock()
+        due_ids = []
+        while len(due_ids) < self.batch_size:
+            self._drop_stale()
+            if not self._queue or self._queue[0][0] > now:
+                break
+            _, site_id = heapq.heappop(self._queue)
+            del self._scheduled[site_id]
+            due_ids.append(site_id)
+        return due_ids
+
+    def run_once(self):
+        """Check the sites that are due now and reschedule them. Returns how many were checked."""
+        due_ids = self.pop_due()
+        if not due_ids:
+            return 0
+
+        sites = self.repo.get_sites(due_ids)
+        logger.info(f"{len(sites)} sites due, {len(self._scheduled)} waiting.")
+        before = {row["id"]: row["last_checked"] for row in self.repo.get_schedule_rows(due_ids)}
+        try:
+            self.check_func(sites, self.repo)
+        finally:
+            self.repo.flush()
+            now = self.clock()
+            for row in self.repo.get_schedule_rows(due_ids):
+                if row["last_checked"] == before.get(row["id"]):
+                    # The check failed, try again later instead of on the next loop
+                    self.schedule(row, now, now + timedelta(minutes=self.retry_minutes))
+                else:
+                    self.schedule(row, now)
+        return len(sites)
+
+    def run_forever(self, stop_event, poll_seconds=None, reload_seconds=None):
+        """Keep checking due sites until stop_event is set"""
+        poll_seconds = poll_seconds or config.SCHEDULER_POLL_SECONDS
+        reload_seconds = reload_seconds or config.SCHEDULER_RELOAD_SECONDS
+        self.load()
+        last_reload = self.clock()
+
+        while not stop_event.is_set():
+            if (self.clock() - last_reload).total_seconds() >= reload_seconds:
+                self.load()
+                last_reload = self.clock()
+
+            if self.run_once():
+                continue
+
+            wait = self.seconds_until_next()
+            stop_event.wait(poll_seconds if wait is None else min(wait, poll_seconds))
+
+def parse_time(value):
+    """Parse a timestamp stored by the monitor (UTC ISO format)"""
+    return datetime.fromisoformat(value) if value else None
+
+def run_daemon(check_func):
+    """
+    Run the scheduler until SIGINT/SIGTERM.
+
+    Args:
+        check_func (callable): check_func(sites, repo) checks the given site rows
+    """
+    stop_event = threading.Event()
+    def request_stop(signum, frame):
+        logger.info("Stopping scheduler...")
+        stop_event.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    repo = SiteRepository()
+    try:
+        repo.ensure_schema()
+        logger.info("Scheduler started.")
+        Scheduler(repo, check_func).run_forever(stop_event)
+    finally:
+        repo.close()
+        shutdown_browser_pool()
+        shutdown_cpu_pool()
+        shutdown_alert_dispatcher()
+        logger.info("Scheduler stopped.")
@@ -0,0 +1,124 @@
+import os
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+import config # type: ignore
+from alert_dispatcher import shutdown_alert_dispatcher
+from browser_pool import shutdown_browser_pool
+from cpu_pool import shutdown_cpu_pool
+from repository import SiteRepository
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Several workers (on one machine or many) sharing one database split the
+# sites between them by leasing batches of due sites: a worker sets claimed_by
+# and lease_until on a batch in one UPDATE, checks it, and releases it. While
+# it checks, it renews the leases so a slow batch is not taken over. If the
+# worker dies, its leases expire and the sites are claimed by another worker.
+
+class ShardWorker:
+    """
+    Claim batches of due sites from the shared database and check them.
+
+    check_func(sites, repo) is called with the rows of each claimed batch
+    (monitor.check_sites), so every site is checked the way check_all_sites
+    checks it, by one worker at a time.
+    """
+
+    def __init__(self, repo, check_func, worker_id=None, batch_size=None, lease_seconds=None, clock=datetime.utcnow):
+        self.repo = repo
+        self.check_func = check_func
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size or config.SHARD_BATCH_SIZE
+        self.lease_seconds = lease_seconds or config.SHARD_LEASE_SECONDS
+        self.retry_minutes = config.SCHEDULER_RETRY_MINUTES
+        self.clock = clock
+
+    def lease_until(self):
+        return (self.clock() + timedelta(seconds=self.lease_seconds)).isoformat()
+
+    def claim(self):
+        """Lease the next batch of due sites to this worker"""
+        return self.repo.claim_sites(self.worker_id, self.batch_size, self.lease_until(), self.clock().isoformat())
+
+    def run_once(self):
+        """Claim, check and release one batch. Returns how many sites were checked."""
+        sites = self.claim()
+        if not sites:
+            return 0
+
+        site_ids = [row["id"] for row in sites]
+        logger.info(f"Worker {self.worker_id} claimed {len(sites)} sites.")
+        before = {row["id"]: row["last_checked"] for row in self.repo.get_schedule_rows(site_ids)}
+        done = threading.Event()
+        renewer = threading.Thread(target=self._renew_leases, args=(site_ids, done), name="lease-renewer", daemon=True)
+        renewer.start()
+        try:
+            self.check_func(sites, self.repo)
+        finally:
+            done.set()
+            renewer.join()
+            self.repo.flush()
+            failed = [row["id"] for row in self.repo.get_schedule_rows(site_ids)
+                      if row["last_checked"] == before.get(row["id"])]
+            # A failed check is retried later (by any worker) instead of on the next claim
+            retry_at = (self.clock() + timedelta(minutes=self.retry_minutes)).isoformat()
+            self.repo.release_sites(self.worker_id, set(site_ids) - set(failed))
+            self.repo.release_sites(self.worker_id, failed, hold_until=retry_at)
+        return len(sites)
+
+    def _renew_leases(self, site_ids, done):
+        while not done.wait(self.lease_seconds / 3):
+            held = self.repo.renew_leases(self.worker_id, site_ids, self.lease_until())
+            if held < len(site_ids):
+                logger.warning(f"Worker {self.worker_id} lost the lease on {len(site_ids) - held} sites.")
+
+    def run(self, stop_event, keep_running=False, poll_seconds=None):
+        """
+        Check batches until no site is due (or, with keep_running, until stop_event
+        is set, waiting for sites to become due). Returns how many sites were checked.
+        """
+        poll_seconds = poll_seconds or config.SCHEDULER_POLL_SECONDS
+        checked = 0
+        while not stop_event.is_set():
+            count = self.run_once()
+            checked += count
+            if count:
+                continue
+            if not keep_running:
+                break
+            stop_event.wait(poll_seconds)
+        logger.info(f"Worker {self.worker_id} checked {checked} sites.")
+        return checked
+
+def default_worker_id():
+    """sharding.worker_id, or host name and process id"""
+    return config.SHARD_WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+def run_shard_worker(check_func, worker_id=None, keep_running=False):
+    """
+    Run a shard worker until no site is due (or until SIGINT/SIGTERM with keep_running).
+
+    Args:
+        check_func (callable): check_func(sites, repo) checks the given site rows
+    """
+    stop_event = threading.Event()
+    def request_stop(signum, frame):
+        logger.info("Stopping shard worker after the current batch...")
+        stop_event.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    repo = SiteRepository()
+    try:
+        repo.ensure_schema()
+        worker = ShardWorker(repo, check_func, worker_id)
+        logger.info(f"Shard worker {worker.worker_id} started.")
+        return worker.run(stop_event, keep_running)
+    finally:
+        repo.close()
+        shutdown_browser_pool()
+        shutdown_cpu_pool()
+        shutdown_alert_dispatcher()
@@ -0,0 +1,110 @@
+import sys
+import config # type: ignore
+from alert_dispatcher import AlertDispatcher, outbox_row
+from database import add_site, get_db_connection
+from local_smtp import LocalSMTPServer
+from repository import SiteRepository
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def outbox_rows():
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT url, attempts FROM alert_outbox ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+def test_alert_dispatcher():
+    """Test the pooled, queued alert dispatcher against the local SMTP stand-in"""
+    logger.info("Starting alert dispatcher tests...")
+
+    fresh_test_db()
+
+    server = LocalSMTPServer().start()
+    config.SMTP_SERVER = "127.0.0.1"
+    config.SMTP_PORT = server.port
+    config.SMTP_STARTTLS = False
+    config.SMTP_TIMEOUT_SECONDS = 5
+
+    try:
+        # Test 1: a burst of alerts is sent over one authenticated connection
+        dispatcher = AlertDispatcher(digest=False, linger_seconds=0.5)
+        for i in range(5):
+            dispatcher.send(f"https://site{i}.example/privacy", f"Site {i}", f"diff {i}")
+        dispatcher.close(timeout=10)
+        if server.stats != {"connections": 1, "logins": 1, "messages": 5}:
+            logger.error(f"Alerts did not share one connection: {server.stats}.")
+            return False
+        if "Site 3" not in server.messages[3]["Subject"] or outbox_rows():
+            logger.error("Sent alerts are wrong or were left in the outbox.")
+            return False
+
+        # Test 2: digest mode sends one message per flush
+        server.messages.clear()
+        dispatcher = AlertDispatcher(digest=True, linger_seconds=0)
+        for i in range(3):
+            dispatcher.send(f"https://digest{i}.example/privacy", None, f"diff {i}")
+        if not dispatcher.flush(timeout=10) or len(server.messages) != 1:
+            logger.error(f"Digest was not sent as one message: {len(server.messages)} messages.")
+            return False
+        body = server.messages[0].get_payload()[0].get_payload()
+        if "3 sites" not in server.messages[0]["Subject"] or "https://digest2.example/privacy" not in body:
+            logger.error("Digest does not list every changed site.")
+            return False
+        dispatcher.close(timeout=10)
+
+        # Test 3: failed sends stay in the outbox and are retried by the next dispatcher
+        server.messages.clear()
+        closed_server = LocalSMTPServer()
+        closed_server.server_close()
+        config.SMTP_PORT = closed_server.port # nothing listens on this port any more
+        dispatcher = AlertDispatcher(digest=False, linger_seconds=0)
+        dispatcher.send("https://down.example/privacy", "Down", "diff")
+        dispatcher.close(timeout=10)
+        rows = outbox_rows()
+        if len(rows) != 1 or rows[0]["attempts"] != 1 or server.messages:
+            logger.error(f"Failed alert was not kept in the outbox: {[tuple(row) for row in rows]}.")
+            return False
+
+        config.SMTP_PORT = server.port
+        AlertDispatcher(digest=False, linger_seconds=0).close(timeout=10)
+        if outbox_rows() or len(server.messages) != 1:
+            logger.error("Alert from the outbox was not retried.")
+            return False
+
+        # Test 4: an alert is in the outbox as soon as send() returns, so a dispatcher
+        # killed before it sends loses nothing
+        server.messages.clear()
+        dispatcher = AlertDispatcher(digest=True, linger_seconds=0)
+        dispatcher.send("https://killed.example/privacy", "Killed", "diff")
+        rows = outbox_rows()
+        if [row["url"] for row in rows] != ["https://killed.example/privacy"] or server.messages:
+            logger.error(f"Alert was not stored before it was sent: {[tuple(row) for row in rows]}.")
+            return False
+
+        # Test 5: a changed site's alert is stored in the same transaction as its content
+        add_site("https://changed.example/privacy", "Changed")
+        with SiteRepository() as repo:
+            site_id = repo.get_all_sites()[0]["id"]
+            repo.update_site_content(site_id, "New policy", changed=True,
+                                     alert=outbox_row("https://changed.example/privacy", "Changed", "diff"))
+        if [row["url"] for row in outbox_rows()] != ["https://killed.example/privacy", "https://changed.example/privacy"]:
+            logger.error("Alert was not stored with the content update.")
+            return False
+        dispatcher.close(timeout=10)
+        if outbox_rows() or len(server.messages) != 1 or "2 sites" not in server.messages[0]["Subject"]:
+            logger.error("Stored alerts were not sent by the dispatcher.")
+            return False
+    except Exception as e:
+        logger.error(f"Alert dispatcher test failed: {e}.")
+        return False
+    finally:
+        server.stop()
+
+    logger.info("All alert dispatcher tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_alert_dispatcher() else 1)
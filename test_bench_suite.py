@@ -0,0 +1,65 @@
+import sys
+import requests
+from bench_suite import run_suite, site_kinds, parse_mix, percentile
+from fixture_server import FixtureServer, STATIC, JS, LARGE
+import test_support # Uses the test database
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_bench_suite():
+    """Test the fixture server and a small end to end benchmark run"""
+    logger.info("Starting benchmark suite tests...")
+
+    try:
+        # Test 1: the mix gives the requested share of each kind, the same for a seed
+        mix = parse_mix("static=70,js=10,cookie=10,large=10")
+        kinds = site_kinds(100, mix, seed=1)
+        if kinds.count("static") != 70 or kinds.count("large") != 10 or kinds != site_kinds(100, mix, seed=1):
+            logger.error(f"Unexpected kinds: {kinds}.")
+            return False
+        if percentile([5, 1, 3, 2, 4], 0.5) != 3 or percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 0.95) != 10:
+            logger.error("Percentiles are wrong.")
+            return False
+
+        # Test 2: pages, ETags, versions and the rendered view of JS pages
+        with FixtureServer(sections=5, large_sections=50) as server:
+            response = requests.get(server.url(1, STATIC), timeout=10)
+            etag = response.headers["ETag"]
+            again = requests.get(server.url(1, STATIC), headers={"If-None-Match": etag}, timeout=10)
+            server.versions[1] = 1
+            changed = requests.get(server.url(1, STATIC), headers={"If-None-Match": etag}, timeout=10)
+            if "site 1" not in response.text or again.status_code != 304 or changed.status_code != 200:
+                logger.error(f"ETags or versions do not work: {again.status_code}, {changed.status_code}.")
+                return False
+            shell = requests.get(server.url(2, JS), timeout=10).text
+            rendered = requests.get(server.url(2, JS) + "?rendered=1", timeout=10).text
+            large = requests.get(server.url(3, LARGE), timeout=10).text
+            if "root" not in shell or "Privacy Policy of site 2" not in rendered or len(large) < len(rendered) * 5:
+                logger.error("JS shell, rendered or large pages are wrong.")
+                return False
+            if requests.get(f"{server.base_url}/site/1/unknown", timeout=10).status_code != 404:
+                logger.error("Unknown page kinds are served.")
+                return False
+
+        # Test 3: a small benchmark checks every site on each run and reports the stages
+        results = run_suite(sites=8, runs=2, concurrency=4, hosts=2, latency_ms=0, jitter_ms=0, change_rate=1.0)
+        first, second = results["runs"]
+        if first["stats"].get("new") != 8 or second["stats"].get("changed") != 8 or results["emails"] < 1:
+            logger.error(f"Unexpected run results: {first['stats']}, {second['stats']}, {results['emails']} emails.")
+            return False
+        if not first["sites_per_second"] or "http" not in first["stages"] or "p95_ms" not in first["stages"]["http"]:
+            logger.error(f"Stage results are missing: {first}.")
+            return False
+        if not results["peak_rss_mb"] or not results["db_size_mb"]:
+            logger.error("Memory or database size is missing.")
+            return False
+    except Exception as e:
+        logger.error(f"Benchmark suite test failed: {e}.")
+        return False
+
+    logger.info("All benchmark suite tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_bench_suite() else 1)
@@ -0,0 +1,151 @@
+import sys
+from collections import Counter
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError # type: ignore
+import config # type: ignore
+from browser_handler import load_page_content, should_block_request, get_load_stats, record_load_stats
+import test_support # Uses the test database
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# (resource type, url, size) of the requests the fake page makes while loading
+PAGE_REQUESTS = [
+    ("document", "https://shop.example/privacy", 40000),
+    ("stylesheet", "https://shop.example/site.css", 10000),
+    ("script", "https://shop.example/app.js", 120000),
+    ("image", "https://shop.example/hero.jpg", 800000),
+    ("font", "https://fonts.example/inter.woff2", 90000),
+    ("script", "https://www.googletagmanager.com/gtm.js", 100000),
+    ("xhr", "https://stats.g.doubleclick.net/collect", 500),
+]
+
+class FakeRequest:
+    def __init__(self, resource_type, url):
+        self.resource_type = resource_type
+        self.url = url
+
+class FakeRoute:
+    def __init__(self, page, resource_type, url, size):
+        self.page = page
+        self.request = FakeRequest(resource_type, url)
+        self.size = size
+
+    def abort(self):
+        self.page.aborted.append(self.request.url)
+
+    def continue_(self):
+        self.page.respond(self.size)
+
+class FakeResponse:
+    def __init__(self, size):
+        self.headers = {"content-length": str(size)}
+
+class FakePage:
+    """Records how the page was loaded and replays PAGE_REQUESTS through the route and response handlers"""
+    url = "https://shop.example/privacy"
+
+    def __init__(self, idle_timeout=False):
+        self.idle_timeout = idle_timeout
+        self.route_handler = None
+        self.response_handlers = []
+        self.goto_calls = []
+        self.selectors = []
+        self.aborted = []
+
+    def route(self, pattern, handler):
+        self.route_handler = handler
+
+    def on(self, event, handler):
+        if event == "response":
+            self.response_handlers.append(handler)
+
+    def respond(self, size):
+        for handler in self.response_handlers:
+            handler(FakeResponse(size))
+
+    def goto(self, url, wait_until=None, timeout=None):
+        self.goto_calls.append((url, wait_until, timeout))
+        for resource_type, request_url, size in PAGE_REQUESTS:
+            if self.route_handler:
+                self.route_handler(FakeRoute(self, resource_type, request_url, size))
+            else:
+                self.respond(size)
+        if self.idle_timeout:
+            raise PlaywrightTimeoutError("Timeout exceeded waiting for networkidle")
+
+    def wait_for_selector(self, selector, timeout=None):
+        self.selectors.append((selector, timeout))
+
+    def evaluate(self, script, arg=None):
+        return -1 # no cookie banner
+
+    def content(self):
+        return "<html><body><p>Privacy policy</p></body></html>"
+
+def test_browser_lean():
+    """Test request blocking, wait conditions and load stats of the lean browser mode"""
+    logger.info("Starting lean browser mode tests...")
+    original = (config.BROWSER_LEAN, config.BROWSER_WAIT_UNTIL, config.BROWSER_WAIT_FOR_SELECTOR)
+
+    try:
+        # Test 1: blocking by resource type and by tracker domain (including subdomains)
+        cases = [
+            ("image", "https://shop.example/a.png", True),
+            ("script", "https://www.google-analytics.com/analytics.js", True),
+            ("script", "https://shop.example/app.js", False),
+            ("document", "https://notdoubleclick.net/", False),
+        ]
+        for resource_type, url, expected in cases:
+            if should_block_request(resource_type, url) != expected:
+                logger.error(f"should_block_request({resource_type}, {url}) should be {expected}.")
+                return False
+
+        # Test 2: lean mode aborts unneeded requests, waits for DOMContentLoaded and the selector
+        config.BROWSER_LEAN = True
+        config.BROWSER_WAIT_UNTIL = "domcontentloaded"
+        config.BROWSER_WAIT_FOR_SELECTOR = "main"
+        page = FakePage()
+        lean_stats = Counter()
+        html = load_page_content(page, "https://shop.example/privacy", lean_stats)
+        if "Privacy policy" not in html or lean_stats["blocked"] != 4 or lean_stats["responses"] != 3:
+            logger.error(f"Lean mode blocked the wrong requests: {dict(lean_stats)}.")
+            return False
+        if page.goto_calls[0][1:] != ("domcontentloaded", config.BROWSER_NAVIGATION_TIMEOUT_SECONDS * 1000) \
+                or page.selectors[0][0] != "main":
+            logger.error(f"Page was not loaded with the configured waits: {page.goto_calls}, {page.selectors}.")
+            return False
+
+        # Test 3: without lean mode every request goes through, and the stats show the difference
+        config.BROWSER_LEAN = False
+        config.BROWSER_WAIT_FOR_SELECTOR = None
+        full_stats = Counter()
+        load_page_content(FakePage(), "https://shop.example/privacy", full_stats)
+        if full_stats["blocked"] or full_stats["bytes"] <= lean_stats["bytes"] * 5:
+            logger.error(f"Unexpected full load stats: {dict(full_stats)} vs {dict(lean_stats)}.")
+            return False
+
+        # Test 4: a page that never reaches network idle still gives its content
+        config.BROWSER_WAIT_UNTIL = "networkidle"
+        if "Privacy policy" not in load_page_content(FakePage(idle_timeout=True), "https://shop.example/privacy"):
+            logger.error("Network idle timeout lost the page.")
+            return False
+
+        # Test 5: per page stats are added to the totals
+        get_load_stats(reset=True)
+        record_load_stats("https://shop.example/privacy", lean_stats)
+        record_load_stats("https://shop.example/privacy", full_stats)
+        totals = get_load_stats(reset=True)
+        if totals["pages"] != 2 or totals["bytes"] != lean_stats["bytes"] + full_stats["bytes"]:
+            logger.error(f"Load totals are wrong: {dict(totals)}.")
+            return False
+    except Exception as e:
+        logger.error(f"Lean browser mode test failed: {e}.")
+        return False
+    finally:
+        config.BROWSER_LEAN, config.BROWSER_WAIT_UNTIL, config.BROWSER_WAIT_FOR_SELECTOR = original
+
+    logger.info("All lean browser mode tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_browser_lean() else 1)
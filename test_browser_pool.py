@@ -0,0 +1,124 @@
+import sys
+import threading
+from browser_pool import BrowserPool
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    def new_page(self):
+        return FakePage(self)
+
+    def close(self):
+        self.closed = True
+
+class FakeBrowser:
+    def __init__(self):
+        self.closed = False
+
+    def new_context(self):
+        return FakeContext()
+
+    def is_connected(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+class FakePlaywright:
+    def stop(self):
+        pass
+
+class FakeBrowserPool(BrowserPool):
+    """Browser pool that hands out fake pages instead of launching Chromium"""
+    memory_mb = 0
+
+    def _launch(self):
+        self._count("launches")
+        return FakePlaywright(), FakeBrowser()
+
+    def _browser_memory_mb(self, browser):
+        return self.memory_mb
+
+def test_browser_pool():
+    """Test that pooled browsers are reused, every job gets its own context and browsers are relaunched"""
+    logger.info("Starting browser pool tests...")
+
+    # Test 1: every job gets a new context, closed with its page afterwards
+    pool = FakeBrowserPool(workers=2, pages_per_browser=100)
+    try:
+        pages = [pool.submit(lambda page: page) for _ in range(12)]
+        pages = [future.result(5) for future in pages]
+        if pool.stats["launches"] > 2 or pool.stats["pages"] != 12:
+            logger.error(f"Browsers were not reused: {pool.stats}.")
+            return False
+        if len({id(page.context) for page in pages}) != 12 or pool.stats["contexts"] != 12:
+            logger.error(f"Contexts were shared between jobs: {pool.stats}.")
+            return False
+        if not all(page.closed and page.context.closed for page in pages):
+            logger.error("Pages or contexts were not closed after their job.")
+            return False
+        logger.info(f"Pool reused browsers: {pool.stats}.")
+    finally:
+        pool.shutdown()
+
+    # Test 2: a browser is relaunched after N pages
+    pool = FakeBrowserPool(workers=1, pages_per_browser=3)
+    try:
+        for _ in range(7):
+            pool.run(lambda page: None, timeout=5)
+        if pool.stats["recycled"] != 2 or pool.stats["launches"] != 3:
+            logger.error(f"Browser not relaunched after 3 pages: {pool.stats}.")
+            return False
+    finally:
+        pool.shutdown()
+
+    # Test 3: a browser is relaunched when its processes go over the memory limit
+    pool = FakeBrowserPool(workers=1, pages_per_browser=100, memory_limit_mb=1)
+    pool.memory_mb = 2
+    try:
+        pool.run(lambda page: None, timeout=5)
+        pool.run(lambda page: None, timeout=5)
+        if pool.stats["recycled"] != 2 or pool.stats["launches"] != 2:
+            logger.error(f"Browser not relaunched on memory limit: {pool.stats}.")
+            return False
+    finally:
+        pool.shutdown()
+
+    # Test 4: a failing job is reported to the caller and the pool keeps working
+    pool = FakeBrowserPool(workers=1)
+    try:
+        def broken(page):
+            raise ValueError("page failed")
+        try:
+            pool.run(broken, timeout=5)
+            logger.error("Job error was not raised to the caller.")
+            return False
+        except ValueError:
+            pass
+        if pool.run(lambda page: "ok", timeout=5) != "ok":
+            logger.error("Pool stopped working after a failed job.")
+            return False
+    finally:
+        pool.shutdown()
+
+    if any(thread.name.startswith("browser-") for thread in threading.enumerate()):
+        logger.error("Browser worker threads still running after shutdown.")
+        return False
+
+    logger.info("All browser pool tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_browser_pool() else 1)
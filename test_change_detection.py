@@ -0,0 +1,101 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import monitor
+from repository import SiteRepository
+from database import add_site, get_db_connection
+from fingerprint import content_fingerprint
+from test_support import fresh_test_db, stored_alerts
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def make_policy(retention_days, spacing=" "):
+    paragraphs = "".join(
+        f"<p>Section{spacing}{i}. We collect information about visits to this service.</p>" for i in range(40)
+    )
+    return f"<html><body><h1>Privacy Policy</h1>{paragraphs}<p>We keep logs for {retention_days} days.</p></body></html>"
+
+class PolicyHandler(BaseHTTPRequestHandler):
+    """Serves whatever policy the test currently wants to publish"""
+    html = make_policy(30)
+
+    def do_GET(self):
+        body = self.html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_change_detection():
+    """Test fingerprint based change detection and lazy loading of the old text"""
+    logger.info("Starting change detection tests...")
+
+    fresh_test_db()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PolicyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/privacy"
+
+    # Keep alerts in the outbox instead of sending email, and count content loads
+    loads = []
+    original_deliver_alerts = monitor.deliver_alerts
+    original_get_site_content = SiteRepository.get_site_content
+    monitor.deliver_alerts = lambda: None
+    def counting_get_site_content(repo, site_id):
+        loads.append(site_id)
+        return original_get_site_content(repo, site_id)
+    SiteRepository.get_site_content = counting_get_site_content
+
+    try:
+        add_site(url, "Change Detection Site")
+
+        # Test 1: first check stores the text and its fingerprint
+        monitor.check_all_sites(concurrency=1)
+        conn = get_db_connection()
+        row = conn.execute("SELECT last_content, content_hash FROM monitored_sites WHERE url = ?", (url,)).fetchone()
+        conn.close()
+        if row["content_hash"] != content_fingerprint(row["last_content"]):
+            logger.error("Stored fingerprint does not match the stored text.")
+            return False
+
+        # Test 2: whitespace-only changes are not reported and the old text is not loaded
+        PolicyHandler.html = make_policy(30, spacing="\n   ")
+        stats = monitor.check_all_sites(concurrency=1)
+        if stats["unchanged"] != 1 or stored_alerts() or loads:
+            logger.error(f"Whitespace change was treated as a change: {dict(stats)}, loads={loads}.")
+            return False
+
+        # Test 3: a real change loads the old text once, alerts and stores the new version
+        PolicyHandler.html = make_policy(90)
+        stats = monitor.check_all_sites(concurrency=1)
+        alerts = stored_alerts()
+        if stats["changed"] != 1 or len(alerts) != 1 or len(loads) != 1:
+            logger.error(f"Change was not detected: {dict(stats)}.")
+            return False
+        if "90 days" not in alerts[0][1] or "30 days" not in alerts[0][1]:
+            logger.error("Alert diff does not show the changed text.")
+            return False
+        conn = get_db_connection()
+        row = conn.execute("SELECT last_content FROM monitored_sites WHERE url = ?", (url,)).fetchone()
+        conn.close()
+        if "90 days" not in row["last_content"]:
+            logger.error("New version was not stored after the change.")
+            return False
+    except Exception as e:
+        logger.error(f"Change detection test failed: {e}.")
+        return False
+    finally:
+        monitor.deliver_alerts = original_deliver_alerts
+        SiteRepository.get_site_content = original_get_site_content
+        server.shutdown()
+
+    logger.info("All change detection tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_change_detection() else 1)
@@ -0,0 +1,109 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import monitor
+from database import add_site, get_db_connection
+from monitor import check_all_sites
+from test_support import fresh_test_db, stored_alerts
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+POLICY_HTML = "<html><body><h1>Privacy Policy</h1>" + "".join(
+    f"<p>Section {i}. We collect information about visits to this service and keep it for {i} days.</p>"
+    for i in range(40)
+) + "</body></html>"
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """Serves one policy page and answers 304 when the ETag matches"""
+    etag = '"policy-v1"'
+    html = POLICY_HTML
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_conditional_fetch():
+    """Test that unchanged pages are skipped with a conditional request"""
+    logger.info("Starting conditional fetch tests...")
+
+    fresh_test_db()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ETagHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/privacy"
+    original_deliver = monitor.deliver_alerts
+    monitor.deliver_alerts = lambda: None # The alerts stay in the outbox
+
+    try:
+        add_site(url, "ETag Test Site")
+
+        # Test 1: first check stores the content and the ETag
+        stats = check_all_sites(concurrency=1)
+        conn = get_db_connection()
+        row = conn.execute("SELECT etag, content_length, last_checked FROM monitored_sites WHERE url = ?", (url,)).fetchone()
+        conn.close()
+        if stats["new"] != 1 or row["etag"] != ETagHandler.etag or not row["content_length"]:
+            logger.error(f"First check did not store the validators: {dict(row)}.")
+            return False
+        first_checked = row["last_checked"]
+
+        # Test 2: second check sends If-None-Match and is skipped on 304
+        stats = check_all_sites(concurrency=1)
+        conn = get_db_connection()
+        row = conn.execute("SELECT last_checked FROM monitored_sites WHERE url = ?", (url,)).fetchone()
+        conn.close()
+        if ETagHandler.requests_seen[-1] != ETagHandler.etag:
+            logger.error("Second check did not send If-None-Match.")
+            return False
+        if stats["not_modified"] != 1 or stats["failed"] != 0:
+            logger.error(f"304 response was not counted as skipped: {dict(stats)}.")
+            return False
+        if row["last_checked"] == first_checked:
+            logger.error("last_checked was not updated after a 304.")
+            return False
+
+        # Test 3: a site stored with an older text extraction is fetched without
+        # validators and re-baselined while the page is still unchanged
+        conn = get_db_connection()
+        conn.execute("UPDATE monitored_sites SET extraction_version = 1 WHERE url = ?", (url,))
+        conn.commit()
+        conn.close()
+        stats = check_all_sites(concurrency=1)
+        if ETagHandler.requests_seen[-1] is not None or stats["rebaselined"] != 1:
+            logger.error(f"Old extraction was answered with a 304 instead of re-baselined: {dict(stats)}.")
+            return False
+
+        # Test 4: so the next real change of the policy is alerted
+        ETagHandler.html = POLICY_HTML.replace("Section 3.", "Section 3. We now sell your data.")
+        ETagHandler.etag = '"policy-v2"'
+        stats = check_all_sites(concurrency=1)
+        if stats["changed"] != 1 or [alert_url for alert_url, body in stored_alerts()] != [url]:
+            logger.error(f"Change after the re-baseline was not alerted: {dict(stats)}.")
+            return False
+    except Exception as e:
+        logger.error(f"Conditional fetch test failed: {e}.")
+        return False
+    finally:
+        monitor.deliver_alerts = original_deliver
+        server.shutdown()
+
+    logger.info("All conditional fetch tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_conditional_fetch() else 1)
@@ -0,0 +1,101 @@
+import sys
+import config # type: ignore
+from cookie_banner import CookieBannerCache, dismiss_cookie_banner, parse_selector
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class FakeBannerPage:
+    """A page whose visible banner buttons are given as (css, text) pairs"""
+    def __init__(self, url, buttons=()):
+        self.url = url
+        self.buttons = set(buttons)
+        self.evaluations = []
+        self.clicks = []
+
+    def evaluate(self, script, candidates):
+        self.evaluations.append(candidates)
+        for index, (css, text) in enumerate(candidates):
+            if (css, text) in self.buttons:
+                return index
+        return -1
+
+    def click(self, selector, timeout=None):
+        self.clicks.append(selector)
+
+    def wait_for_timeout(self, ms):
+        pass
+
+def test_cookie_banner():
+    """Test batched cookie banner detection and the per-domain selector cache"""
+    logger.info("Starting cookie banner tests...")
+
+    fresh_test_db()
+    original_custom = config.BROWSER_COOKIE_SELECTORS_BY_DOMAIN
+    cache = restarted = None
+
+    try:
+        # Test 1: Playwright text selectors are split for the in-page check
+        if parse_selector('button:has-text("Accept all")') != ("button", "accept all") \
+                or parse_selector("#cookie-accept") != ("#cookie-accept", None):
+            logger.error("Selectors are not parsed correctly.")
+            return False
+
+        # Test 2: one evaluation checks every candidate and the visible match is clicked
+        cache = CookieBannerCache()
+        page = FakeBannerPage("https://shop.example/privacy", [("#consent-accept", None)])
+        if dismiss_cookie_banner(page, cache) != "#consent-accept" or len(page.evaluations) != 1:
+            logger.error(f"Banner was not dismissed with one evaluation: {page.evaluations}.")
+            return False
+        if page.clicks != ["#consent-accept >> visible=true"]:
+            logger.error(f"Wrong element clicked: {page.clicks}.")
+            return False
+
+        # Test 3: the selector that worked is tried first next time, also after a restart
+        cache.close()
+        restarted = CookieBannerCache()
+        page = FakeBannerPage("https://shop.example/terms", [("#consent-accept", None)])
+        dismiss_cookie_banner(page, restarted)
+        if page.evaluations[0][0] != ["#consent-accept", None]:
+            logger.error("Cached selector was not tried first.")
+            return False
+
+        # Test 4: a page without the banner (consent already given) keeps the selector that worked
+        page = FakeBannerPage("https://shop.example/cookies")
+        if dismiss_cookie_banner(page, cache) is not None or cache.get("shop.example")[0] != "#consent-accept":
+            logger.error(f"A missing banner replaced the working selector: {cache.get('shop.example')}.")
+            return False
+        page = FakeBannerPage("https://shop.example/privacy", [("#consent-accept", None)])
+        if dismiss_cookie_banner(page, cache) != "#consent-accept" or len(page.evaluations) != 1:
+            logger.error("Banner of a known domain was not dismissed after a page without it.")
+            return False
+
+        # Test 5: a domain without a banner is not checked again until the entry expires
+        page = FakeBannerPage("https://plain.example/privacy")
+        dismiss_cookie_banner(page, cache)
+        dismiss_cookie_banner(page, cache)
+        if len(page.evaluations) != 1 or page.clicks:
+            logger.error(f"Domain without a banner was checked {len(page.evaluations)} times.")
+            return False
+
+        # Test 6: custom selectors for a domain come before the generic list
+        config.BROWSER_COOKIE_SELECTORS_BY_DOMAIN = {"custom.example": ["#my-cmp-ok"]}
+        page = FakeBannerPage("https://www.custom.example/privacy", [("#my-cmp-ok", None), ("button", "accept")])
+        if dismiss_cookie_banner(page, cache) != "#my-cmp-ok":
+            logger.error("Custom selector was not used.")
+            return False
+    except Exception as e:
+        logger.error(f"Cookie banner test failed: {e}.")
+        return False
+    finally:
+        config.BROWSER_COOKIE_SELECTORS_BY_DOMAIN = original_custom
+        for opened in (cache, restarted):
+            if opened is not None:
+                opened.close()
+
+    logger.info("All cookie banner tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_cookie_banner() else 1)
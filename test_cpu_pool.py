@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import config # type: ignore
+import cpu_pool
+import monitor
+from bench_extraction import generate_policy_page
+from database import add_sites
+from fingerprint import content_fingerprint
+from fixture_server import FixtureServer, STATIC
+from text_extraction import extract_text
+from test_support import fresh_test_db, stored_alerts
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_cpu_pool():
+    """Test extraction and diffing in the process pool"""
+    logger.info("Starting process pool tests...")
+
+    fresh_test_db()
+
+    original = (config.PROCESS_WORKERS, config.PROCESS_MIN_OFFLOAD_BYTES, config.CONCURRENCY)
+    original_deliver_alerts = monitor.deliver_alerts
+    monitor.deliver_alerts = lambda: None # The alerts stay in the outbox
+    html = generate_policy_page(30)
+    text = extract_text(html)
+
+    try:
+        # Test 1: without workers the page is processed in this process, and the
+        # text is left out when its fingerprint is the known one
+        config.PROCESS_WORKERS = 0
+        page = cpu_pool.run_cpu(cpu_pool.process_page, html, "html", "https://example.com")
+        if page.text != text or page.fingerprint != content_fingerprint(text) or page.needs_browser:
+            logger.error(f"Inline processing gave a different result: {page.fingerprint}, {page.needs_browser}.")
+            return False
+        page = cpu_pool.process_page(html, "html", "https://example.com", known_hash=content_fingerprint(text))
+        if page.text is not None or page.fingerprint != content_fingerprint(text):
+            logger.error("The text of an unchanged page was returned.")
+            return False
+        if not cpu_pool.process_page("<p>Accept all cookies</p>", "html", "https://example.com").needs_browser:
+            logger.error("A cookie wall was not classified for the browser.")
+            return False
+
+        # Test 2: with workers the work runs in another process and gives the same result
+        config.PROCESS_WORKERS = 2
+        config.PROCESS_MIN_OFFLOAD_BYTES = 0
+        if cpu_pool.run_cpu(os.getpid) == os.getpid():
+            logger.error("run_cpu did not use a worker process.")
+            return False
+        page = cpu_pool.run_cpu(cpu_pool.process_page, html, "html", "https://example.com")
+        if page.text != text or page.needs_browser:
+            logger.error("The worker extracted a different text.")
+            return False
+
+        # Test 3: small inputs stay in this process
+        config.PROCESS_MIN_OFFLOAD_BYTES = 1024
+        if cpu_pool.run_cpu(os.getpid, size=100) != os.getpid():
+            logger.error("A small input was sent to a worker process.")
+            return False
+        config.PROCESS_MIN_OFFLOAD_BYTES = 0
+
+        # Test 4: a dead worker does not fail the check, a new pool is started
+        pool = cpu_pool.get_cpu_pool()
+        for process in list(pool._processes.values()):
+            process.kill()
+        time.sleep(0.5)
+        page = cpu_pool.run_cpu(cpu_pool.process_page, html, "html", "https://example.com")
+        if page.text != text or cpu_pool.get_cpu_pool() is pool:
+            logger.error("The pool was not replaced after a worker died.")
+            return False
+
+        # Test 5: a concurrent check run stores, skips and diffs the pages through the pool
+        with FixtureServer(sections=20) as server:
+            add_sites([(server.url(i, STATIC), f"Site {i}") for i in range(6)])
+            first = monitor.check_all_sites(concurrency=4)
+            server.versions[2] = 1
+            second = monitor.check_all_sites(concurrency=4)
+        if first["new"] != 6 or second["changed"] != 1 or second["unchanged"] + second["not_modified"] != 5:
+            logger.error(f"Unexpected run results: {dict(first)}, {dict(second)}.")
+            return False
+        alerts = stored_alerts()
+        if len(alerts) != 1 or "/site/2/" not in alerts[0][0] or "Policy version 1" not in alerts[0][1]:
+            logger.error(f"The change was not diffed: {alerts}.")
+            return False
+        if cpu_pool._pool is not None:
+            logger.error("check_all_sites did not stop the worker processes.")
+            return False
+    except Exception as e:
+        logger.error(f"Process pool test failed: {e}.")
+        return False
+    finally:
+        config.PROCESS_WORKERS, config.PROCESS_MIN_OFFLOAD_BYTES, config.CONCURRENCY = original
+        monitor.deliver_alerts = original_deliver_alerts
+        cpu_pool.shutdown_cpu_pool()
+
+    logger.info("All process pool tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_cpu_pool() else 1)
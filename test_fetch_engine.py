@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+import monitor
+from database import add_site
+from fetch_engine import run_fetch_engine
+from repository import SiteRepository
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_fetch_engine():
+    """Test the concurrent fetch engine limits and result streaming"""
+    logger.info("Starting fetch engine tests...")
+
+    # Six sites on one slow host and six on other hosts
+    sites = [(i, f"https://slow.example.com/privacy/{i}") for i in range(6)]
+    sites += [(i + 6, f"https://site{i}.example.org/privacy") for i in range(6)]
+
+    lock = threading.Lock()
+    running = {"total": 0, "slow": 0, "max_total": 0, "max_slow": 0}
+    results = []
+
+    def fake_fetch(site):
+        slow = "slow.example.com" in site[1]
+        with lock:
+            running["total"] += 1
+            running["max_total"] = max(running["max_total"], running["total"])
+            if slow:
+                running["slow"] += 1
+                running["max_slow"] = max(running["max_slow"], running["slow"])
+        time.sleep(0.2 if slow else 0.05)
+        with lock:
+            running["total"] -= 1
+            if slow:
+                running["slow"] -= 1
+        if site[0] == 3:
+            raise RuntimeError("simulated failure")
+        return f"text for {site[1]}"
+
+    def on_result(site, text):
+        results.append((site[0], text, time.monotonic()))
+
+    # Test 1: limits are respected and every site is processed
+    try:
+        start = time.monotonic()
+        processed = run_fetch_engine(sites, fake_fetch, on_result, concurrency=4, per_host_concurrency=2)
+        elapsed = time.monotonic() - start
+
+        if processed != len(sites) or len(results) != len(sites):
+            logger.error(f"Expected {len(sites)} results, got {len(results)}.")
+            return False
+        if running["max_total"] > 4 or running["max_slow"] > 2:
+            logger.error(f"Concurrency limits exceeded: {running}.")
+            return False
+        logger.info(f"Fetched {processed} sites in {elapsed:.2f}s within the limits.")
+    except Exception as e:
+        logger.error(f"Fetch engine run failed: {e}.")
+        return False
+
+    # Test 2: a failing fetch is reported as None instead of stopping the run
+    failed = [text for site_id, text, _ in results if site_id == 3]
+    if failed != [None]:
+        logger.error("Failed fetch was not reported as None.")
+        return False
+
+    # Test 3: fast hosts are processed before the slow host finishes
+    finish_times = {site_id: finished for site_id, _, finished in results}
+    last_fast = max(finish_times[i] for i in range(6, 12))
+    last_slow = max(finish_times[i] for i in range(6))
+    if last_fast >= last_slow:
+        logger.error("Results were not processed as they arrived.")
+        return False
+
+    # Test 4: an unexpected error fails only its site, one after another as well as concurrently
+    fresh_test_db()
+    for i in range(3):
+        add_site(f"https://site{i}.example.org/privacy", f"Site {i}")
+    def failing_fetch(site, repo=None, resolver=None):
+        if site[1].startswith("https://site1."):
+            raise RuntimeError("simulated failure")
+        return monitor.FetchResult(f"Policy of {site[1]}")
+    original_fetch = monitor.fetch_site_text
+    monitor.fetch_site_text = failing_fetch
+    try:
+        for concurrency in (1, 3):
+            with SiteRepository() as repo:
+                stats = monitor.check_sites(repo.get_all_sites(), repo, concurrency=concurrency)
+            if stats["checked"] != 3 or stats["failed"] != 1:
+                logger.error(f"Error stopped the run with concurrency {concurrency}: {dict(stats)}.")
+                return False
+    except Exception as e:
+        logger.error(f"Error was not caught by the run: {e}.")
+        return False
+    finally:
+        monitor.fetch_site_text = original_fetch
+
+    logger.info("All fetch engine tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_fetch_engine() else 1)
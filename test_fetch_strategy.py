@@ -0,0 +1,168 @@
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config # type: ignore
+import monitor
+from database import add_site, get_db_connection
+from fetch_strategy import FetchStrategyResolver, REQUESTS, PROBE, BROWSER
+from repository import SiteRepository
+from text_extraction import extract_text
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+POLICY = "<html><body><h1>Privacy Policy</h1>" + "".join(
+    f"<p>Section {i}. We collect information about visits to this service.</p>" for i in range(40)
+) + "</body></html>"
+COOKIE_WALL = "<html><body><p>Please accept all cookies to continue.</p></body></html>"
+
+class WallHandler(BaseHTTPRequestHandler):
+    """Serves a cookie wall or the policy, counting the requests (304 to any conditional request)"""
+    html = COOKIE_WALL
+    hits = 0
+
+    def do_GET(self):
+        WallHandler.hits += 1
+        if self.path.endswith("/forbidden"):
+            self.send_error(403)
+            return
+        if self.headers.get("If-None-Match"):
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def site_state(url):
+    conn = get_db_connection()
+    try:
+        return conn.execute(
+            "SELECT id, requires_browser, browser_probe_failures, last_probe FROM monitored_sites WHERE url = ?", (url,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+def test_fetch_strategy():
+    """Test the learned requests/browser strategy and its decaying re-probe"""
+    logger.info("Starting fetch strategy tests...")
+
+    fresh_test_db()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WallHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/privacy"
+
+    # The browser always gets past the cookie wall
+    browser_calls = []
+    original_browser = monitor.get_page_text_with_browser
+    def fake_browser(page_url):
+        browser_calls.append(page_url)
+        return extract_text(POLICY)
+    monitor.get_page_text_with_browser = fake_browser
+
+    try:
+        add_site(url, "Cookie Wall Site")
+
+        # Test 1: a cookie wall falls back to the browser and marks the site
+        monitor.check_all_sites(concurrency=1)
+        state = site_state(url)
+        if len(browser_calls) != 1 or not state["requires_browser"] or state["last_probe"] is None:
+            logger.error(f"Site was not moved to the browser: {dict(state)}, {len(browser_calls)} browser calls.")
+            return False
+
+        # Test 2: the next run goes straight to the browser without a requests fetch
+        hits = WallHandler.hits
+        monitor.check_all_sites(concurrency=1)
+        if WallHandler.hits != hits or len(browser_calls) != 2:
+            logger.error("Browser site was fetched with requests again before its probe was due.")
+            return False
+
+        # Test 3: a due probe fetches the page without the old validators and records its result
+        conn = get_db_connection()
+        conn.execute("UPDATE monitored_sites SET etag = '\"old\"', last_probe = ? WHERE url = ?",
+                     ((datetime.utcnow() - timedelta(days=8)).isoformat(), url))
+        conn.commit()
+        conn.close()
+        monitor.check_all_sites(concurrency=1)
+        state = site_state(url)
+        if state["browser_probe_failures"] != 1 or datetime.fromisoformat(state["last_probe"]) < datetime.utcnow() - timedelta(hours=1):
+            logger.error(f"Probe was answered with a 304 or not recorded: {dict(state)}.")
+            return False
+
+        # Test 4: a due probe that gets the same text moves the site back to requests
+        WallHandler.html = POLICY # After the failed probe the wait doubled to 14 days
+        conn = get_db_connection()
+        conn.execute("UPDATE monitored_sites SET last_probe = ? WHERE url = ?",
+                     ((datetime.utcnow() - timedelta(days=15)).isoformat(), url))
+        conn.commit()
+        conn.close()
+        stats = monitor.check_all_sites(concurrency=1)
+        state = site_state(url)
+        if state["requires_browser"] or len(browser_calls) != 3 or stats["changed"]:
+            logger.error(f"Probe did not move the site back to requests: {dict(state)}, {dict(stats)}.")
+            return False
+
+        # Test 5: the wait between probes doubles after each failure, up to the maximum
+        now = datetime(2030, 1, 1)
+        with SiteRepository() as repo:
+            resolver = FetchStrategyResolver(repo, use_browser_for=[], clock=lambda: now)
+            resolver._probe_state = {
+                1: (2, (now - timedelta(hours=config.BROWSER_PROBE_HOURS * 3)).isoformat()), # waits 4x
+                2: (2, (now - timedelta(hours=config.BROWSER_PROBE_HOURS * 5)).isoformat()),
+                3: (30, (now - timedelta(days=config.BROWSER_PROBE_MAX_DAYS + 1)).isoformat()),
+            }
+            if resolver.choose(1, url, True) != BROWSER or resolver.choose(2, url, True) != PROBE \
+                    or resolver.choose(3, url, True) != PROBE:
+                logger.error("Probe schedule does not back off as expected.")
+                return False
+
+        # Test 6: configured domains and domains where most sites need the browser
+        for i in range(3):
+            add_site(f"https://js.example.net/policy{i}", f"JS Site {i}")
+        conn = get_db_connection()
+        conn.execute("UPDATE monitored_sites SET content_hash = 'x', requires_browser = 1 WHERE url LIKE '%js.example.net%'")
+        conn.commit()
+        conn.close()
+        with SiteRepository() as repo:
+            resolver = FetchStrategyResolver(repo, use_browser_for=["example.org"])
+        if resolver.choose(100, "https://js.example.net/new", False, is_new=True) != BROWSER:
+            logger.error("New site on a browser domain did not start with the browser.")
+            return False
+        if resolver.choose(101, "https://www.example.org/privacy", False) != BROWSER \
+                or resolver.choose(102, "https://plain.example.com/privacy", False, is_new=True) != REQUESTS:
+            logger.error("use_browser_for domains are not honored.")
+            return False
+
+        # Test 7: a page requests is refused (403) is tried with the browser, requests counts as failed
+        calls = len(browser_calls)
+        forbidden = url.replace("/privacy", "/forbidden")
+        with SiteRepository() as repo:
+            resolver = FetchStrategyResolver(repo, use_browser_for=[])
+            result = monitor.fetch_site_text((200, forbidden, "Forbidden", None, False, None, None, None), repo, resolver)
+        if result.text is None or browser_calls[calls:] != [forbidden]:
+            logger.error(f"Refused page did not fall back to the browser: {result}.")
+            return False
+        if resolver.stats["requests_ok"] or resolver.stats["browser_launches"] != 1:
+            logger.error(f"Refused requests fetch was counted as a success: {dict(resolver.stats)}.")
+            return False
+    except Exception as e:
+        logger.error(f"Fetch strategy test failed: {e}.")
+        return False
+    finally:
+        monitor.get_page_text_with_browser = original_browser
+        server.shutdown()
+
+    logger.info("All fetch strategy tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_fetch_strategy() else 1)
@@ -0,0 +1,122 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config # type: ignore
+import http_client
+import monitor
+from fixture_server import FixtureServer, STATIC
+from http_client import DNSCache, close_session, get_client_stats, get_session
+from metrics import run_metrics
+import test_support # Uses the test database
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class CookieHandler(BaseHTTPRequestHandler):
+    """Sets a cookie and echoes the Cookie header it got"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = (self.headers.get("Cookie") or "").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Set-Cookie", "consent=yes; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_http_client():
+    """Test the shared session: connection reuse, DNS cache and no kept cookies"""
+    logger.info("Starting HTTP client tests...")
+
+    server = FixtureServer().start()
+    cookie_server = ThreadingHTTPServer(("127.0.0.1", 0), CookieHandler)
+    cookie_server.daemon_threads = True
+    threading.Thread(target=cookie_server.serve_forever, daemon=True).start()
+    close_session()
+    get_client_stats(reset=True)
+
+    try:
+        # Test 1: the fetches of one host share a connection, a 304 included
+        url = server.url(1, STATIC).replace("127.0.0.1", "localhost")
+        for _ in range(3):
+            get_session().get(url, timeout=10).raise_for_status()
+        first = monitor.fetch_page(url)
+        again = monitor.fetch_page(url, etag=first.etag)
+        if first.text is None or not again.not_modified:
+            logger.error(f"Fetches through the session failed: {first}, {again}.")
+            return False
+        stats, hosts = get_client_stats()
+        if stats["requests"] != 5 or stats["connections"] != 1:
+            logger.error(f"Connections were not reused: {dict(stats)}.")
+            return False
+
+        # Test 2: a new connection to a known host skips the lookup, both are timed as the dns stage
+        close_session()
+        enabled, run_metrics.enabled = run_metrics.enabled, True
+        run_metrics.start_run()
+        try:
+            get_session().get(url, timeout=10).raise_for_status()
+        finally:
+            run_metrics.enabled = enabled
+        stats, hosts = get_client_stats(reset=True)
+        if stats["connections"] != 2 or stats["dns_lookups"] != 1 or stats["dns_hits"] != 1:
+            logger.error(f"DNS cache not used: {dict(stats)}.")
+            return False
+        if run_metrics.stages.get("dns", [0])[0] != 1:
+            logger.error(f"DNS time not in the run stages: {run_metrics.stages}.")
+            return False
+        if hosts["localhost"]["requests"] != 6:
+            logger.error(f"Requests not counted per host: {hosts}.")
+            return False
+        if get_client_stats()[0]["requests"]:
+            logger.error("Client stats not reset.")
+            return False
+
+        # Test 3: cookies set by a site are not sent back
+        cookie_url = f"http://127.0.0.1:{cookie_server.server_address[1]}/"
+        get_session().get(cookie_url, timeout=10)
+        echoed = get_session().get(cookie_url, timeout=10).text
+        if echoed or len(get_session().cookies):
+            logger.error(f"Cookies were kept between requests: {echoed!r}.")
+            return False
+
+        # Test 4: cached addresses expire and can be forgotten, TTL 0 disables the cache
+        now = [0.0]
+        cache = DNSCache(ttl_seconds=60, clock=lambda: now[0])
+        cache.remember("example.com", 443, "192.0.2.1")
+        if cache.get("example.com", 443) != "192.0.2.1" or cache.get("example.com", 80) is not None:
+            logger.error("Cached address not found.")
+            return False
+        now[0] = 61
+        if cache.get("example.com", 443) is not None:
+            logger.error("Cached address did not expire.")
+            return False
+        cache.remember("example.com", 443, "192.0.2.1")
+        cache.forget("example.com", 443)
+        disabled = DNSCache(ttl_seconds=0)
+        disabled.remember("example.com", 443, "192.0.2.1")
+        if cache.get("example.com", 443) is not None or disabled.get("example.com", 443) is not None:
+            logger.error("Address still cached.")
+            return False
+
+        # Test 5: the pools hold at least the per-host concurrency
+        if http_client.pool_per_host() < max(config.HTTP_POOL_PER_HOST, config.PER_HOST_CONCURRENCY):
+            logger.error(f"Pool too small: {http_client.pool_per_host()}.")
+            return False
+    except Exception as e:
+        logger.error(f"HTTP client test failed: {e}.")
+        return False
+    finally:
+        close_session()
+        server.stop()
+        cookie_server.shutdown()
+        cookie_server.server_close()
+
+    logger.info("All HTTP client tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_http_client() else 1)
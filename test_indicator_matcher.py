@@ -0,0 +1,70 @@
+import sys
+import config # type: ignore
+from indicator_matcher import IndicatorMatcher
+from link_discoverer import is_privacy_link
+from monitor import should_use_browser
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_indicator_matcher():
+    """Test the shared indicator matcher and the classifiers built on it"""
+    logger.info("Starting indicator matcher tests...")
+
+    try:
+        # Test 1: terms ignore case, patterns are regexes, every match is reported
+        matcher = IndicatorMatcher(["Privacy", "gdpr"], [r"opt.?out", r"do not sell"])
+        if matcher.search("Read our PRIVACY notice") != "privacy":
+            logger.error("Term was not found ignoring case.")
+            return False
+        if matcher.search("/legal/opt-out") != r"opt.?out" or matcher.search("/about", "About us") is not None:
+            logger.error("Pattern match is wrong.")
+            return False
+        found = matcher.find_all("/gdpr", "Do not sell or opt out")
+        if found != ["gdpr", r"opt.?out", r"do not sell"]:
+            logger.error(f"find_all returned {found}.")
+            return False
+        # Overlapping matches are all reported ("privacy" inside "your privacy choices")
+        found = IndicatorMatcher(patterns=[r"your privacy choices", r"privacy"]).find_all("Your Privacy Choices")
+        if found != [r"your privacy choices", r"privacy"]:
+            logger.error(f"find_all missed an overlapping match: {found}.")
+            return False
+        # Texts are searched separately, an indicator cannot span two of them
+        if IndicatorMatcher(["privacy policy"]).search("/privacy", "policy") is not None:
+            logger.error("Indicator matched across two texts.")
+            return False
+
+        # Test 2: the link classifier uses the configured indicators
+        links = [
+            ("/legal/privacy", "Legal", True),
+            ("/ccpa", "California", True),
+            ("/settings", "Your Privacy Choices", True),
+            ("/opt_out", "", True),
+            ("/products/123", "Shop now", False),
+        ]
+        for href, text, expected in links:
+            if is_privacy_link(href, text) != expected:
+                logger.error(f"is_privacy_link({href!r}, {text!r}) should be {expected}.")
+                return False
+
+        # Test 3: should_use_browser keeps its rules
+        long_policy = "We describe how we handle your personal information. " * 40
+        if should_use_browser(long_policy, "https://example.com"):
+            logger.error("A plain policy should not need the browser.")
+            return False
+        for content in [None, "short", long_policy + " Accept All", long_policy + " window.__STATE__"]:
+            if not should_use_browser(content, "https://example.com"):
+                logger.error(f"Browser was not chosen for {content[-20:] if content else content!r}.")
+                return False
+        if len(config.COOKIE_INDICATORS) + len(config.JS_INDICATORS) < 10:
+            logger.error("Default indicators are missing from the config.")
+            return False
+    except Exception as e:
+        logger.error(f"Indicator matcher test failed: {e}.")
+        return False
+
+    logger.info("All indicator matcher tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_indicator_matcher() else 1)
@@ -0,0 +1,145 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import link_discoverer
+from database import add_sites, get_db_connection
+from link_discoverer import PrivacyLinkCrawler, extract_links, has_links, normalize_url
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+PAGES = {
+    "/privacy": """<html><body>
+        <a href="/about">About us</a>
+        <a href="/privacy/cookies">Cookie policy</a>
+        <a href="/privacy/cookies#settings">Cookie settings</a>
+        <a href="/Privacy/../privacy/cookies?utm_source=footer">Cookies</a>
+        <a href="http://other.example/privacy">Partner privacy</a>
+        <a href="/private-area/privacy">Staff privacy notice</a>
+        <a href="/js-rendered/privacy">Rendered notice</a>
+        <a href="mailto:privacy@example.com">Email our privacy team</a>
+        </body></html>""",
+    "/privacy/cookies": """<html><body><a href="/privacy">Privacy</a>
+        <a href="/privacy/ccpa">Your California privacy rights</a></body></html>""",
+    "/privacy/ccpa": """<html><body><a href="/privacy">Privacy</a>
+        <a href="/privacy/ccpa/deep">Do not sell my info</a></body></html>""",
+    "/privacy/ccpa/deep": """<html><body><a href="/privacy">Privacy</a></body></html>""",
+    "/js-rendered/privacy": """<html><body><div id="app"></div></body></html>""",
+    "/about": """<html><body><a href="/privacy">Privacy</a></body></html>""",
+}
+
+ROBOTS = "User-agent: *\nDisallow: /private-area/\n"
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Serves PAGES and robots.txt, recording the paths requested"""
+    requested = []
+
+    def do_GET(self):
+        SiteHandler.requested.append(self.path)
+        if self.path == "/robots.txt":
+            body, content_type = ROBOTS, "text/plain"
+        elif self.path in PAGES:
+            body, content_type = PAGES[self.path], "text/html; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_link_discoverer():
+    """Test the privacy link crawl: depth, dedup, scope, robots.txt and the browser fallback"""
+    logger.info("Starting link discoverer tests...")
+
+    fresh_test_db()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # The "browser" renders the JS page into one with a privacy link
+    browser_calls = []
+    original_browser = link_discoverer.get_page_html
+    def fake_browser(url):
+        browser_calls.append(url)
+        return '<html><body><a href="/privacy/rendered">Rendered privacy choices</a></body></html>'
+    link_discoverer.get_page_html = fake_browser
+
+    try:
+        # Test 1: URLs are normalized so each page is fetched once
+        if normalize_url("HTTP://Example.COM:80/privacy?utm_source=x&b=2#top") != "http://example.com/privacy?b=2":
+            logger.error(f"Normalization failed: {normalize_url('HTTP://Example.COM:80/privacy?utm_source=x&b=2#top')}.")
+            return False
+
+        # Test 2: links are found however the tag is written, a malformed link does not hide the others
+        if not has_links('<a\nhref="/privacy">') or not has_links("<A\thref='/x'>") or has_links("<abbr>a</abbr>"):
+            logger.error("Link tags were not recognized.")
+            return False
+        links = extract_links('<a href="http://example.com:port/x">Bad</a><a href="/privacy">Privacy</a>',
+                              "https://example.com/")
+        if links != [("https://example.com/privacy", "Privacy")]:
+            logger.error(f"Malformed link was not skipped on its own: {links}.")
+            return False
+
+        # Test 3: privacy links are followed to max_depth, duplicates and other sites are skipped
+        crawler = PrivacyLinkCrawler(f"{base}/privacy", max_depth=2, concurrency=4)
+        links = dict(crawler.crawl())
+        expected = {f"{base}/privacy/cookies", f"{base}/privacy/ccpa", f"{base}/privacy/ccpa/deep",
+                    f"{base}/private-area/privacy", f"{base}/js-rendered/privacy", f"{base}/privacy/rendered"}
+        if set(links) != expected:
+            logger.error(f"Unexpected links: {sorted(links)}.")
+            return False
+        if SiteHandler.requested.count("/privacy/cookies") != 1 or "/about" in SiteHandler.requested:
+            logger.error(f"Pages were fetched more than once or non-privacy links followed: {SiteHandler.requested}.")
+            return False
+
+        # Test 4: depth 2 pages are reported but not fetched, robots.txt disallowed pages are not fetched
+        if "/privacy/ccpa/deep" in SiteHandler.requested or "/private-area/privacy" in SiteHandler.requested:
+            logger.error(f"Crawl went too deep or ignored robots.txt: {SiteHandler.requested}.")
+            return False
+        if SiteHandler.requested.count("/robots.txt") != 1 or crawler.stats["robots_blocked"] != 1:
+            logger.error(f"robots.txt was not cached or not honored: {crawler.stats}.")
+            return False
+
+        # Test 5: only the page without links went to the browser
+        if browser_calls != [f"{base}/js-rendered/privacy"]:
+            logger.error(f"Unexpected browser fallbacks: {browser_calls}.")
+            return False
+
+        # Test 6: max_pages limits the number of pages fetched
+        crawler = PrivacyLinkCrawler(f"{base}/privacy", max_depth=5, max_pages=2)
+        crawler.crawl()
+        if crawler.stats["pages"] + crawler.stats["robots_blocked"] > 2:
+            logger.error(f"Crawl fetched more than max_pages: {crawler.stats}.")
+            return False
+
+        # Test 7: discovered pages are added in one batch, existing ones are skipped
+        sites = [(url, f"Example - {text}") for url, text in sorted(links.items())]
+        if add_sites(sites) != len(sites) or add_sites(sites[:2]) != 0:
+            logger.error("Bulk insert did not add the new sites once.")
+            return False
+        conn = get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM monitored_sites").fetchone()[0]
+        conn.close()
+        if count != len(sites):
+            logger.error(f"Expected {len(sites)} monitored sites, found {count}.")
+            return False
+    except Exception as e:
+        logger.error(f"Link discoverer test failed: {e}.")
+        return False
+    finally:
+        link_discoverer.get_page_html = original_browser
+        server.shutdown()
+
+    logger.info("All link discoverer tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_link_discoverer() else 1)
@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import metrics
+import monitor
+from database import add_site, get_db_connection
+from metrics import RunMetrics, export_run, format_prometheus
+from repository import SiteRepository
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def policy(version):
+    return "<html><body><h1>Privacy Policy</h1>" + "".join(
+        f"<p>Section {i}. We keep information about visits for {version} days.</p>" for i in range(40)
+    ) + "</body></html>"
+
+class PolicyHandler(BaseHTTPRequestHandler):
+    """Serves a policy per path, the version can be changed between runs"""
+    versions = {}
+
+    def do_GET(self):
+        body = policy(PolicyHandler.versions.get(self.path, 30)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_metrics():
+    """Test the stage timers, the check_runs summaries and the Prometheus/JSON export"""
+    logger.info("Starting metrics tests...")
+
+    fresh_test_db()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PolicyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    export_dir = tempfile.mkdtemp()
+    original_deliver_alerts = monitor.deliver_alerts
+    monitor.deliver_alerts = lambda: None
+
+    try:
+        # Test 1: disabled metrics hand out one shared no-op timer and keep nothing
+        disabled = RunMetrics(enabled=False)
+        with disabled.timer("http"):
+            pass
+        disabled.record_site(1, "new", 0.1, 0.1)
+        if disabled.timer("http") is not disabled.timer("db") or disabled.stages or disabled.sites:
+            logger.error("Disabled metrics still time stages.")
+            return False
+
+        # Test 2: timers add up calls, total and longest time per stage
+        enabled = RunMetrics(enabled=True)
+        enabled.add_time("http", 0.5)
+        enabled.add_time("http", 1.5)
+        with enabled.timer("diff"):
+            pass
+        run = enabled.finish_run({"checked": 2})
+        if run["stages"]["http"] != {"calls": 2, "seconds": 2.0, "max_seconds": 1.5} or "diff" not in run["stages"]:
+            logger.error(f"Stage totals are wrong: {run['stages']}.")
+            return False
+
+        # Test 3: a run stores its summary, stage timings and per site outcomes
+        add_site(f"{base}/a", "Site A")
+        add_site(f"{base}/b", "Site B")
+        monitor.check_all_sites(concurrency=2)
+        PolicyHandler.versions["/b"] = 90
+        monitor.check_all_sites(concurrency=2)
+
+        conn = get_db_connection()
+        runs = metrics.load_runs(conn)
+        outcomes = dict(conn.execute(
+            "SELECT monitored_sites.url, outcome FROM check_run_sites "
+            "JOIN monitored_sites ON monitored_sites.id = site_id WHERE run_id = ?", (runs[0]["id"],)
+        ).fetchall())
+        conn.close()
+        if len(runs) != 2 or runs[1]["stats"]["new"] != 2 or runs[0]["stats"]["changed"] != 1:
+            logger.error(f"Run summaries are wrong: {runs}.")
+            return False
+        # (requests pages are fingerprinted in the extract stage, see cpu_pool.process_page)
+        missing = {"http", "download", "extract", "diff", "db"} - set(runs[0]["stages"])
+        if missing:
+            logger.error(f"Stages missing from the run: {missing}.")
+            return False
+        if outcomes != {f"{base}/a": "unchanged", f"{base}/b": "changed"}:
+            logger.error(f"Per site outcomes are wrong: {outcomes}.")
+            return False
+
+        # Test 4: Prometheus text and JSON exports of the latest run
+        text = format_prometheus(runs[0])
+        if 'privacy_monitor_run_sites{outcome="changed"} 1' not in text \
+                or 'privacy_monitor_stage_seconds{stage="http"}' not in text:
+            logger.error(f"Prometheus export is incomplete:\n{text}")
+            return False
+        export_run(runs[0], os.path.join(export_dir, "monitor.prom"))
+        export_run(runs[0], os.path.join(export_dir, "monitor.json"))
+        with open(os.path.join(export_dir, "monitor.json"), encoding="utf-8") as f:
+            if json.load(f)["stats"]["changed"] != 1:
+                logger.error("JSON export is wrong.")
+                return False
+        with redirect_stdout(io.StringIO()) as out:
+            metrics.main(["show", "--runs", "2"])
+        if f"{base}/b" not in out.getvalue():
+            logger.error(f"metrics.py show does not list the sites:\n{out.getvalue()}")
+            return False
+
+        # Test 5: only the last keep_runs runs are kept
+        with SiteRepository() as repo:
+            repo.record_check_run(RunMetrics(enabled=True).finish_run({"checked": 0}), keep_runs=1)
+        conn = get_db_connection()
+        counts = conn.execute("SELECT (SELECT COUNT(*) FROM check_runs), (SELECT COUNT(*) FROM check_run_sites)").fetchone()
+        conn.close()
+        if tuple(counts) != (1, 0):
+            logger.error(f"Old runs were not pruned: {tuple(counts)}.")
+            return False
+    except Exception as e:
+        logger.error(f"Metrics test failed: {e}.")
+        return False
+    finally:
+        monitor.deliver_alerts = original_deliver_alerts
+        server.shutdown()
+
+    logger.info("All metrics tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_metrics() else 1)
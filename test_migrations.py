@@ -0,0 +1,68 @@
+import sys
+from database import get_db_connection
+from migrations import MIGRATIONS, migrate, get_schema_version, pending_migrations
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_migrations():
+    """Test upgrading a database created by the original init_db"""
+    logger.info("Starting migration tests...")
+
+    fresh_test_db(init=False)
+
+    # A database as the first version of init_db created it, with one checked site
+    conn = get_db_connection()
+    conn.execute('''
+        CREATE TABLE monitored_sites (
+            id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL,
+            site_name TEXT,
+            last_checked TEXT,
+            last_content TEXT
+        )
+    ''')
+    conn.execute("INSERT INTO monitored_sites (url, site_name, last_content) VALUES (?, ?, ?)",
+                 ("https://example.com/privacy", "Legacy Site", "Old policy text"))
+    conn.commit()
+
+    try:
+        # Test 1: all migrations apply to the legacy database
+        version = migrate(conn)
+        if version != MIGRATIONS[-1][0] or pending_migrations(conn):
+            logger.error(f"Database is at version {version} after migrating.")
+            return False
+        columns = {column[1] for column in conn.execute("PRAGMA table_info(monitored_sites)")}
+        missing = {"requires_browser", "etag", "last_modified", "content_length", "content_hash"} - columns
+        if missing:
+            logger.error(f"Columns missing after migrating: {missing}.")
+            return False
+
+        # Test 2: existing data was carried over into the new columns and tables
+        row = conn.execute("SELECT content_hash FROM monitored_sites").fetchone()
+        versions = conn.execute("SELECT COUNT(*) FROM policy_versions").fetchone()[0]
+        if not row["content_hash"] or versions != 1:
+            logger.error("Existing policy was not fingerprinted and recorded as version 1.")
+            return False
+
+        # Test 3: running again is a no-op
+        applied = conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0]
+        migrate(conn)
+        if conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] != applied:
+            logger.error("Migrations were applied twice.")
+            return False
+        if get_schema_version(conn) != MIGRATIONS[-1][0]:
+            logger.error("Schema version changed on a second run.")
+            return False
+    except Exception as e:
+        logger.error(f"Migration test failed: {e}.")
+        return False
+    finally:
+        conn.close()
+
+    logger.info("All migration tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_migrations() else 1)
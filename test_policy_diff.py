@@ -0,0 +1,80 @@
+import difflib
+import sys
+import time
+from policy_diff import diff_policies
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def make_policy(sections=600):
+    """About 200 KB of policy text, one heading or paragraph per line"""
+    lines = []
+    for i in range(sections):
+        lines.append(f"{i + 1}. Section {i + 1}")
+        lines.append(
+            f"In section {i + 1} we describe how we collect, use and share the personal information "
+            f"you provide when you use our services, including account details, usage data and "
+            f"information from cookies and similar technologies set by us and our partners."
+        )
+        lines.append(f"You can contact us about section {i + 1} at privacy@example.com at any time.")
+    return "\n".join(lines)
+
+def test_policy_diff():
+    """Test the block level policy diff"""
+    logger.info("Starting policy diff tests...")
+    old_text = make_policy()
+    new_text = old_text.replace("In section 200 we describe how we collect,", "In section 200 we describe how we sell,")
+
+    try:
+        # Test 1: identical text (also after reflowing whitespace) has no changes
+        if diff_policies(old_text, old_text) or diff_policies(old_text, old_text.replace(" ", "  ")):
+            logger.error("Identical policies were reported as changed.")
+            return False
+
+        # Test 2: a one-word edit is one modified block with a word level diff
+        diff = diff_policies(old_text, new_text)
+        if diff.counts() != {"added": 0, "removed": 0, "modified": 1}:
+            logger.error(f"Unexpected counts for a one-word edit: {diff.counts()}.")
+            return False
+        if diff.modified[0].old_index != 598 or "[-collect,-] {+sell,+}" not in diff.summary():
+            logger.error(f"Word level diff is wrong: {diff.summary()}.")
+            return False
+
+        # Test 3: the text diff is the same unified diff difflib gives for the blocks
+        expected = "".join(difflib.unified_diff(
+            old_text.splitlines(keepends=True), new_text.splitlines(keepends=True),
+            fromfile="Previous Version", tofile="Current Version", n=3
+        ))
+        if diff.text.replace("\n", "") != expected.replace("\n", ""):
+            logger.error(f"Text diff differs from difflib:\n{diff.text}\n{expected}")
+            return False
+
+        # Test 4: added, removed and rewritten blocks
+        old_small = "Intro\nWe collect your email.\nWe keep data for 30 days.\nContact us."
+        new_small = "Intro\nWe keep data for 90 days.\nTotally different text about advertising.\nContact us.\nNew rights."
+        diff = diff_policies(old_small, new_small)
+        kinds = [change.kind for change in diff.changes]
+        if kinds.count("added") != 2 or kinds.count("removed") != 1 or kinds.count("modified") != 1:
+            logger.error(f"Unexpected changes: {diff.changes}.")
+            return False
+        if "-We collect your email." not in diff.text or "+New rights." not in diff.text:
+            logger.error(f"Text diff is missing changes:\n{diff.text}")
+            return False
+
+        # Test 5: a one-clause change in a long policy is fast
+        start = time.perf_counter()
+        diff_policies(old_text, new_text)
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"Diffed {len(old_text) // 1024} KB in {elapsed:.1f} ms.")
+        if elapsed > 500:
+            logger.error(f"Diff took {elapsed:.0f} ms.")
+            return False
+    except Exception as e:
+        logger.error(f"Policy diff test failed: {e}.")
+        return False
+
+    logger.info("All policy diff tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_policy_diff() else 1)
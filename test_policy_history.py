@@ -0,0 +1,61 @@
+import sys
+from database import add_site, get_db_connection
+from policy_history import record_version, get_version, list_versions, diff_versions
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_policy_history():
+    """Test the versioned, deduplicated policy history"""
+    logger.info("Starting policy history tests...")
+
+    fresh_test_db()
+    add_site("https://example.com/privacy", "History Site A")
+    add_site("https://example.org/privacy", "History Site B")
+
+    v1 = "\n".join(f"Clause {i}: we keep your data safe." for i in range(500))
+    v2 = v1.replace("Clause 250: we keep your data safe.", "Clause 250: we share your data with partners.")
+
+    try:
+        # Test 1: repeated checks of the same text do not add versions
+        versions = [record_version(1, v1) for _ in range(3)]
+        if versions != [1, 1, 1]:
+            logger.error(f"Unchanged text created new versions: {versions}.")
+            return False
+
+        # Test 2: a change adds a version, reverting adds a version but no new blob
+        if record_version(1, v2) != 2 or record_version(1, v1) != 3:
+            logger.error("Changes were not recorded as new versions.")
+            return False
+        record_version(2, v1) # same text on another site shares the blob
+        conn = get_db_connection()
+        blobs = conn.execute("SELECT COUNT(*), SUM(LENGTH(data)) FROM policy_blobs").fetchone()
+        conn.close()
+        if blobs[0] != 2:
+            logger.error(f"Expected 2 distinct blobs, found {blobs[0]}.")
+            return False
+        if blobs[1] >= len(v1):
+            logger.error("Stored blobs are not compressed.")
+            return False
+
+        # Test 3: fetch, list and diff versions
+        if get_version(1, 2) != v2 or get_version(1) != v1 or get_version(1, 9) is not None:
+            logger.error("get_version returned the wrong text.")
+            return False
+        if [row["version"] for row in list_versions(1)] != [1, 2, 3]:
+            logger.error("list_versions returned the wrong versions.")
+            return False
+        diff = diff_versions(1, 1, 2)
+        if "+Clause 250: we share your data with partners." not in diff or "Version 2" not in diff:
+            logger.error("diff_versions did not show the change.")
+            return False
+    except Exception as e:
+        logger.error(f"Policy history test failed: {e}.")
+        return False
+
+    logger.info("All policy history tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_policy_history() else 1)
@@ -0,0 +1,161 @@
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config # type: ignore
+import monitor
+from fetch_engine import run_fetch_engine
+from rate_limiter import HostRateLimiter, parse_retry_after, request_with_retry
+import test_support # Uses the test database
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+POLICY = "<html><body>" + "<p>We collect information about visits to this service.</p>" * 40 + "</body></html>"
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers each path with the next (status, headers) of its script, then 200"""
+    scripts = {}
+    hits = {}
+
+    def do_GET(self):
+        ScriptedHandler.hits[self.path] = ScriptedHandler.hits.get(self.path, 0) + 1
+        script = ScriptedHandler.scripts.get(self.path, [])
+        status, headers = script.pop(0) if script else (200, {})
+        body = POLICY.encode("utf-8") if status == 200 else b"busy"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeClock:
+    """Time that only moves when the limiter sleeps"""
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def fake_limiter(**kwargs):
+    clock = FakeClock()
+    return HostRateLimiter(clock=clock, sleep=clock.sleep, **kwargs), clock
+
+def test_rate_limiter():
+    """Test the per-host token bucket, retries with backoff and Retry-After, and adaptive concurrency"""
+    logger.info("Starting rate limiter tests...")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    original = (config.RATE_LIMIT_BACKOFF_BASE_SECONDS, config.RATE_LIMIT_MAX_RETRIES)
+    original_browser = monitor.get_page_text_with_browser
+    config.RATE_LIMIT_BACKOFF_BASE_SECONDS = 0.5
+
+    try:
+        # Test 1: Retry-After as seconds and as an HTTP date
+        now = datetime(2030, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+        if parse_retry_after("5") != 5 or parse_retry_after("Tue, 01 Jan 2030 12:00:30 GMT", now) != 30 \
+                or parse_retry_after("soon") is not None:
+            logger.error("Retry-After is not parsed correctly.")
+            return False
+
+        # Test 2: the token bucket allows a burst, then spaces requests at the configured rate
+        limiter, clock = fake_limiter(rate=2.0, burst=2)
+        waits = [limiter.wait_for_token("a.example") for _ in range(4)]
+        if waits[:2] != [0.0, 0.0] or abs(sum(waits) - 1.0) > 1e-6 or limiter.wait_for_token("b.example") != 0.0:
+            logger.error(f"Token bucket waits are wrong: {waits}.")
+            return False
+
+        # Test 3: 5xx answers are retried with growing, jittered backoff
+        ScriptedHandler.scripts["/flaky"] = [(503, {}), (502, {})]
+        limiter, clock = fake_limiter()
+        response = request_with_retry(f"{base}/flaky", limiter=limiter, max_retries=3)
+        if response.status_code != 200 or ScriptedHandler.hits["/flaky"] != 3:
+            logger.error(f"Flaky page was not retried: {response.status_code}, {ScriptedHandler.hits}.")
+            return False
+        if len(clock.sleeps) != 2 or clock.sleeps[0] > 0.5 or clock.sleeps[1] > 1.0:
+            logger.error(f"Backoff delays are wrong: {clock.sleeps}.")
+            return False
+
+        # Test 4: Retry-After pauses the whole host, a very long one is not waited for
+        ScriptedHandler.scripts["/limited"] = [(429, {"Retry-After": "7"})]
+        limiter, clock = fake_limiter()
+        started = clock.now
+        response = request_with_retry(f"{base}/limited", limiter=limiter)
+        if response.status_code != 200 or clock.now - started < 7:
+            logger.error(f"Retry-After was not honored: {clock.sleeps}.")
+            return False
+        ScriptedHandler.scripts["/gone-for-a-while"] = [(503, {"Retry-After": "3600"})]
+        response = request_with_retry(f"{base}/gone-for-a-while", limiter=limiter)
+        if response.status_code != 503 or ScriptedHandler.hits["/gone-for-a-while"] != 1:
+            logger.error("A Retry-After beyond the maximum was waited for.")
+            return False
+
+        # Test 5: concurrency grows on fast successes, shrinks on errors and slow answers
+        limiter, clock = fake_limiter(min_concurrency=1, max_concurrency=6)
+        start = limiter.concurrency("c.example", 2)
+        for _ in range(20):
+            limiter.record("c.example", 0.1)
+        grown = limiter.concurrency("c.example")
+        limiter.record("c.example", ok=False)
+        halved = limiter.concurrency("c.example")
+        for _ in range(20):
+            limiter.record("c.example", 2.0)
+        if not (start == 2 and grown == 6 and halved == 3 and limiter.concurrency("c.example") == 1):
+            logger.error(f"Concurrency did not adapt: {start}, {grown}, {halved}, {limiter.concurrency('c.example')}.")
+            return False
+
+        # Test 6: the fetch engine keeps to the limiter's per host concurrency
+        running = {"now": 0, "max": 0}
+        lock = threading.Lock()
+        def slow_fetch(site):
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.05)
+            with lock:
+                running["now"] -= 1
+            return True
+        limiter = HostRateLimiter(max_concurrency=1)
+        sites = [(i, f"https://same.example/page{i}") for i in range(6)]
+        run_fetch_engine(sites, slow_fetch, lambda site, result: None, 6, 4, limiter)
+        if running["max"] != 1:
+            logger.error(f"Engine ran {running['max']} fetches at once on a host limited to 1.")
+            return False
+
+        # Test 7: a site still failing after its retries does not fall back to the browser
+        config.RATE_LIMIT_MAX_RETRIES = 1
+        config.RATE_LIMIT_BACKOFF_BASE_SECONDS = 0.01
+        ScriptedHandler.scripts["/down"] = [(500, {}), (500, {})]
+        browser_calls = []
+        monitor.get_page_text_with_browser = lambda url: browser_calls.append(url)
+        site = (1, f"{base}/down", "Down", "hash", False, None, None, None)
+        result = monitor.fetch_site_text(site)
+        if result.text is not None or result.failure != monitor.FAILED_TRANSIENT or browser_calls:
+            logger.error(f"Transient failure went to the browser: {result}, {browser_calls}.")
+            return False
+    except Exception as e:
+        logger.error(f"Rate limiter test failed: {e}.")
+        return False
+    finally:
+        config.RATE_LIMIT_BACKOFF_BASE_SECONDS, config.RATE_LIMIT_MAX_RETRIES = original
+        monitor.get_page_text_with_browser = original_browser
+        server.shutdown()
+
+    logger.info("All rate limiter tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_rate_limiter() else 1)
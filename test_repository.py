@@ -0,0 +1,78 @@
+import sys
+import threading
+from database import add_site, get_db_connection
+from repository import SiteRepository
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_repository():
+    """Test the shared-connection repository and its batched status updates"""
+    logger.info("Starting repository tests...")
+
+    fresh_test_db()
+    for i in range(10):
+        add_site(f"https://site{i}.example.com/privacy", f"Repository Site {i}")
+
+    repo = SiteRepository(batch_size=4)
+    try:
+        repo.ensure_schema()
+
+        # Test 1: the connection runs in WAL mode
+        journal_mode = repo.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if journal_mode.lower() != "wal":
+            logger.error(f"Expected WAL journal mode, got {journal_mode}.")
+            return False
+
+        # Test 2: status updates are only written once a batch is full
+        for site_id in range(1, 4):
+            repo.queue_last_checked(site_id, etag=f'"v{site_id}"')
+        other = get_db_connection()
+        written = other.execute("SELECT COUNT(*) FROM monitored_sites WHERE last_checked IS NOT NULL").fetchone()[0]
+        if written != 0:
+            logger.error(f"{written} updates were written before the batch was full.")
+            return False
+        repo.queue_last_checked(4)
+        written = other.execute("SELECT COUNT(*) FROM monitored_sites WHERE last_checked IS NOT NULL").fetchone()[0]
+        other.close()
+        if written != 4:
+            logger.error(f"Expected a full batch of 4 updates, found {written}.")
+            return False
+
+        # Test 3: the repository can be used from several threads at once
+        errors = []
+        def worker(site_id):
+            try:
+                repo.queue_last_checked(site_id)
+                repo.update_site_content(site_id, f"Policy text for site {site_id}")
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(site_id,)) for site_id in range(5, 11)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            logger.error(f"Concurrent repository use failed: {errors[0]}.")
+            return False
+    except Exception as e:
+        logger.error(f"Repository test failed: {e}.")
+        return False
+    finally:
+        repo.close()
+
+    # Test 4: closing flushes everything
+    conn = get_db_connection()
+    unchecked = conn.execute("SELECT COUNT(*) FROM monitored_sites WHERE last_checked IS NULL").fetchone()[0]
+    etag = conn.execute("SELECT etag FROM monitored_sites WHERE id = 2").fetchone()[0]
+    conn.close()
+    if unchecked != 0 or etag != '"v2"':
+        logger.error(f"Queued updates were lost on close ({unchecked} unchecked sites).")
+        return False
+
+    logger.info("All repository tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_repository() else 1)
@@ -0,0 +1,110 @@
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+import config # type: ignore
+import cpu_pool
+import monitor
+import response_cache
+from database import add_sites
+from fixture_server import FixtureServer, STATIC
+from response_cache import ResponseCache, replay
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def test_response_cache():
+    """Test the raw response cache, its eviction and replaying it"""
+    logger.info("Starting response cache tests...")
+
+    fresh_test_db()
+
+    work_dir = tempfile.mkdtemp(prefix="response_cache_")
+    original = (config.RESPONSE_CACHE_ENABLED, config.RESPONSE_CACHE_PATH, config.PROCESS_WORKERS)
+    original_deliver_alerts = monitor.deliver_alerts
+    original_extract = cpu_pool.extract_text
+    monitor.deliver_alerts = lambda: None
+
+    try:
+        # Test 1: bodies are stored once and come back as they were
+        cache = ResponseCache(os.path.join(work_dir, "unit"), max_mb=1, max_age_days=30)
+        first = cache.store("https://a.example/privacy", "<p>Same policy é</p>", "html", "requests")
+        cache.store("https://b.example/privacy", "<p>Same policy é</p>", "html", "browser")
+        cache.store("https://a.example/privacy", "<p>New policy</p>", "html", "requests")
+        versions = cache.versions("https://a.example/privacy")
+        if cache.summary()["objects"] != 2 or cache.stats["deduplicated"] != 1 or len(versions) != 2:
+            logger.error(f"Bodies were not deduplicated: {cache.summary()}, {dict(cache.stats)}.")
+            return False
+        if versions[1][0] != first or cache.load(first) != "<p>Same policy é</p>":
+            logger.error("Stored body or version order is wrong.")
+            return False
+
+        # Test 2: old entries are evicted and their bodies deleted
+        if cache.evict(now=datetime.utcnow() + timedelta(days=31)) != 2 or cache.load(first) is not None:
+            logger.error("Old entries were not evicted.")
+            return False
+
+        # Test 3: above max_mb the oldest entries go first
+        cache.max_bytes = 3000
+        for i in range(5):
+            cache.store(f"https://{i}.example/privacy", os.urandom(600).hex(), "text", "requests")
+        cache.evict()
+        summary = cache.summary()
+        if summary["bytes"] > 3000 or not cache.versions("https://4.example/privacy") \
+                or cache.versions("https://0.example/privacy"):
+            logger.error(f"Size based eviction kept the wrong entries: {summary}.")
+            return False
+        cache.close()
+
+        # Test 4: check runs write the raw pages, replay works on them without the server
+        config.RESPONSE_CACHE_ENABLED = True
+        config.RESPONSE_CACHE_PATH = os.path.join(work_dir, "runs")
+        config.PROCESS_WORKERS = 0
+        response_cache._cache = None
+        with FixtureServer(sections=20) as server:
+            add_sites([(server.url(i, STATIC), f"Site {i}") for i in range(4)])
+            monitor.check_all_sites(concurrency=2)
+            server.versions[1] = 1
+            monitor.check_all_sites(concurrency=2)
+        sites = monitor.get_all_sites()
+        stats, results = replay(sites)
+        changed = [url for url, stored, diff in results if diff]
+        if stats["replayed"] != 4 or stats["same_as_stored"] != 4 or changed != [server.url(1)]:
+            logger.error(f"Unexpected replay: {dict(stats)}, changed {changed}.")
+            return False
+        if "Policy version 1" not in results[1][2]:
+            logger.error(f"The replayed diff is wrong: {results[1][2]}.")
+            return False
+
+        # Test 5: a different extraction shows up in the replay, also in worker processes
+        cpu_pool.extract_text = lambda html_content: "changed extraction"
+        stats, _ = replay(sites)
+        cpu_pool.extract_text = original_extract
+        if stats["differs_from_stored"] != 4:
+            logger.error(f"A changed extraction was not noticed: {dict(stats)}.")
+            return False
+        config.PROCESS_WORKERS = 2
+        stats, pooled = replay(sites)
+        if stats["same_as_stored"] != 4 or pooled != results:
+            logger.error(f"Replay in worker processes differs: {dict(stats)}.")
+            return False
+    except Exception as e:
+        logger.error(f"Response cache test failed: {e}.")
+        return False
+    finally:
+        config.RESPONSE_CACHE_ENABLED, config.RESPONSE_CACHE_PATH, config.PROCESS_WORKERS = original
+        monitor.deliver_alerts = original_deliver_alerts
+        cpu_pool.extract_text = original_extract
+        cpu_pool.shutdown_cpu_pool()
+        if response_cache._cache is not None:
+            response_cache._cache.close()
+            response_cache._cache = None
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info("All response cache tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_response_cache() else 1)
@@ -0,0 +1,126 @@
+import sys
+from datetime import datetime
+import monitor
+from database import add_sites
+from fixture_server import FixtureServer, STATIC
+from repository import SiteRepository
+from test_support import fresh_test_db, stored_alerts
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class Crash(BaseException):
+    """Stands in for the process being killed (like KeyboardInterrupt, not caught as a site error)"""
+
+def test_run_checkpoint():
+    """Test resuming an interrupted check_all_sites run"""
+    logger.info("Starting run checkpoint tests...")
+
+    fresh_test_db()
+
+    original_deliver_alerts = monitor.deliver_alerts
+    original_fetch = monitor.fetch_site_text
+    original_process = monitor.process_site
+    original_browser = monitor.get_page_text_with_browser
+    original_save_fetched = SiteRepository.save_fetched_checkpoint
+    fetched = []
+    monitor.deliver_alerts = lambda: None # The alerts stay in the outbox
+    def counting_fetch(site, repo=None, resolver=None):
+        fetched.append(site[0])
+        return original_fetch(site, repo, resolver)
+    monitor.fetch_site_text = counting_fetch
+
+    try:
+        with FixtureServer(sections=20) as server:
+            add_sites([(server.url(i, STATIC), f"Site {i}") for i in range(6)])
+            monitor.check_all_sites(concurrency=1)
+
+            # Test 1: a run is killed while processing the 4th site, which changed
+            server.versions[3] = server.versions[5] = 1
+            processed = []
+            def crashing_process(site, fetch_result, run_stats=None, repo=None):
+                if len(processed) == 3:
+                    raise Crash()
+                processed.append(site[0])
+                return original_process(site, fetch_result, run_stats, repo)
+            monitor.process_site = crashing_process
+            try:
+                monitor.check_all_sites(concurrency=1)
+                logger.error("The run was not interrupted.")
+                return False
+            except Crash:
+                pass
+            monitor.process_site = original_process
+            if stored_alerts():
+                logger.error(f"Alerts were stored before the change was processed: {stored_alerts()}.")
+                return False
+
+            # Test 2: --resume skips the checked sites, processes the fetched one
+            # without fetching it again and fetches the rest
+            site_ids = [row["id"] for row in monitor.get_all_sites()]
+            fetched.clear()
+            stats = monitor.check_all_sites(concurrency=1, resume=True)
+            if fetched != site_ids[4:]:
+                logger.error(f"Resume fetched {fetched}, expected {site_ids[4:]}.")
+                return False
+            alerts = [url for url, body in stored_alerts()]
+            if stats["resumed"] != 3 or stats["changed"] != 2 or sorted(alerts) != sorted([server.url(3), server.url(5)]):
+                logger.error(f"Unexpected resumed run: {dict(stats)}, alerts {alerts}.")
+                return False
+
+            # Test 3: the finished run leaves no checkpoints behind and --resume starts a new run
+            with SiteRepository() as repo:
+                if repo.get_interrupted_run() is not None or repo.conn.execute(
+                        "SELECT COUNT(*) FROM checkpoint_sites").fetchone()[0]:
+                    logger.error("Checkpoints of the finished run were kept.")
+                    return False
+            fetched.clear()
+            monitor.check_all_sites(concurrency=4, resume=True)
+            if sorted(fetched) != sorted(site_ids):
+                logger.error(f"A new run did not check every site: {fetched}.")
+                return False
+
+            # Test 4: a run without --resume abandons the interrupted one
+            monitor.process_site = crashing_process
+            processed.clear()
+            try:
+                monitor.check_all_sites(concurrency=1)
+            except Crash:
+                pass
+            monitor.process_site = original_process
+            fetched.clear()
+            monitor.check_all_sites(concurrency=1)
+            with SiteRepository() as repo:
+                statuses = [row[0] for row in repo.conn.execute("SELECT status FROM checkpoint_runs ORDER BY id")]
+            if len(fetched) != 6 or statuses[-2:] != ["abandoned", "finished"]:
+                logger.error(f"The interrupted run was not abandoned: {statuses}, {len(fetched)} fetched.")
+                return False
+
+            # Test 5: unchanged pages from the browser are not stored as fetched checkpoints
+            with SiteRepository() as repo:
+                repo.conn.execute("UPDATE monitored_sites SET requires_browser = 1, last_probe = ?",
+                                  (datetime.utcnow().isoformat(),))
+                repo.conn.commit()
+                texts = {row["url"]: repo.get_site_content(row["id"]) for row in repo.get_all_sites()}
+            monitor.get_page_text_with_browser = lambda url: texts[url]
+            saved = []
+            SiteRepository.save_fetched_checkpoint = lambda repo, run_id, site_id, result: saved.append(site_id)
+            stats = monitor.check_all_sites(concurrency=1)
+            if stats["unchanged"] != 6 or saved:
+                logger.error(f"Unchanged browser pages were checkpointed: {dict(stats)}, saved {saved}.")
+                return False
+    except Exception as e:
+        logger.error(f"Run checkpoint test failed: {e}.")
+        return False
+    finally:
+        monitor.deliver_alerts = original_deliver_alerts
+        monitor.fetch_site_text = original_fetch
+        monitor.process_site = original_process
+        monitor.get_page_text_with_browser = original_browser
+        SiteRepository.save_fetched_checkpoint = original_save_fetched
+
+    logger.info("All run checkpoint tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_run_checkpoint() else 1)
@@ -0,0 +1,112 @@
+import random
+import sys
+from datetime import datetime, timedelta
+from database import add_site, get_db_connection
+from repository import SiteRepository
+from scheduler import Scheduler
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_scheduler():
+    """Test due-time ordering, jitter, adaptive intervals and retries of the scheduler"""
+    logger.info("Starting scheduler tests...")
+
+    fresh_test_db()
+
+    clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+    day = timedelta(days=1)
+    add_site("https://stable.example.com/privacy", "Stable")        # id 1
+    add_site("https://changed.example.com/privacy", "Changed")      # id 2
+    add_site("https://hourly.example.com/privacy", "Hourly", 1)     # id 3
+    add_site("https://new.example.com/privacy", "New")              # id 4
+    add_site("https://broken.example.com/privacy", "Broken")        # id 5
+    conn = get_db_connection()
+    checked = (clock.now - timedelta(hours=2)).isoformat()
+    conn.execute("UPDATE monitored_sites SET last_checked = ?, last_changed = ? WHERE id = 1",
+                 (checked, (clock.now - 365 * day).isoformat()))
+    conn.execute("UPDATE monitored_sites SET last_checked = ?, last_changed = ? WHERE id = 2",
+                 (checked, (clock.now - 2 * day).isoformat()))
+    conn.execute("UPDATE monitored_sites SET last_checked = ? WHERE id = 3", (checked,))
+    conn.execute("UPDATE monitored_sites SET last_checked = ? WHERE id = 5", ((clock.now - 2 * day).isoformat(),))
+    conn.commit()
+    conn.close()
+
+    checked_batches = []
+    def fake_check(sites, repo):
+        checked_batches.append([site["id"] for site in sites])
+        for site in sites:
+            if site["id"] != 5: # site 5 always fails and is never marked as checked
+                repo.conn.execute("UPDATE monitored_sites SET last_checked = ? WHERE id = ?",
+                                  (clock.now.isoformat(), site["id"]))
+
+    repo = SiteRepository()
+    try:
+        scheduler = Scheduler(repo, fake_check, rng=random.Random(1), clock=clock)
+        scheduler.jitter_fraction = 0.1
+        scheduler.default_interval_hours = 24
+        scheduler.retry_minutes = 180
+        rows = {row["id"]: row for row in repo.get_schedule_rows()}
+
+        # Test 1: adaptive intervals
+        intervals = {site_id: scheduler.interval_hours(rows[site_id], clock.now) for site_id in (1, 2, 3, 4)}
+        if intervals != {1: 48, 2: 12, 3: 1, 4: 24}:
+            logger.error(f"Unexpected adaptive intervals: {intervals}.")
+            return False
+
+        # Test 2: jitter stays within +/- jitter_fraction of the interval
+        for _ in range(200):
+            due = scheduler.next_due(rows[2], clock.now)
+            expected = datetime.fromisoformat(rows[2]["last_checked"]) + timedelta(hours=12)
+            if abs((due - expected).total_seconds()) > 12 * 3600 * 0.1:
+                logger.error("Jitter went outside the configured window.")
+                return False
+
+        # Test 3: only due sites run
+        scheduler.load()
+        scheduler.run_once()
+        if sorted(checked_batches[-1]) != [3, 5]:
+            logger.error(f"Expected the hourly and overdue sites to be due, got {checked_batches[-1]}.")
+            return False
+
+        # Test 4: the hourly site comes back after about an hour, the failed one only after the
+        # retry delay, and the new site is checked within its jitter window
+        clock.now += timedelta(minutes=70)
+        scheduler.run_once()
+        if 3 not in checked_batches[-1] or 5 in checked_batches[-1]:
+            logger.error(f"Expected the hourly site but not the failed one after 70 minutes, got {checked_batches[-1]}.")
+            return False
+        clock.now = datetime(2026, 1, 1, 12, 0) + timedelta(minutes=scheduler.retry_minutes + 1)
+        scheduler.run_once()
+        if 5 not in checked_batches[-1]:
+            logger.error("Failed site was not retried after the retry delay.")
+            return False
+        if not any(4 in batch for batch in checked_batches):
+            logger.error("New site was not checked within the jitter window.")
+            return False
+
+        # Test 5: the recently changed site is due before the stable one
+        clock.now = datetime(2026, 1, 2, 12, 0)
+        scheduler.run_once()
+        if 2 not in checked_batches[-1] or 1 in checked_batches[-1]:
+            logger.error(f"Recently changed site should be due before the stable one: {checked_batches[-1]}.")
+            return False
+    except Exception as e:
+        logger.error(f"Scheduler test failed: {e}.")
+        return False
+    finally:
+        repo.close()
+
+    logger.info("All scheduler tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_scheduler() else 1)
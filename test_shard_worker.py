@@ -0,0 +1,117 @@
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import config # type: ignore
+from database import add_sites
+from repository import SiteRepository
+from shard_worker import ShardWorker
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def mark_checked(sites, repo):
+    """Stand-in for monitor.check_sites: every check succeeds"""
+    for site in sites:
+        repo.queue_last_checked(site["id"])
+
+def test_shard_worker():
+    """Test lease-based claiming of due sites by several workers"""
+    logger.info("Starting shard worker tests...")
+
+    fresh_test_db()
+    add_sites([(f"https://example.com/privacy/{i}", f"Site {i}") for i in range(60)])
+
+    repos = [SiteRepository() for _ in range(3)]
+    try:
+        # Test 1: two workers get different batches, and nothing once every site is leased
+        now = datetime.utcnow()
+        first = ShardWorker(repos[0], mark_checked, "a", batch_size=40, lease_seconds=60).claim()
+        second = ShardWorker(repos[1], mark_checked, "b", batch_size=40, lease_seconds=60).claim()
+        third = ShardWorker(repos[2], mark_checked, "c", batch_size=40, lease_seconds=60).claim()
+        first_ids, second_ids = {row["id"] for row in first}, {row["id"] for row in second}
+        if len(first_ids) != 40 or len(second_ids) != 20 or first_ids & second_ids or third:
+            logger.error(f"Claims overlap or are wrong: {len(first_ids)}, {len(second_ids)}, {len(third)}.")
+            return False
+
+        # Test 2: expired leases (a crashed worker) are claimed by another worker
+        later = ShardWorker(repos[2], mark_checked, "c", batch_size=100, lease_seconds=60,
+                            clock=lambda: now + timedelta(seconds=120))
+        if len(later.claim()) != 60:
+            logger.error("Expired leases were not reclaimed.")
+            return False
+        repos[2].release_sites("c", range(1, 61))
+
+        # Test 3: three workers running at once check every site exactly once
+        checks = Counter()
+        def counting_check(sites, repo):
+            for site in sites:
+                checks[site["id"]] += 1
+            time.sleep(0.05)
+            mark_checked(sites, repo)
+        stop_event = threading.Event()
+        workers = [ShardWorker(repo, counting_check, f"w{i}", batch_size=7, lease_seconds=60)
+                   for i, repo in enumerate(repos)]
+        threads = [threading.Thread(target=worker.run, args=(stop_event,)) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        if len(checks) != 60 or set(checks.values()) != {1}:
+            logger.error(f"Sites were not checked exactly once: {len(checks)} sites, {Counter(checks.values())}.")
+            return False
+        claimed = repos[0].conn.execute("SELECT COUNT(*) FROM monitored_sites WHERE claimed_by IS NOT NULL").fetchone()[0]
+        if claimed:
+            logger.error(f"{claimed} sites are still claimed after the run.")
+            return False
+
+        # Test 4: checked sites are not due again until their interval has passed
+        if workers[0].claim():
+            logger.error("Sites checked just now were claimed again.")
+            return False
+        due_later = ShardWorker(repos[0], mark_checked, "a", batch_size=100,
+                                clock=lambda: datetime.utcnow() + timedelta(hours=config.CHECK_INTERVAL_HOURS * 2.5))
+        due = due_later.claim()
+        if len(due) != 60:
+            logger.error(f"{len(due)} sites due after their interval, expected 60.")
+            return False
+        repos[0].release_sites("a", [row["id"] for row in due])
+
+        # Test 5: a failed check is held back for scheduler.retry_minutes
+        def failing_check(sites, repo):
+            pass
+        retry_worker = ShardWorker(repos[1], failing_check, "b", batch_size=5,
+                                   clock=lambda: datetime.utcnow() + timedelta(hours=config.CHECK_INTERVAL_HOURS * 2.5))
+        if retry_worker.run_once() != 5 or len(retry_worker.claim()) != 5:
+            logger.error("The failed batch was not checked or was claimed again right away.")
+            return False
+
+        # Test 6: leases are renewed while a slow batch runs
+        repos[1].release_sites("b", range(1, 61))
+        renewed_worker = ShardWorker(repos[1], lambda sites, repo: time.sleep(1.5), "slow", batch_size=3,
+                                     lease_seconds=0.6, clock=lambda: datetime.utcnow() + timedelta(days=30))
+        thread = threading.Thread(target=renewed_worker.run_once)
+        thread.start()
+        time.sleep(1.0)
+        other = ShardWorker(repos[2], mark_checked, "other", batch_size=100,
+                            clock=lambda: datetime.utcnow() + timedelta(days=30)).claim()
+        thread.join()
+        slow_ids = {row[0] for row in repos[0].conn.execute(
+            "SELECT id FROM monitored_sites WHERE claimed_by IS NULL AND lease_until IS NOT NULL")}
+        if len(other) != 57 or {row["id"] for row in other} & slow_ids:
+            logger.error(f"A renewed lease was taken over: {len(other)} claimed by the other worker.")
+            return False
+    except Exception as e:
+        logger.error(f"Shard worker test failed: {e}.")
+        return False
+    finally:
+        for repo in repos:
+            repo.close()
+
+    logger.info("All shard worker tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_shard_worker() else 1)
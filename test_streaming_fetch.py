@@ -0,0 +1,126 @@
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config # type: ignore
+import monitor
+from test_support import fresh_test_db
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+CHUNK = b"<p>" + b"x" * 65530 + b"</p>"
+STREAM_CHUNKS = 1000 # 64 MB if nobody stops reading
+
+# A UTF-8 character split across the 64 KB read chunks
+SPLIT_PAGE = ("<html><body><p>" + "a" * (65536 - 16) + "é and more</p></body></html>").encode("utf-8")
+LATIN1_PAGE = '<html><head><meta charset="iso-8859-1"></head><body><p>Données personnelles</p></body></html>'.encode("latin-1")
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """Serves an endless stream, a declared huge body, a PDF, plain text and encoded pages"""
+    streamed_chunks = 0
+
+    def do_GET(self):
+        if self.path == "/endless":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            try:
+                for _ in range(STREAM_CHUNKS):
+                    self.wfile.write(CHUNK)
+                    StreamHandler.streamed_chunks += 1
+            except OSError:
+                pass # the client hung up
+            return
+        pages = {
+            "/declared": ("text/html", b"<p>small</p>", {"Content-Length": "999999999"}),
+            "/policy.pdf": ("application/pdf", b"%PDF-1.7 ...", {}),
+            "/policy.txt": ("text/plain; charset=utf-8", b"Privacy   notice\n\n  We collect data.\n", {}),
+            "/split": ("text/html; charset=utf-8", SPLIT_PAGE, {}),
+            "/latin1": ("text/html", LATIN1_PAGE, {}),
+        }
+        content_type, body, headers = pages[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", headers.get("Content-Length", str(len(body))))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def test_streaming_fetch():
+    """Test the size cap, content type check and incremental decoding of fetch_page"""
+    logger.info("Starting streaming fetch tests...")
+
+    fresh_test_db()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    original_max = config.MAX_PAGE_BYTES
+    original_browser = monitor.get_page_text_with_browser
+    browser_calls = []
+    monitor.get_page_text_with_browser = lambda url: browser_calls.append(url)
+    config.MAX_PAGE_BYTES = 256 * 1024
+
+    try:
+        # Test 1: an endless body is cut off at the size cap
+        result = monitor.fetch_page(f"{base}/endless")
+        if result.text is not None or result.failure != monitor.FAILED_TOO_LARGE:
+            logger.error(f"Endless stream was not rejected as too large: {result}.")
+            return False
+        if StreamHandler.streamed_chunks >= STREAM_CHUNKS:
+            logger.error("The whole stream was downloaded.")
+            return False
+
+        # Test 2: a declared Content-Length over the cap is rejected before downloading
+        if monitor.fetch_page(f"{base}/declared").failure != monitor.FAILED_TOO_LARGE:
+            logger.error("Declared large body was not rejected.")
+            return False
+
+        # Test 3: a PDF is not downloaded and does not go to the browser
+        site = (1, f"{base}/policy.pdf", "PDF", "hash", False, None, None, 1)
+        result = monitor.fetch_site_text(site)
+        if result.failure != monitor.FAILED_UNSUPPORTED or browser_calls:
+            logger.error(f"PDF was not rejected as unsupported: {result}, {browser_calls}.")
+            return False
+
+        # Test 4: the failure categories are counted separately
+        stats = Counter()
+        monitor.process_site(site, result, stats)
+        monitor.process_site(site, monitor.FetchResult(None, failure=monitor.FAILED_TOO_LARGE), stats)
+        if stats["failed"] != 2 or stats[monitor.FAILED_UNSUPPORTED] != 1 or stats[monitor.FAILED_TOO_LARGE] != 1:
+            logger.error(f"Failure categories were not counted: {dict(stats)}.")
+            return False
+
+        # Test 5: plain text is used as is, with whitespace normalized
+        result = monitor.fetch_page(f"{base}/policy.txt")
+        if result.text != "Privacy notice\nWe collect data." or result.content_length != 37:
+            logger.error(f"Plain text was not extracted: {result}.")
+            return False
+
+        # Test 6: characters split across chunks and <meta> charsets are decoded correctly
+        split_text = monitor.fetch_page(f"{base}/split").text
+        if "�" in split_text or not split_text.endswith("é and more"):
+            logger.error("A character split across chunks was not decoded.")
+            return False
+        if monitor.fetch_page(f"{base}/latin1").text != "Données personnelles":
+            logger.error("The <meta> charset was not used.")
+            return False
+    except Exception as e:
+        logger.error(f"Streaming fetch test failed: {e}.")
+        return False
+    finally:
+        config.MAX_PAGE_BYTES = original_max
+        monitor.get_page_text_with_browser = original_browser
+        server.shutdown()
+
+    logger.info("All streaming fetch tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_streaming_fetch() else 1)
@@ -0,0 +1,24 @@
+import os
+import config # type: ignore
+from database import get_db_connection
+from migrations import init_db
+
+# Shared setup of the test scripts. Importing this module points the database
+# at the test one, so a test never touches the real database.
+config.DATABASE_PATH = config.resolve_path("test_privacy_policies.db")
+
+def fresh_test_db(init=True):
+    """Delete the test database and create it again with the current schema (or leave it missing with init=False)"""
+    for path in (config.DATABASE_PATH, f"{config.DATABASE_PATH}-wal", f"{config.DATABASE_PATH}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    if init:
+        init_db()
+
+def stored_alerts():
+    """(url, body) of the alerts waiting in the outbox"""
+    conn = get_db_connection()
+    try:
+        return [(row["url"], row["body"]) for row in conn.execute("SELECT url, body FROM alert_outbox ORDER BY id")]
+    finally:
+        conn.close()
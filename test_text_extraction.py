@@ -0,0 +1,78 @@
+import sys
+from text_extraction import extract_text, HAS_LXML
+from log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Privacy</title><style>p { color: red; }</style></head>
+<body>
+  <header><a href="/">Home</a> <a href="/about">About</a></header>
+  <nav><ul><li>Menu item</li></ul></nav>
+  <main>
+    <h1>Privacy   Policy</h1>
+    <!-- a comment -->
+    <p>We collect
+       your <b>email</b>   address.</p>
+    <script>var tracking = true;</script>
+    <p>We keep data for <em>30</em> days.<br>Then it is deleted.</p>
+    <ul><li>Right to access</li><li>Right to erasure</li></ul>
+  </main>
+  <footer>Copyright</footer>
+</body>
+</html>"""
+
+EXPECTED = "\n".join([
+    "Privacy Policy",
+    "We collect your email address.",
+    "We keep data for 30 days.",
+    "Then it is deleted.",
+    "Right to access",
+    "Right to erasure",
+])
+
+def test_text_extraction():
+    """Test the shared text extraction on both parser backends"""
+    logger.info("Starting text extraction tests...")
+    parsers = ["html.parser"] + (["lxml"] if HAS_LXML else [])
+
+    for parser in parsers:
+        # Test 1: unwanted elements are skipped and blocks become lines
+        text = extract_text(PAGE, parser=parser)
+        if text != EXPECTED:
+            logger.error(f"Unexpected text with {parser}:\n{text}")
+            return False
+
+        # Test 2: rewrapping and reindenting the HTML gives the same text
+        rewrapped = PAGE.replace("\n", " ").replace("  ", "\n    ")
+        if extract_text(rewrapped, parser=parser) != EXPECTED:
+            logger.error(f"Rewrapped HTML gave different text with {parser}.")
+            return False
+
+        # Test 3: the text after a comment or processing instruction is kept
+        inline = "<p>Before<!-- c -->tail<b>bold</b><?pi x?> after</p>"
+        if extract_text(inline, parser=parser) != "Beforetailbold after":
+            logger.error(f"Text after a comment lost with {parser}: {extract_text(inline, parser=parser)!r}")
+            return False
+
+        # Test 4: the text on either side of a skipped element is not joined into one word
+        skipped = "<p>tail<footer>Footer</footer>end <button>Accept</button>more<select><option>x</option></select>text</p>"
+        if extract_text(skipped, parser=parser) != "tail end more text":
+            logger.error(f"Words around a skipped element joined with {parser}: {extract_text(skipped, parser=parser)!r}")
+            return False
+
+        # Test 5: deeply nested pages and empty input
+        deep = "<div>" * 5000 + "Deep text" + "</div>" * 5000
+        if extract_text(deep, parser=parser) != "Deep text" or extract_text("", parser=parser) != "":
+            logger.error(f"Deep or empty page failed with {parser}.")
+            return False
+
+    if not HAS_LXML:
+        logger.info("lxml is not installed, only html.parser was tested.")
+
+    logger.info("All text extraction tests passed.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_text_extraction() else 1)
@@ -0,0 +1,142 @@
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import Comment, Declaration, Doctype, ProcessingInstruction, CData
+import config # type: ignore
+from log_config import setup_logger
+
+try:
+    import lxml.html # type: ignore
+    from lxml import etree # type: ignore
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+logger = setup_logger(__name__)
+
+# Bump this whenever the extracted text of the same HTML changes (tags skipped,
+# line splitting, normalization...). Sites stored with an older version are
+# re-baselined on their next check instead of being reported as changed.
+EXTRACTION_VERSION = 3 # 2: lxml keeps the text after comments, 3: skipped elements separate words
+
+# Elements whose content is never part of the policy text. A space is left in
+# their place so the words on either side are not joined into one.
+SKIP_TAGS = frozenset([
+    "script", "style", "noscript", "template", "head", "svg", "iframe", "object", "canvas",
+    "nav", "header", "footer", "button", "select", "option",
+])
+
+# Elements that start a new line of text
+BLOCK_TAGS = frozenset([
+    "address", "article", "aside", "blockquote", "br", "caption", "dd", "details", "div", "dl",
+    "dt", "fieldset", "figcaption", "figure", "form", "h1", "h2", "h3", "h4", "h5", "h6", "hr",
+    "li", "main", "ol", "p", "pre", "section", "summary", "table", "tbody", "td", "tfoot", "th",
+    "thead", "tr", "ul",
+])
+
+# Line breaks inside a text node are just whitespace, only blocks start new lines
+_INLINE_WHITESPACE = str.maketrans("\n\r\f\v", "    ")
+
+# bs4 string types that are not visible text
+_SKIP_STRING_TYPES = (Comment, Declaration, Doctype, ProcessingInstruction, CData)
+
+def extract_text(html_content, parser=None):
+    """
+    Extract the visible text of an HTML page, one block (paragraph, heading,
+    list item...) per line with whitespace collapsed.
+
+    The same HTML always gives the same text regardless of how it is wrapped
+    or indented, which keeps diffs small.
+
+    Args:
+        html_content (str): the page HTML
+        parser (str): "lxml" or "html.parser" (defaults to extraction.parser in
+            config, "auto" uses lxml when it is installed)
+    """
+    if not html_content:
+        return ""
+    chunks = _walk_lxml(html_content) if resolve_parser(parser) == "lxml" else None
+    if chunks is None:
+        chunks = _walk_soup(html_content)
+    return normalize_lines("".join(chunks))
+
+def resolve_parser(parser=None):
+    """Return the parser backend to use"""
+    parser = parser or config.EXTRACTION_PARSER
+    if parser == "auto":
+        return "lxml" if HAS_LXML else "html.parser"
+    if parser == "lxml" and not HAS_LXML:
+        logger.warning("lxml is not installed, falling back to html.parser.")
+        return "html.parser"
+    return parser
+
+def normalize_lines(text):
+    """Collapse whitespace inside each line and drop empty lines"""
+    lines = (" ".join(line.split()) for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+def _walk_lxml(html_content):
+    """
+    Single pass over the lxml tree, skipping unwanted subtrees.
+    Returns None if lxml could not parse the page or libxml2 gave up on it
+    (e.g. nesting deeper than its limit), the caller then uses html.parser instead.
+    """
+    # Parse bytes so pages with an XML encoding declaration are accepted
+    data = html_content.encode("utf-8") if isinstance(html_content, str) else html_content
+    html_parser = lxml.html.HTMLParser(encoding="utf-8", huge_tree=True)
+    try:
+        root = lxml.html.fromstring(data, parser=html_parser)
+    except (etree.ParserError, ValueError):
+        return None
+    if any(error.level == etree.ErrorLevels.FATAL for error in html_parser.error_log):
+        logger.debug("lxml could not parse the whole page, using html.parser.")
+        return None
+
+    chunks = []
+    # Comments and PIs only come as "comment"/"pi" events, their content is
+    # skipped but the text after them is part of the page
+    walker = etree.iterwalk(root, events=("start", "end", "comment", "pi"))
+    for event, element in walker:
+        tag = element.tag if isinstance(element.tag, str) else None
+        if event in ("comment", "pi"):
+            if element.tail:
+                chunks.append(element.tail.translate(_INLINE_WHITESPACE))
+        elif event == "start":
+            if tag is None or tag in SKIP_TAGS:
+                if tag is not None:
+                    chunks.append(" ")
+                walker.skip_subtree()
+                continue
+            if tag in BLOCK_TAGS:
+                chunks.append("\n")
+            if element.text:
+                chunks.append(element.text.translate(_INLINE_WHITESPACE))
+        else:
+            if tag in BLOCK_TAGS:
+                chunks.append("\n")
+            # The tail is the text after the element, it belongs to the parent
+            if element.tail and element is not root:
+                chunks.append(element.tail.translate(_INLINE_WHITESPACE))
+    return chunks
+
+def _walk_soup(html_content):
+    """Single pass over the BeautifulSoup tree, skipping unwanted subtrees"""
+    soup = BeautifulSoup(html_content, "html.parser")
+    chunks = []
+    # Iterative walk so deeply nested pages cannot hit the recursion limit.
+    # None marks the end of a block element.
+    stack = [soup]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            chunks.append("\n")
+        elif isinstance(node, NavigableString):
+            if not isinstance(node, _SKIP_STRING_TYPES):
+                chunks.append(node.translate(_INLINE_WHITESPACE))
+        elif isinstance(node, Tag):
+            if node.name in SKIP_TAGS:
+                chunks.append(" ")
+                continue
+            if node.name in BLOCK_TAGS:
+                chunks.append("\n")
+                stack.append(None)
+            stack.extend(reversed(node.contents))
+    return chunks
@@ -0,0 +1,8 @@
+from urllib.parse import urlparse
+
+# URL helpers shared by the transport modules (rate_limiter.py, http_client.py)
+# and the fetch strategy, kept free of any project imports so every module can use them.
+
+def host_of(url):
+    """Lowercase host name of a URL ("" if it has none)"""
+    return (urlparse(url).hostname or "").lower()